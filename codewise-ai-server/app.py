@@ -1,21 +1,353 @@
 # app.py
 from __future__ import annotations
-import os
-from typing import Any, Dict, Optional
-from flask import Flask, request, jsonify
+import os, sys, time
+from typing import Any, Callable, Dict, Optional
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 
-from providers.openai_ai import analyze as openai_analyze  # noqa
+from providers.registry import ProviderRouter
+from providers.response import dumps, dumps_str, loads
+from providers.profiles import Profile, ProfileConflict, ProfileStore, ProfileTooLarge
+from providers.metrics import (LOG_JSON, REGISTRY, REQUEST_SECONDS, current_timer, log_event, log_json, stage,
+                               start_request, stats_collector)
+from jobs import JobRunner, JobStore, QueueFull, JOBS_DB_PATH
+from batch import run_batch, BATCH_CONCURRENCY, BATCH_MAX_ITEMS
+from scheduler import BULK, INTERACTIVE, SCHED_USER_HEADER, Overloaded, Scheduler
+from warmup import WARMUP_CONNECTIONS, Warmup
+from http_body import (COMPACT_MEDIA_TYPE, COMPRESS_MIN_BYTES, BodyRejected, body_limit, choose_encoding, compact,
+                       decode_body, encode_body, request_encoding, too_large, wants_compact)
 
 PORT = int(os.getenv("PORT", "5050"))
 DEBUG = os.getenv("DEBUG", "1") == "1"
+# flask: 기존 동기 서버 (app.run / gunicorn app:app)
+# asgi:  asgi.py의 비동기 서버를 uvicorn으로 (/analyze, /healthz는 코루틴, 나머지 경로는 이 Flask 앱을 그대로 마운트)
+#        운영: gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+SERVER_MODE = os.getenv("SERVER_MODE", "flask").lower()
+
+# ANALYZE_PROVIDERS(기본 openai)로 고른 제공자들 중 가장 빠른 정상 제공자로 보낸다
+PROVIDER = ProviderRouter.from_env()
+# 제공자 앞의 사용자별 한도 + 공정 분배 (scheduler.py)
+SCHEDULER = Scheduler.from_env()
+# 워커별 콜드 스타트 준비 (warmup.py). 단계는 아래 "준비 상태" 절에서 등록
+WARMUP = Warmup.from_env()
+
+def _ai():
+    # providers.openai_ai(캐시/토큰 추정/통계)는 import가 무거워 처음 쓸 때 불러온다 (보통 준비 단계의 provider warm)
+    from providers import openai_ai
+    return openai_ai
+
+def _ai_loaded():
+    # 이미 불러온 경우에만 모듈 (없으면 None). /healthz, /metrics, 종료 처리가 통계를 보려고 무거운 import를 하지 않게
+    return sys.modules.get("providers.openai_ai")
+
+def _ai_stats(name: str) -> Callable[[], Optional[Dict[str, Any]]]:
+    def _stats() -> Optional[Dict[str, Any]]:
+        ai = _ai_loaded()
+        return getattr(ai, name)() if ai is not None else None
+    return _stats
+
+# /healthz 키 -> 분석 모듈 통계 (/metrics 게이지 그룹 이름도 같다)
+_AI_HEALTH = tuple((key, _ai_stats(name)) for key, name in (
+    ("cache", "cache_stats"), ("singleflight", "inflight_stats"), ("tokens", "token_stats"),
+    ("upstream", "transport_stats"), ("responses", "response_stats"), ("rules", "rules_stats"),
+    ("recovery", "recovery_stats"), ("diff", "diff_stats"), ("incremental", "incremental_stats"),
+    ("neardup", "neardup_stats")))
+
+class FastJSONProvider(DefaultJSONProvider):
+  # jsonify를 orjson(있으면)으로: 큰 fixed_code 응답에서 직렬화 시간과 str->bytes 복사를 줄인다
+  def dumps(self, obj: Any, **kwargs: Any) -> str:
+    return dumps_str(obj) if not kwargs else super().dumps(obj, **kwargs)
+
+  def loads(self, s: Any, **kwargs: Any) -> Any:
+    return loads(s) if not kwargs else super().loads(s, **kwargs)
+
+  def response(self, *args: Any, **kwargs: Any) -> Response:
+    return self._app.response_class(dumps(self._prepare_response_obj(args, kwargs)), mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
+# ---- 요청 계측: 단계별 시간(Server-Timing 헤더), JSON 로그, /metrics ----
+for _group, _fn in _AI_HEALTH + (("jobs", lambda: _job_runner.stats() if _job_runner else None),
+                                 ("profiles", lambda: _profile_store.stats() if _profile_store else None),
+                                 ("scheduler", SCHEDULER.stats)):
+  REGISTRY.register_collector(stats_collector(_group, _fn))
+REGISTRY.register_collector(stats_collector("router", PROVIDER.stats, label="provider"))
+REGISTRY.register_collector(stats_collector("warmup", WARMUP.stats, label="step"))
+
+@app.before_request
+def _start_timer():
+  start_request()
+
+@app.before_request
+def _start_warmup():
+  WARMUP.start()   # 이 워커의 첫 요청이면 백그라운드로 준비 시작 (그 뒤로는 바로 돌아온다)
+
+# ---- 요청/응답 본문: 크기 상한, gzip/br, compact 응답 (http_body.py) ----
+def _rejected(e: BodyRejected) -> Response:
+  resp = jsonify(e.body)
+  resp.status_code = e.status
+  resp.headers["Connection"] = "close"   # 읽지 않은 본문이 남은 연결은 재사용하지 않는다
+  return resp
+
+@app.before_request
+def _limit_body():
+  if request.method not in ("POST", "PUT", "PATCH"):
+    return None
+  limit = body_limit(request.path)
+  try:
+    n = request.content_length
+    if n is not None and n > limit:
+      raise too_large(limit)   # 본문을 읽기 전에 거절
+    enc = request_encoding(request.headers.get("Content-Encoding"))
+    if n is None or enc:
+      # 길이를 모르는(chunked) 본문이나 압축 본문은 상한까지만 읽어 g.body에 둔다
+      with stage("body"):
+        raw = request.stream.read(limit + 1)
+        if len(raw) > limit:
+          raise too_large(limit)
+        g.body = decode_body(raw, enc, limit)
+  except BodyRejected as e:
+    return _rejected(e)
+  return None
+
+def _read_json() -> Any:
+  # 본문 bytes를 그대로 파서에 넘기고(orjson은 bytes를 직접 읽음) 요청 객체에 캐시하지 않는다
+  body = g.get("body")
+  if body is not None:
+    return loads(body) if body else None
+  return request.get_json(force=True, silent=False, cache=False)
+
+def _compact_requested() -> bool:
+  return wants_compact(request.headers.get("Accept"), request.args.get("format"))
+
+def shape_output(out: Dict[str, Any], compact_format: bool) -> Dict[str, Any]:
+  return compact(out) if compact_format else out
+
+@app.after_request
+def _encode_response(resp: Response) -> Response:
+  # JSON 응답만 압축 (SSE/NDJSON 스트림은 이벤트마다 바로 내보내야 하므로 제외)
+  if resp.is_streamed or resp.direct_passthrough or "Content-Encoding" in resp.headers \
+      or not (resp.mimetype or "").endswith("json"):
+    return resp
+  resp.vary.add("Accept-Encoding")
+  if resp.content_length is not None and resp.content_length < COMPRESS_MIN_BYTES:
+    return resp
+  enc = choose_encoding(request.headers.get("Accept-Encoding"))
+  if enc is None:
+    return resp
+  with stage("compress"):
+    resp.set_data(encode_body(resp.get_data(), enc))
+  resp.headers["Content-Encoding"] = enc
+  return resp
+
+@app.after_request
+def _finish_timer(resp: Response) -> Response:
+  timer = current_timer()
+  if timer is None or request.path == "/metrics":
+    return resp
+  resp.headers["Server-Timing"] = timer.server_timing()
+  route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+  method, status = request.method, resp.status_code
+
+  def _log() -> None:
+    # 스트리밍 응답은 본문을 다 보낸 뒤에 닫히므로 그때 총 시간을 잰다
+    REQUEST_SECONDS.observe(timer.elapsed_ms() / 1000.0, route=route, method=method, status=status)
+    if LOG_JSON:
+      log_json({"ts": round(time.time(), 3), "event": "request", "method": method, "route": route,
+                "status": status, **timer.as_dict()})
+  resp.call_on_close(_log)
+  return resp
+
+@app.route("/metrics")
+def metrics():
+  return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+def health_payload() -> Dict[str, Any]:
+  # /healthz 본문 (ASGI 모드도 같은 내용에 서버 상태만 덧붙인다)
+  # 분석 모듈을 아직 불러오지 않았으면(준비 전) 그 통계는 None: 헬스 체크가 무거운 import를 일으키지 않는다
+  ai = {name: fn() for name, fn in _AI_HEALTH}
+  return {"ok": True, "model": os.getenv("OPENAI_MODEL", ""), **ai, "providers": PROVIDER.stats(),
+          "jobs": _job_runner.stats() if _job_runner else None,
+          "profiles": _profile_store.stats() if _profile_store else None, "scheduler": SCHEDULER.stats(),
+          "warmup": WARMUP.stats()}
+
 @app.route("/healthz")
 def healthz():
-  return jsonify({"ok": True, "model": os.getenv("OPENAI_MODEL", "")})
+  return jsonify(health_payload())
+
+# ---- 준비 상태: /healthz는 살아 있는지, /readyz는 준비 단계를 마쳐 트래픽을 받아도 되는지 ----
+# 상류 클라이언트/커넥션, 저장소 연결을 워커마다 미리 (_profiles/_jobs는 아래에서 정의, 부를 때 찾는다)
+WARMUP.add("provider", lambda: PROVIDER.warm(WARMUP_CONNECTIONS))
+WARMUP.add("profiles", lambda: _profiles())
+WARMUP.add("jobs", lambda: _jobs())
+
+@app.route("/readyz")
+def readyz():
+  ready = WARMUP.ready
+  resp = jsonify({"ready": ready, "warmup": WARMUP.stats()})
+  resp.status_code = 200 if ready else 503
+  return resp
+
+# ---- 사용자 프로필 저장소 ----
+# 요청마다 user_profile을 싣는 대신 PUT/PATCH /profiles/<userId>로 올려 두고, 분석 요청에는 userId + profileVersion
+# (숫자 또는 "latest")만 보낸다. 응답의 ETag가 버전이며, If-Match로 주면 그 버전일 때만 쓴다.
+_profile_store: Optional[ProfileStore] = None
+
+def _profiles() -> ProfileStore:
+    global _profile_store
+    if _profile_store is None:
+        _profile_store = ProfileStore.from_env()
+    return _profile_store
+
+def _profile_version(raw: Any) -> Optional[int]:
+    # "latest"/None -> None(최신), 그 밖에는 양의 정수. 잘못된 값은 ValueError
+    if raw is None or raw == "latest":
+        return None
+    if isinstance(raw, str):
+        raw = raw.strip().strip('"').lstrip("v")
+    version = int(raw)
+    if version < 1:
+        raise ValueError("profile version must be >= 1")
+    return version
+
+def _resolve_profile(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # 저장된 프로필(버전 참조)이나 요청에 실린 프로필을 파생 값이 계산된 Profile로. 없는 버전이면 404
+    ref = payload.get("profileVersion")
+    user_id = payload.get("userId")
+    if ref is not None and user_id is not None:
+        try:
+            version = _profile_version(ref)
+        except (TypeError, ValueError):
+            raise BodyRejected(400, "invalid_profile_version", profileVersion=ref)
+        found = _profiles().get(str(user_id), version)
+        if found is None:
+            raise BodyRejected(404, "profile_not_found", userId=user_id, profileVersion=ref)
+        return found
+    inline = payload.get("user_profile")
+    return Profile(inline) if isinstance(inline, dict) and inline else inline
+
+def _profile_response(p: Profile, status: int = 200, body: bool = False) -> Response:
+    out: Dict[str, Any] = {"userId": p.user_id, "version": p.version, "fingerprint": p.fingerprint}
+    if body:
+        out["profile"] = dict(p)
+    resp = jsonify(out)
+    resp.status_code = status
+    resp.headers["ETag"] = f'"{p.version}"'
+    return resp
+
+@app.route("/profiles/<user_id>", methods=["GET"])
+def get_profile(user_id: str):
+    try:
+        version = _profile_version(request.args.get("version"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "invalid_profile_version"}), 400
+    p = _profiles().get(user_id, version)
+    if p is None:
+        return jsonify({"error": "profile_not_found", "userId": user_id}), 404
+    return _profile_response(p, body=True)
+
+@app.route("/profiles/<user_id>", methods=["PUT", "PATCH"])
+def write_profile(user_id: str):
+    # PUT: 전체 교체, PATCH: JSON Merge Patch (null이면 필드 삭제)
+    try:
+        data = _read_json()
+    except Exception as e:
+        return jsonify({"error": "invalid_json", "detail": str(e)}), 400
+    if not isinstance(data, dict):
+        return jsonify({"error": "profile must be a JSON object"}), 400
+    try:
+        if_match = request.headers.get("If-Match")
+        if_version = _profile_version(if_match) if if_match and if_match != "*" else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "invalid_if_match"}), 400
+    store = _profiles()
+    try:
+        p = store.put(user_id, data, if_version) if request.method == "PUT" else store.patch(user_id, data, if_version)
+    except ProfileConflict as e:
+        resp = jsonify({"error": "version_conflict", "currentVersion": e.current})
+        resp.headers["ETag"] = f'"{e.current}"'
+        return resp, 412
+    except ProfileTooLarge as e:
+        return jsonify({"error": "profile_too_large", "detail": str(e)}), 413
+    return _profile_response(p, status=201 if p.version == 1 else 200)
+
+def _analyze_kwargs(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # /analyze 계열 엔드포인트 공통 입력 파싱. code가 비어 있으면 None, 프로필 참조가 잘못되면 BodyRejected
+    code: str = payload.get("code") or ""
+    # 앞뒤 공백이 있을 때만 strip (큰 코드 문자열을 매번 복사하지 않도록)
+    if code[:1].isspace() or code[-1:].isspace():
+        code = code.strip()
+    if not code:
+        return None
+    return {
+        "code": code,
+        "language": payload.get("language") or "auto",
+        "purpose": payload.get("purpose"),
+        "submissionId": payload.get("submissionId"),
+        "userId": payload.get("userId"),
+        "user_profile": _resolve_profile(payload),
+        "previousSubmissionId": payload.get("previousSubmissionId"),
+        "fileKey": payload.get("fileKey"),
+    }
+
+# ---- 사용자별 공정 분배 / 한도 (scheduler.py) ----
+# 상류를 부를 분석 요청만 줄 세운다 (캐시 적중은 바로 처리). /analyze, /analyze/stream은 interactive,
+# /analyze/batch, /analyze/jobs는 bulk. 요청에 "priority": "bulk"를 주면 대화형 경로도 bulk로 낮출 수 있다 (올리기는 불가)
+def sched_class(payload: Any, default: str = INTERACTIVE) -> str:
+    if default == BULK or (isinstance(payload, dict) and payload.get("priority") == BULK):
+        return BULK
+    return INTERACTIVE
+
+def sched_user(user_id: Any, client: Optional[str], headers: Any = None) -> str:
+    # 버킷/공정 분배 단위. 신뢰하는 프록시가 넘긴 사용자 헤더(SCHED_USER_HEADER) > userId > 클라이언트 주소
+    forwarded = headers.get(SCHED_USER_HEADER) if (SCHED_USER_HEADER and headers is not None) else None
+    if forwarded:
+        return f"user:{forwarded}"
+    return f"user:{user_id}" if user_id is not None else f"ip:{client or '-'}"
+
+def sched_cost(kwargs: Dict[str, Any]) -> Optional[int]:
+    # 예상 토큰 수. 캐시에 있는 요청(상류 호출 없음)이거나 스케줄러가 꺼져 있으면 None
+    if not SCHEDULER.enabled:
+        return None
+    ai = _ai()
+    if ai.is_cached(kwargs["code"], kwargs["language"], kwargs["purpose"], kwargs["user_profile"]):
+        SCHEDULER.bypass()
+        return None
+    return ai.estimate_tokens(kwargs["code"])
+
+def scheduled(fn: Callable[..., Dict[str, Any]], user: str, cls: str = BULK,
+              patient: bool = True) -> Callable[..., Dict[str, Any]]:
+    # 배치 항목/작업용: fn(**kwargs)를 슬롯 안에서 (patient면 한도에 걸려도 거절 대신 기다린다)
+    def _run(**kwargs: Any) -> Dict[str, Any]:
+        with SCHEDULER.slot(user, cls, sched_cost(kwargs), patient):
+            return fn(**kwargs)
+    return _run
+
+def _overloaded(e: Overloaded) -> Response:
+    resp = jsonify(e.body)
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+def note_output(out: Dict[str, Any]) -> None:
+    # 운영 환경에서의 AI 비용 및 성능 모니터링을 위한 최소 진단용 경량 로그 인프라 구축
+    # (요청 JSON 로그에 단계별 시간과 함께 남긴다)
+    try:
+        fx = (out.get("fix", {}) or {})
+        fixed_len = len((fx.get("fixed_code") or out.get("fixed_code") or ""))
+        patch_len = len((fx.get("patch") or out.get("patch") or ""))
+        fields = {"source": out.get("source"), "has_summary": bool(out.get("summary")),
+                  "fix_len": fixed_len, "patch_len": patch_len, "token_usage": out.get("token_usage")}
+        timer = current_timer()
+        if timer is not None:
+            timer.note(**fields)
+        else:
+            log_event("analyze_output", **fields)   # 요청 로그가 없는 경로
+    except Exception:
+        pass
 
 # analyze 엔드포인트 부분 최종 수정
 @app.route("/analyze", methods=["POST"])
@@ -24,42 +356,181 @@ def analyze():
         # 프론트엔드 및 백엔드 중계 서버의 다양한 HTTP 클라이언트 라이브러리(Axios, RestTemplate 등) 대응 위해
         # Content-Type 헤더가 명시적이지 않더라도 JSON 파싱이 가능하도록 force=True 설정. 
         # 불완전한 JSON 입력 시 프론트엔드에 명확한 에러 서빙을 위해 silent=False 처리하여 예외 캡처 스코프에 진입시킴.
-        payload: Dict[str, Any] = request.get_json(force=True, silent=False) or {}
+        with stage("parse"):
+            payload: Dict[str, Any] = _read_json() or {}
         
-        code: str = (payload.get("code") or "").strip()
-        if not code:
+        kwargs = _analyze_kwargs(payload)
+        if kwargs is None:
             return jsonify({"error": "code is required"}), 400
-            
-        language: str = payload.get("language") or "auto"
-        purpose: Optional[str] = payload.get("purpose")
-        submissionId: Optional[str] = payload.get("submissionId")
-        userId: Optional[str] = payload.get("userId")
-        user_profile: Optional[Dict[str, Any]] = payload.get("user_profile")
         
         # 외부 LLM API(OpenAI) 호출에 따른 지연 시간 대책으로 상위 백엔드 서비스와 
         # WebSocket 통신(STOMP)을 연계하여 클라이언트 Non-blocking 인터랙션 보장
-        out = openai_analyze(
-            code=code, language=language, purpose=purpose,
-            submissionId=submissionId, userId=userId, user_profile=user_profile,
-        )
+        with SCHEDULER.slot(sched_user(kwargs["userId"], request.remote_addr, request.headers), sched_class(payload), sched_cost(kwargs)):
+            out = PROVIDER.analyze(**kwargs)
         
-        # 운영 환경에서의 AI 비용 및 성능 모니터링을 위한 최소 진단용 경량 로그 인프라 구축
-        try:
-            fx = (out.get("fix", {}) or {})
-            fixed_len = len((fx.get("fixed_code") or out.get("fixed_code") or ""))
-            patch_len = len((fx.get("patch") or out.get("patch") or ""))
-            print("[OPENAI OUT] sum:", bool(out.get("summary")), "fix_len:", fixed_len, "patch_len:", patch_len)
-        except Exception:
-            pass
-            
-        return jsonify(out)
+        note_output(out)
+
+        compact_format = _compact_requested()
+        with stage("serialize"):
+            resp = jsonify(shape_output(out, compact_format))
+        if compact_format:
+            resp.mimetype = COMPACT_MEDIA_TYPE
+        resp.vary.add("Accept")
+        return resp
         
+    except BodyRejected as e:
+        return jsonify(e.body), e.status
+    except Overloaded as e:
+        return _overloaded(e)
     except Exception as e:
         # 최상위 예외 캡처(Global Exception Boundary)를 통해 에러 발생 시에도 Flask 프로세스 다운을 방지하고
         # 내부 시스템 스택 추적이 불가능하도록 500 내부 서버 에러로 추상화하여 보안성 확보
-        print("ERROR in /analyze:", repr(e))
+        log_event("request_failed", level="error", route="/analyze", error=repr(e))
+        return jsonify({"error": "internal_error", "detail": str(e)}), 500
+
+# 모델 생성과 동시에 summary/issue/fix 부분 결과를 푸시 (기본 SSE, ?format=ndjson 또는 Accept로 NDJSON)
+@app.route("/analyze/stream", methods=["POST"])
+def analyze_stream():
+    try:
+        with stage("parse"):
+            payload: Dict[str, Any] = _read_json() or {}
+    except Exception as e:
+        return jsonify({"error": "invalid_json", "detail": str(e)}), 400
+    if not isinstance(payload, dict):
+        # 스트림을 열기 전에 거른다 (배열/숫자/문자열 본문)
+        return jsonify({"error": "invalid_json", "detail": "expected a JSON object"}), 400
+    try:
+        kwargs = _analyze_kwargs(payload)
+    except BodyRejected as e:
+        return jsonify(e.body), e.status
+    if kwargs is None:
+        return jsonify({"error": "code is required"}), 400
+
+    ndjson = request.args.get("format") == "ndjson" or "application/x-ndjson" in (request.headers.get("Accept") or "")
+    compact_format = _compact_requested()
+
+    # 슬롯은 스트림을 다 보낼 때까지 잡고 있다가 응답이 닫힐 때 반납
+    cost = sched_cost(kwargs)
+    try:
+        ticket = SCHEDULER.acquire(sched_user(kwargs["userId"], request.remote_addr, request.headers), sched_class(payload),
+                                   cost) if cost is not None else None
+    except Overloaded as e:
+        return _overloaded(e)
+
+    def _fmt(event: str, data: Dict[str, Any]) -> str:
+        if ndjson:
+            return dumps_str({"event": event, "data": data}) + "\n"
+        return f"event: {event}\ndata: {dumps_str(data)}\n\n"
+
+    def _events():
+        try:
+            for event, data in PROVIDER.analyze_stream(**kwargs):
+                yield _fmt(event, shape_output(data, compact_format) if event == "result" else data)
+        except Exception as e:
+            log_event("request_failed", level="error", route="/analyze/stream", error=repr(e))
+            yield _fmt("error", {"error": "internal_error", "detail": str(e)})
+
+    resp = Response(stream_with_context(_events()),
+                    mimetype="application/x-ndjson" if ndjson else "text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    if ticket is not None:
+        resp.call_on_close(ticket.release)
+    return resp
+
+# 장시간 LLM 호출 동안 워커를 붙잡지 않도록 작업 ID를 즉시 반환하고 폴링으로 결과 제공
+_job_runner: Optional[JobRunner] = None
+
+def _jobs() -> JobRunner:
+    # gunicorn preload/fork 이후 각 워커에서 처음 사용할 때 스레드 풀과 DB 연결을 만든다
+    global _job_runner
+    if _job_runner is None:
+        _job_runner = JobRunner(JobStore(JOBS_DB_PATH))
+    return _job_runner
+
+@app.route("/analyze/jobs", methods=["POST"])
+def create_analyze_job():
+    try:
+        with stage("parse"):
+            payload: Dict[str, Any] = _read_json() or {}
+        kwargs = _analyze_kwargs(payload)
+        if kwargs is None:
+            return jsonify({"error": "code is required"}), 400
+        try:
+            user = sched_user(kwargs["userId"], request.remote_addr, request.headers)
+            job_id = _jobs().submit(scheduled(PROVIDER.analyze, user, BULK), **kwargs)
+        except QueueFull as e:
+            resp = jsonify({"error": "too_many_jobs", "retry_after": e.retry_after})
+            resp.headers["Retry-After"] = str(e.retry_after)
+            return resp, 429
+        resp = jsonify({"jobId": job_id, "status": "queued"})
+        resp.headers["Location"] = f"/analyze/jobs/{job_id}"
+        return resp, 202
+    except BodyRejected as e:
+        return jsonify(e.body), e.status
+    except Exception as e:
+        log_event("request_failed", level="error", route="/analyze/jobs", error=repr(e))
         return jsonify({"error": "internal_error", "detail": str(e)}), 500
 
+@app.route("/analyze/jobs/<job_id>", methods=["GET"])
+def get_analyze_job(job_id: str):
+    job = _jobs().get(job_id)
+    if job is None:
+        return jsonify({"error": "job_not_found"}), 404
+    if isinstance(job.get("result"), dict) and _compact_requested():
+        job["result"] = compact(job["result"])
+    return jsonify(job)
+
+# 여러 제출물을 동시 분석하고 끝나는 순서대로 NDJSON 스트리밍 (한 항목 실패가 배치 전체를 실패시키지 않음)
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    try:
+        with stage("parse"):
+            payload: Any = _read_json() or {}
+    except Exception as e:
+        return jsonify({"error": "invalid_json", "detail": str(e)}), 400
+    # 본문은 항목 배열이나 {"items": [...]} 객체. 그 밖의 JSON(숫자, 문자열 등)은 항목이 없는 것으로
+    raw_items = payload if isinstance(payload, list) else payload.get("items") if isinstance(payload, dict) else None
+    if not isinstance(raw_items, list) or not raw_items:
+        return jsonify({"error": "items is required"}), 400
+    if len(raw_items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": "too_many_items", "max_items": BATCH_MAX_ITEMS}), 413
+
+    concurrency = BATCH_CONCURRENCY
+    if isinstance(payload, dict) and payload.get("concurrency"):
+        try: concurrency = max(1, min(int(payload["concurrency"]), BATCH_CONCURRENCY))
+        except (TypeError, ValueError): pass
+
+    def _item(it: Any) -> Optional[Dict[str, Any]]:
+        try:
+            return _analyze_kwargs(it) if isinstance(it, dict) else None
+        except BodyRejected as e:
+            return e.body   # run_batch가 {"error": ...} 항목은 실패 줄로 내보낸다
+
+    items = [(i, _item(it)) for i, it in enumerate(raw_items)]
+    # 배치 전체가 한 흐름: 항목마다 학생 userId가 달라도 배치를 보낸 쪽(배치 userId 또는 주소)의 몫으로 센다
+    analyze_fn = scheduled(PROVIDER.analyze, sched_user(payload.get("userId") if isinstance(payload, dict) else None,
+                                                        request.remote_addr, request.headers), BULK)
+
+    compact_format = _compact_requested()
+
+    def _lines():
+        ai = _ai()
+        for line in run_batch(items, analyze_fn, ai.content_key, concurrency=concurrency, share_fn=ai.share_result):
+            if compact_format and isinstance(line.get("result"), dict):
+                line = {**line, "result": compact(line["result"])}
+            yield dumps_str(line) + "\n"
+
+    return Response(stream_with_context(_lines()), mimetype="application/x-ndjson")
+
 if __name__ == "__main__":
-  print(f"* Running on 0.0.0.0:{PORT} (debug={DEBUG})")
-  app.run(host="0.0.0.0", port=PORT, debug=DEBUG)
\ No newline at end of file
+  if SERVER_MODE == "asgi":
+    import uvicorn
+    from asgi import ASGI_DRAIN_TIMEOUT_SEC
+    print(f"* Running ASGI on 0.0.0.0:{PORT} (reload={DEBUG})")
+    uvicorn.run("asgi:app", host="0.0.0.0", port=PORT, reload=DEBUG,
+                timeout_graceful_shutdown=int(ASGI_DRAIN_TIMEOUT_SEC) + 1)
+  else:
+    print(f"* Running on 0.0.0.0:{PORT} (debug={DEBUG})")
+    if not DEBUG:
+      WARMUP.start()   # 리로더(자식 프로세스로 다시 실행)가 없을 때만 여기서 바로
+    app.run(host="0.0.0.0", port=PORT, debug=DEBUG)
\ No newline at end of file
@@ -0,0 +1,227 @@
+# asgi.py
+# 비동기(ASGI) 서버 모드: SERVER_MODE=asgi python app.py  또는  gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+# /analyze, /healthz, /readyz는 코루틴으로 처리해 상류(LLM) 응답을 기다리는 동안 스레드를 잡지 않는다.
+# 나머지 경로(/analyze/stream, /analyze/jobs, /analyze/batch, /metrics)는 기존 Flask 앱을 그대로 마운트한다.
+# 종료 신호(SIGTERM/SIGINT)를 받으면 새 분석 요청은 503(Retry-After)으로 돌려보내고,
+# 진행 중인 분석이 끝날 때까지 ASGI_DRAIN_TIMEOUT_SEC 동안 기다린 뒤 커넥션 풀을 닫는다.
+from __future__ import annotations
+import os, time, signal, asyncio, threading
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi.responses import JSONResponse, Response
+
+from app import (PROVIDER, SCHEDULER, WARMUP, app as flask_app, _ai_loaded, _analyze_kwargs, health_payload,
+                 note_output, sched_class, sched_cost, sched_user, shape_output)
+from scheduler import Overloaded
+from warmup import WARMUP_CONNECTIONS
+from http_body import (COMPACT_MEDIA_TYPE, COMPRESS_MIN_BYTES, BodyRejected, body_limit, choose_encoding,
+                       decode_body, encode_body, request_encoding, too_large, wants_compact)
+from providers.response import dumps, loads
+from providers.metrics import LOG_JSON, REQUEST_SECONDS, current_timer, log_event, log_json, stage, start_request
+
+ASGI_DRAIN_TIMEOUT_SEC = float(os.getenv("ASGI_DRAIN_TIMEOUT_SEC", "30"))   # 종료 시 진행 중 분석을 기다리는 최대 시간
+ASGI_DRAIN_RETRY_AFTER = int(os.getenv("ASGI_DRAIN_RETRY_AFTER", "5"))      # 종료 중 거절 응답의 Retry-After(초)
+
+class _Drain:
+    # 진행 중인 요청 수와 종료 중 여부. 이벤트 루프 스레드에서만 바뀐다
+    def __init__(self):
+        self.inflight = 0
+        self.draining = False
+        self.rejected = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def enter(self) -> None:
+        self.inflight += 1
+        self._idle.clear()
+
+    def leave(self) -> None:
+        self.inflight -= 1
+        if self.inflight <= 0:
+            self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": "asgi", "inflight": self.inflight, "draining": self.draining, "rejected": self.rejected}
+
+DRAIN = _Drain()
+_EXEMPT = ("/healthz", "/readyz", "/metrics")
+
+class DrainMiddleware:
+    # 순수 ASGI 미들웨어 (스트리밍 응답을 버퍼링하지 않도록 BaseHTTPMiddleware를 쓰지 않는다)
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope.get("path") in _EXEMPT:
+            await self.app(scope, receive, send)
+            return
+        if DRAIN.draining:
+            DRAIN.rejected += 1
+            resp = JSONResponse({"error": "shutting_down"}, status_code=503,
+                                headers={"Retry-After": str(ASGI_DRAIN_RETRY_AFTER), "Connection": "close"})
+            await resp(scope, receive, send)
+            return
+        DRAIN.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            DRAIN.leave()
+
+def _chain_signals(loop: asyncio.AbstractEventLoop) -> None:
+    # uvicorn이 설치한 종료 핸들러 앞에 끼워 넣어, 신호를 받는 즉시 새 요청을 거절하기 시작한다
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        prev = signal.getsignal(sig)
+        if not callable(prev):
+            continue
+        def _handler(signum: int, frame: Any, _prev: Any = prev) -> None:
+            loop.call_soon_threadsafe(setattr, DRAIN, "draining", True)
+            _prev(signum, frame)
+        signal.signal(sig, _handler)
+
+# 코루틴 경로(/analyze)는 비동기 클라이언트를 쓰므로 그 커넥션 풀도 준비 단계에 넣는다
+WARMUP.add_async("provider_async", lambda: PROVIDER.awarm(WARMUP_CONNECTIONS))
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    _chain_signals(asyncio.get_running_loop())
+    # 준비는 백그라운드로: 그동안 /healthz는 바로 답하고 /readyz는 503
+    warm_task = asyncio.ensure_future(WARMUP.arun())
+    yield
+    if not warm_task.done():
+        warm_task.cancel()
+    DRAIN.draining = True
+    deadline = time.monotonic() + ASGI_DRAIN_TIMEOUT_SEC
+    if not await DRAIN.wait_idle(ASGI_DRAIN_TIMEOUT_SEC):
+        log_event("drain_timeout", level="warning", inflight=DRAIN.inflight)
+    # 요청은 끝났어도 병합된 분석 태스크가 남아 있으면 캐시에 넣을 수 있게 마저 기다린다
+    ai = _ai_loaded()   # 한 번도 분석하지 않은 워커면 닫을 것도 없다 (종료하면서 무거운 import를 하지 않는다)
+    if ai is None:
+        return
+    pending = [t for t in ai._ASYNC_INFLIGHT.values() if not t.done()]
+    if pending:
+        await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()))
+    try:
+        await ai.aclose()
+    except Exception as e:
+        log_event("client_close_failed", level="warning", error=repr(e))
+
+class FastJSONResponse(JSONResponse):
+    # Flask 쪽 FastJSONProvider와 같은 직렬화 (orjson이 있으면 사용)
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+api = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+
+def _finish(resp: Response, route: str, method: str) -> Response:
+    # Flask after_request와 같은 Server-Timing 헤더 / 요청 JSON 로그
+    timer = current_timer()
+    if timer is None:
+        return resp
+    resp.headers["Server-Timing"] = timer.server_timing()
+    REQUEST_SECONDS.observe(timer.elapsed_ms() / 1000.0, route=route, method=method, status=resp.status_code)
+    if LOG_JSON:
+        log_json({"ts": round(time.time(), 3), "event": "request", "method": method, "route": route,
+                  "status": resp.status_code, **timer.as_dict()})
+    return resp
+
+async def _read_body(request: Request) -> bytes:
+    # Flask 쪽 _limit_body와 같은 규칙: Content-Length로 먼저 거절하고, 읽는 중에도 상한을 넘으면 멈춘다
+    limit = body_limit(request.url.path)
+    n = request.headers.get("content-length")
+    if n is not None and n.isdigit() and int(n) > limit:
+        raise too_large(limit)
+    enc = request_encoding(request.headers.get("content-encoding"))
+    parts = []
+    total = 0
+    async for chunk in request.stream():
+        total += len(chunk)
+        if total > limit:
+            raise too_large(limit)
+        parts.append(chunk)
+    body = parts[0] if len(parts) == 1 else b"".join(parts)
+    return decode_body(body, enc, limit)
+
+def _json_response(request: Request, obj: Any, status: int = 200, media_type: str = "application/json") -> Response:
+    # FastJSONResponse + 응답 압축 (Flask _encode_response와 같은 협상)
+    data = dumps(obj)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    enc = choose_encoding(request.headers.get("accept-encoding")) if len(data) >= COMPRESS_MIN_BYTES else None
+    if enc is not None:
+        with stage("compress"):
+            data = encode_body(data, enc)
+        headers["Content-Encoding"] = enc
+    return Response(data, status_code=status, media_type=media_type, headers=headers)
+
+@api.get("/healthz")
+async def healthz() -> FastJSONResponse:
+    return FastJSONResponse({**health_payload(), "server": DRAIN.stats()})
+
+@api.get("/readyz")
+async def readyz() -> FastJSONResponse:
+    # 종료 중에도 503: 로드 밸런서가 새 요청을 보내지 않도록
+    ready = WARMUP.ready and not DRAIN.draining
+    return FastJSONResponse({"ready": ready, "warmup": WARMUP.stats(), "server": DRAIN.stats()},
+                            status_code=200 if ready else 503)
+
+@api.post("/analyze")
+async def analyze(request: Request) -> Response:
+    start_request()
+    try:
+        # Flask 쪽과 같이 Content-Type과 무관하게 본문을 JSON으로 읽는다
+        with stage("parse"):
+            try:
+                body = await _read_body(request)
+            except BodyRejected as e:
+                resp = JSONResponse(e.body, status_code=e.status, headers={"Connection": "close"})
+                return _finish(resp, "/analyze", "POST")
+            payload: Dict[str, Any] = loads(body) if body else {}
+        if not isinstance(payload, dict):
+            payload = {}
+
+        try:
+            kwargs: Optional[Dict[str, Any]] = _analyze_kwargs(payload)
+        except BodyRejected as e:
+            return _finish(JSONResponse(e.body, status_code=e.status), "/analyze", "POST")
+        if kwargs is None:
+            return _finish(JSONResponse({"error": "code is required"}, status_code=400), "/analyze", "POST")
+
+        client = request.client.host if request.client else None
+        try:
+            # 비용 추정(캐시 조회: SQLite, 토큰 수 세기)은 블로킹이라 루프 밖에서
+            cost = await run_in_threadpool(sched_cost, kwargs)
+            async with SCHEDULER.aslot(sched_user(kwargs["userId"], client, request.headers), sched_class(payload), cost):
+                out = await PROVIDER.aanalyze(**kwargs)
+        except Overloaded as e:
+            resp = JSONResponse(e.body, status_code=429, headers={"Retry-After": str(e.retry_after)})
+            return _finish(resp, "/analyze", "POST")
+        note_output(out)
+
+        compact_format = wants_compact(request.headers.get("accept"), request.query_params.get("format"))
+        with stage("serialize"):
+            resp = _json_response(request, shape_output(out, compact_format),
+                                  media_type=COMPACT_MEDIA_TYPE if compact_format else "application/json")
+        return _finish(resp, "/analyze", "POST")
+
+    except Exception as e:
+        log_event("request_failed", level="error", route="/analyze", error=repr(e))
+        return _finish(JSONResponse({"error": "internal_error", "detail": str(e)}, status_code=500), "/analyze", "POST")
+
+# Flask 앱도 CORS를 붙이지만, 코루틴 경로는 Flask를 거치지 않으므로 여기서도 붙인다
+api.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+api.mount("/", WSGIMiddleware(flask_app))
+
+app = DrainMiddleware(api)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+import os, copy, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from providers.metrics import log_event
+
+# ---- 배치 분석 (/analyze/batch) ----
+# 과제 단위 재분석처럼 수백 개 파일을 한 번에 받아 동시 실행하고, 끝나는 순서대로 NDJSON 한 줄씩 내보낸다.
+# OpenAI 클라이언트는 providers.openai_ai 모듈 전역 인스턴스 하나(공유 커넥션 풀)를 그대로 사용한다.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS   = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+_REQUEST_FIELDS = ("submissionId", "userId", "user_profile_used", "profileVersion")
+
+def _with_request_fields(out: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+    # 중복 제거된 항목은 대표 항목 결과를 복사하고 요청별 필드만 자기 것으로 바꾼다
+    # (제공자가 share_fn을 주면 그쪽이 제출본 기록까지 맡는다)
+    out = copy.deepcopy(out)
+    for f in _REQUEST_FIELDS:
+        out.pop(f, None)
+    for f in ("submissionId", "userId"):
+        if kwargs.get(f) is not None:
+            out[f] = kwargs[f]
+    profile = kwargs.get("user_profile")
+    if profile:
+        out["user_profile_used"] = True
+    if getattr(profile, "version", None) is not None:
+        out["profileVersion"] = profile.version
+    return out
+
+def run_batch(
+    items: List[Tuple[int, Optional[Dict[str, Any]]]],
+    analyze_fn: Callable[..., Dict[str, Any]],
+    key_fn: Callable[..., str],
+    concurrency: int = BATCH_CONCURRENCY,
+    share_fn: Callable[..., Dict[str, Any]] = _with_request_fields,
+) -> Iterator[Dict[str, Any]]:
+    # items: (원래 인덱스, analyze kwargs 또는 None=코드 없음, {"error": ...}=그 밖의 잘못된 항목)
+    # share_fn(대표 결과, **항목 kwargs): 같은 입력으로 묶인 나머지 항목의 결과
+    started = time.perf_counter()
+    stats = {"total": len(items), "ok": 0, "failed": 0, "deduplicated": 0}
+
+    groups: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+    for idx, kwargs in items:
+        if kwargs is None or "error" in kwargs:
+            stats["failed"] += 1
+            yield {"index": idx, "ok": False, "error": kwargs["error"] if kwargs else "code is required",
+                   "latency_ms": 0.0}
+            continue
+        try:
+            key = key_fn(kwargs["code"], kwargs.get("language") or "auto",
+                         kwargs.get("purpose"), kwargs.get("user_profile"))
+        except Exception as e:
+            stats["failed"] += 1
+            yield {"index": idx, "ok": False, "error": f"invalid item: {e}", "latency_ms": 0.0}
+            continue
+        groups.setdefault(key, []).append((idx, kwargs))
+
+    def _one(members: List[Tuple[int, Dict[str, Any]]]) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
+        t0 = time.perf_counter()
+        try:
+            return analyze_fn(**members[0][1]), None, (time.perf_counter() - t0) * 1000.0
+        except Exception as e:
+            return None, str(e) or e.__class__.__name__, (time.perf_counter() - t0) * 1000.0
+
+    def _share(out: Dict[str, Any], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return share_fn(out, **kwargs)
+        except Exception as e:
+            log_event("batch_share_failed", level="warning", error=repr(e))
+            return _with_request_fields(out, **kwargs)
+
+    if groups:
+        pool = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(groups))), thread_name_prefix="analyze-batch")
+        try:
+            futures = {pool.submit(_one, members): members for members in groups.values()}
+            for fut in as_completed(futures):
+                members = futures[fut]
+                out, err, latency_ms = fut.result()
+                for n, (idx, kwargs) in enumerate(members):
+                    line: Dict[str, Any] = {"index": idx, "latency_ms": round(latency_ms, 1)}
+                    if kwargs.get("submissionId") is not None:
+                        line["submissionId"] = kwargs["submissionId"]
+                    if n > 0:
+                        line["deduplicated"] = True
+                        stats["deduplicated"] += 1
+                    if out is None:
+                        line.update({"ok": False, "error": err})
+                        stats["failed"] += 1
+                    else:
+                        line.update({"ok": True, "result": out if n == 0 else _share(out, kwargs)})
+                        stats["ok"] += 1
+                    yield line
+        finally:
+            # 클라이언트가 끊겨 제너레이터가 닫히면 남은 항목은 버리고 바로 돌아간다 (실행 중인 것만 마저 끝난다)
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+    yield {"summary": stats}
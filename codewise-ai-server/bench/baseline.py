@@ -0,0 +1,70 @@
+# 벤치마크 결과 저장/비교: bench/baselines/<이름>.json 에 커밋 해시와 함께 남기고,
+# 다른 커밋에서 같은 벤치를 돌린 결과와 지표별로 비교한다 (임계값을 넘으면 회귀로 표시, 종료 코드 1).
+from __future__ import annotations
+import os, json, time, platform, subprocess
+from typing import Any, Dict, List, Optional
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+def git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(BASELINE_DIR), timeout=5).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+def _path(name: str) -> str:
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, f"{name}.json")
+
+def save(name: str, kind: str, results: Dict[str, Dict[str, float]], params: Dict[str, Any]) -> str:
+    # results: {케이스: {지표: 값}} — 지표 이름이 _ms/_s로 끝나면 작을수록, rps로 끝나면 클수록 좋다
+    path = _path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    doc = {"kind": kind, "commit": git_rev(), "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+           "python": platform.python_version(), "machine": platform.machine(),
+           "params": params, "results": results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=2, sort_keys=True)
+    return path
+
+def load(name: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_path(name), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _higher_is_better(metric: str) -> bool:
+    return metric.endswith("rps") or metric.endswith("ok")
+
+def compare(name: str, kind: str, results: Dict[str, Dict[str, float]], threshold: float = 0.10) -> int:
+    # 회귀(threshold 비율 이상 나빠짐) 개수를 돌려준다
+    base = load(name)
+    if base is None:
+        print(f"[BENCH] baseline not found: {_path(name)}")
+        return 0
+    if base.get("kind") != kind:
+        print(f"[BENCH] baseline {name} is a {base.get('kind')} run, not {kind}")
+        return 0
+    print(f"\ncompared with {name} (commit {base.get('commit')}, {base.get('created_at')}), threshold {threshold:.0%}")
+    print(f"{'case':<32}{'metric':<14}{'base':>12}{'now':>12}{'change':>10}")
+    regressions = 0
+    rows: List[str] = []
+    for case, metrics in results.items():
+        old_metrics = base["results"].get(case) or {}
+        for metric, now in metrics.items():
+            old = old_metrics.get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(now, (int, float)) or old == 0:
+                continue
+            change = (now - old) / old
+            worse = -change if _higher_is_better(metric) else change
+            flag = ""
+            if worse > threshold:
+                regressions += 1
+                flag = "  REGRESSION"
+            elif worse < -threshold:
+                flag = "  improved"
+            rows.append(f"{case:<32}{metric:<14}{old:>12.3f}{now:>12.3f}{change:>+9.1%}{flag}")
+    print("\n".join(rows))
+    print(f"{regressions} regression(s)")
+    return regressions
@@ -0,0 +1,121 @@
+# 라인 지표 계산 마이크로 벤치마크: 기존(줄 단위 다중 스캔) 구현 vs 단일 패스 lexer
+#   python -m bench.bench_metrics [--lines 20000] [--repeat 5]
+from __future__ import annotations
+import os, re, sys, time, argparse, statistics
+from typing import Callable, Dict, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")  # 모듈 임포트 시 클라이언트 생성용 더미 키
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from providers.lexer import guess_language, line_stats  # noqa: E402
+
+# ---- 비교 기준: 단일 패스 lexer 도입 이전 구현 ----
+def legacy_guess_language(language: str, code: str) -> str:
+    if language and language.lower() != "auto":
+        return language.lower()
+    if re.search(r"#include\s*<", code): return "cpp"
+    if re.search(r"\bclass\s+\w+\b", code) and re.search(r"import\s+\w+;", code): return "java"
+    if re.search(r"\bdef\s+\w+\(", code): return "python"
+    if re.search(r"\bfunction\s+\w+\(|=>", code): return "javascript"
+    return "auto"
+
+def _legacy_strip_c_like_strings(line: str) -> str:
+    out = []; in_s = None; esc = False
+    for ch in line:
+        if esc: esc = False; continue
+        if ch == '\\': esc = True; continue
+        if in_s:
+            if ch == in_s: in_s = None
+            continue
+        else:
+            if ch in ('"', "'"):
+                in_s = ch; continue
+            out.append(ch)
+    return "".join(out)
+
+def legacy_compute_basic_metrics(code: str, language: str) -> Dict[str, Optional[int]]:
+    lang = legacy_guess_language(language, code)
+    lines = code.splitlines()
+    blank = sum(1 for l in lines if not l.strip())
+    todos = sum(1 for l in lines if "TODO" in l or "FIXME" in l)
+    comments = 0
+    if lang in ("c","cpp","java","javascript","typescript","csharp","go","rust","kotlin","swift","php"):
+        in_block = False
+        for l in lines:
+            s = _legacy_strip_c_like_strings(l).strip()
+            if in_block:
+                comments += 1
+                if "*/" in s: in_block = False
+                continue
+            if "/*" in s:
+                comments += 1
+                if "*/" not in s: in_block = True
+                continue
+            if "//" in s:
+                comments += 1
+                continue
+    elif lang in ("python","ruby"):
+        for l in lines:
+            if l.strip().startswith("#") or "#" in l:
+                comments += 1
+    return {"blank": blank, "comments": comments, "todos": todos}
+
+# ---- 합성 입력 ----
+def synth_c(n_lines: int) -> str:
+    block = [
+        "#include <stdio.h>",
+        "/* block comment",
+        " * TODO: tidy up */",
+        "static int add(int a, int b) {",
+        "    // add two numbers",
+        '    printf("value: %d // not a comment\\n", a + b);',
+        "    if (a > 0 && b > 0) { return a + b; }",
+        "",
+        "    return a ? a : b; /* trailing */",
+        "}",
+    ]
+    return "\n".join(block[i % len(block)] for i in range(n_lines)) + "\n"
+
+def synth_python(n_lines: int) -> str:
+    block = [
+        "def f(a, b):",
+        '    """Add two numbers.',
+        "    FIXME: overflow",
+        '    """',
+        "    # add",
+        '    s = "# not a comment"',
+        "    if a and b:",
+        "        return a + b  # inline",
+        "",
+        "    return 0",
+    ]
+    return "\n".join(block[i % len(block)] for i in range(n_lines)) + "\n"
+
+def _time(fn: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000.0
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--lines", type=int, default=20000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    print(f"{'case':<28}{'legacy ms':>12}{'lexer ms':>12}{'speedup':>10}")
+    for name, code, lang in (("c / explicit", synth_c(args.lines), "c"),
+                             ("c / auto-detect", synth_c(args.lines), "auto"),
+                             ("python / explicit", synth_python(args.lines), "python"),
+                             ("python / auto-detect", synth_python(args.lines), "auto")):
+        old = _time(lambda: legacy_compute_basic_metrics(code, lang), args.repeat)
+        new = _time(lambda: line_stats(code, guess_language(lang, code)), args.repeat)
+        print(f"{name:<28}{old:>12.2f}{new:>12.2f}{old / new if new else 0:>9.1f}x")
+    js = synth_c(args.lines).replace("#include <stdio.h>", "const f = (x) => x;")
+    old = _time(lambda: legacy_guess_language("auto", js), args.repeat)
+    new = _time(lambda: guess_language("auto", js), args.repeat)
+    print(f"{'guess_language (js)':<28}{old:>12.2f}{new:>12.2f}{old / new if new else 0:>9.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,74 @@
+# 후처리 핫패스 마이크로 벤치마크 (코퍼스: 언어 4종 x 크기별)
+#   python -m bench.bench_micro [--sizes small,medium,large,huge] [--repeat 7]
+#                               [--save NAME] [--compare NAME] [--threshold 0.1]
+# 케이스별 중앙값/p95(ms)를 출력하고, --save로 bench/baselines/NAME.json에 저장, --compare로 이전 커밋 결과와 비교한다.
+from __future__ import annotations
+import os, sys, time, argparse, statistics
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")  # 모듈 임포트 시 클라이언트 생성용 더미 키
+os.environ.setdefault("LOG_JSON", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from providers.openai_ai import (_apply_issue_patches, _apply_unified_diff, _coerce_defaults,  # noqa: E402
+                                 _guess_language)
+from providers.lexer import line_stats  # noqa: E402
+from providers.local_analyzer import analyze_local  # noqa: E402
+from bench import baseline  # noqa: E402
+from bench.corpus import SIZES, corpus, make_diff, make_fixed, make_issue_patches, make_payload  # noqa: E402
+
+def _measure(fn: Callable[[], Any], repeat: int, budget_sec: float = 2.0) -> Dict[str, float]:
+    fn()  # 워밍업 (정규식 컴파일, lru_cache)
+    samples: List[float] = []
+    deadline = time.perf_counter() + budget_sec
+    for i in range(repeat):
+        t0 = time.perf_counter(); fn(); samples.append((time.perf_counter() - t0) * 1000.0)
+        if i >= 2 and time.perf_counter() > deadline:
+            break
+    samples.sort()
+    return {"median_ms": round(statistics.median(samples), 4),
+            "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 4)}
+
+def run(sizes: List[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    for case, lang, code in corpus(tuple(sizes)):
+        fixed = make_fixed(code, lang)
+        diff = make_diff(code, fixed)
+        issues = make_issue_patches(code, fixed)
+        payload = make_payload(code, lang)
+        report = analyze_local(code, lang)
+        benches = {
+            "guess_language": lambda: _guess_language("auto", code),
+            "basic_metrics": lambda: line_stats(code, _guess_language("auto", code)),
+            "unified_diff": lambda: _apply_unified_diff(code, diff),
+            "issue_patches": lambda: _apply_issue_patches(code, issues),
+            "coerce_defaults": lambda: _coerce_defaults(payload, lang, code, report),
+        }
+        for name, fn in benches.items():
+            key = f"{name}:{case}"
+            results[key] = _measure(fn, repeat)
+            r = results[key]
+            print(f"{key:<40}{r['median_ms']:>12.3f}{r['p95_ms']:>12.3f}", flush=True)
+    return results
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="post-processing micro benchmarks")
+    ap.add_argument("--sizes", default="small,medium,large", help=f"comma list of {','.join(SIZES)}")
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--save", metavar="NAME")
+    ap.add_argument("--compare", metavar="NAME")
+    ap.add_argument("--threshold", type=float, default=0.10)
+    args = ap.parse_args(argv)
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+
+    print(f"{'bench:case':<40}{'median ms':>12}{'p95 ms':>12}")
+    results = run(sizes, args.repeat)
+    params = {"sizes": sizes, "repeat": args.repeat}
+    if args.save:
+        print("saved", baseline.save(args.save, "micro", results, params))
+    if args.compare:
+        return 1 if baseline.compare(args.compare, "micro", results, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
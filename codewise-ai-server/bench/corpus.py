@@ -0,0 +1,153 @@
+# 벤치마크용 입력 코퍼스: 실제 제출물과 비슷한 모양의 코드(여러 언어, 작은 파일 ~ 수만 줄)와
+# 그에 대한 모델 응답 모양(unified diff, 이슈별 패치, 응답 payload)을 결정적으로(시드 고정) 만든다.
+from __future__ import annotations
+import random
+from typing import Any, Dict, List, Tuple
+
+SIZES = {"small": 60, "medium": 600, "large": 6000, "huge": 30000}
+
+_PY_FUNC = '''def {name}(items, limit=None):
+    """Collect matching items.
+
+    TODO: handle generators lazily
+    """
+    result = []
+    for i, item in enumerate(items):  # scan
+        if item == None:
+            continue
+        if limit and i > limit:
+            break
+        s = "value: %s # not a comment" % item
+        result.append(eval(str(item)))
+    return result
+'''
+
+_PY_CLASS = '''class {name}Repo:
+    def __init__(self, db):
+        self.db = db
+
+    def find(self, user_id):
+        # FIXME: SQL injection
+        q = "SELECT * FROM users WHERE id = " + str(user_id)
+        return self.db.execute(q).fetchall()
+'''
+
+_C_FUNC = '''/* {name}: sum helper
+ * TODO: overflow checks */
+static int {name}(const int *arr, int n) {{
+    int total = 0; // running sum
+    for (int i = 0; i <= n; i++) {{
+        if (arr[i] > 0) {{ total += arr[i]; }}
+    }}
+    printf("total=%d // not a comment\\n", total);
+    return total;
+}}
+'''
+
+_JAVA_METHOD = '''    // {name}
+    public String {name}(String a, String b) {{
+        if (a == b) {{
+            return "same";
+        }}
+        String sql = "SELECT * FROM t WHERE name = '" + a + "'";
+        return sql;
+    }}
+'''
+
+_JS_FUNC = '''// {name}
+function {name}(el, input) {{
+  if (input == null) return;
+  el.innerHTML = input; /* XSS */
+  const items = input.split(",").map((x) => x.trim());
+  for (var i = 0; i < items.length; i++) {{
+    console.log("item // " + items[i]);
+  }}
+  return items;
+}}
+'''
+
+def _repeat(header: str, templates: List[str], n_lines: int, rng: random.Random, footer: str = "") -> str:
+    parts = [header] if header else []
+    count = header.count("\n")
+    k = 0
+    while count < n_lines:
+        t = rng.choice(templates).format(name=f"fn_{k}")
+        parts.append(t)
+        count += t.count("\n") + 1
+        k += 1
+    if footer:
+        parts.append(footer)
+    return "\n".join(parts)
+
+def make_code(lang: str, n_lines: int, seed: int = 0) -> str:
+    rng = random.Random(f"{lang}:{n_lines}:{seed}")
+    if lang == "python":
+        return _repeat("import os\nimport sys\n", [_PY_FUNC, _PY_FUNC, _PY_CLASS], n_lines, rng)
+    if lang == "c":
+        return _repeat("#include <stdio.h>\n#include <stdlib.h>\n", [_C_FUNC], n_lines, rng)
+    if lang == "java":
+        return _repeat("import java.util.*;\n\npublic class Main {", [_JAVA_METHOD], n_lines, rng, "}\n")
+    if lang == "javascript":
+        return _repeat("'use strict';\n", [_JS_FUNC], n_lines, rng)
+    raise ValueError(f"unknown language: {lang}")
+
+_FIXES = {
+    "python": [("item == None", "item is None"), ("eval(str(item))", "str(item)")],
+    "c": [("i <= n", "i < n")],
+    "java": [("a == b", "a.equals(b)")],
+    "javascript": [("el.innerHTML = input", "el.textContent = input"), ("input == null", "input === null")],
+}
+
+def make_fixed(code: str, lang: str) -> str:
+    # 모델이 돌려줄 법한 수정본: 잘 알려진 냄새 몇 가지만 줄 안에서 고친다 (줄 수 유지)
+    for old, new in _FIXES[lang]:
+        code = code.replace(old, new)
+    return code
+
+def _changed_lines(code: str, fixed: str) -> List[int]:
+    # make_fixed는 줄 수를 바꾸지 않으므로 같은 위치끼리 비교한다
+    # (difflib은 반복 줄이 많은 큰 입력에서 코퍼스 생성에만 수 분이 걸린다)
+    return [i for i, (x, y) in enumerate(zip(code.splitlines(), fixed.splitlines())) if x != y]
+
+def make_diff(code: str, fixed: str, context: int = 3) -> str:
+    a, b = code.splitlines(), fixed.splitlines()
+    groups: List[List[int]] = []
+    for i in _changed_lines(code, fixed):
+        if groups and i - groups[-1][-1] <= 2 * context:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    out = ["--- original", "+++ fixed"]
+    for g in groups:
+        lo, hi = max(0, g[0] - context), min(len(a), g[-1] + context + 1)
+        changed = set(g)
+        out.append(f"@@ -{lo + 1},{hi - lo} +{lo + 1},{hi - lo} @@")
+        for i in range(lo, hi):
+            if i in changed:
+                out.append("-" + a[i]); out.append("+" + b[i])
+            else:
+                out.append(" " + a[i])
+    return "\n".join(out) + "\n"
+
+def make_issue_patches(code: str, fixed: str, limit: int = 200) -> List[Dict[str, Any]]:
+    # 바뀐 줄마다 "수정된 한 줄" 스니펫을 패치로 단 이슈 (모델이 fixed_code를 빠뜨린 경우의 입력)
+    b = fixed.splitlines()
+    return [{"line": i + 1, "severity": "warn", "message": "fix", "suggestion": "", "patch": b[i].strip()}
+            for i in _changed_lines(code, fixed)[:limit]]
+
+def make_payload(code: str, lang: str, n_issues: int = 30) -> Dict[str, Any]:
+    # _coerce_defaults 입력: 모델 JSON 응답 모양 (일부 값은 일부러 틀린 타입)
+    fixed = make_fixed(code, lang)
+    issues = make_issue_patches(code, fixed, n_issues)
+    for n, it in enumerate(issues):
+        if n % 5 == 0: it["line"] = str(it["line"])
+        if n % 7 == 0: it["severity"] = "ERROR"
+        if n % 11 == 0: it["message"] = "Use equals() for string comparison"
+    return {"summary": "Found issues.", "metrics": {"comments": "3", "maintainability_index": "71.5"},
+            "issues": issues + ["not-a-dict"],
+            "fix": {"strategy": "patch", "patch": make_diff(code, fixed), "fixed_code": fixed}}
+
+def corpus(sizes: Tuple[str, ...] = ("small", "medium", "large"),
+           langs: Tuple[str, ...] = ("python", "c", "java", "javascript")) -> List[Tuple[str, str, str]]:
+    # (케이스 이름, 언어, 코드)
+    return [(f"{lang}/{size}", lang, make_code(lang, SIZES[size])) for size in sizes for lang in langs]
@@ -0,0 +1,214 @@
+# 로컬 가짜 OpenAI 호환 서버 (POST /v1/chat/completions, 스트리밍 포함)
+#   python -m bench.fake_openai [--port 8900] [--latency-ms 800] [--jitter-ms 200] [--ttft-ms 150]
+#                               [--malformed-rate 0.05] [--error-rate 0.0] [--missing-fix-rate 0.1]
+# 앱은 OPENAI_BASE_URL=http://127.0.0.1:8900/v1 로 붙인다.
+# 응답 본문은 프롬프트의 <code>...</code>(또는 <region>)에서 코드를 꺼내 몇 가지 냄새를 고친 JSON이며,
+# 일부 비율로 깨진 JSON(코드 펜스/잘림), fixed_code 누락(패치만), 429/503(Retry-After)을 섞어 실제 상류처럼 흔든다.
+from __future__ import annotations
+import re, json, time, random, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+_CODE = re.compile(r"<code>\n?(.*?)\n?</code>", re.S)
+_REGION = re.compile(r'<region id="(\d+)" lines="\d+-\d+">\n(.*?)\n</region>', re.S)
+_FIXES = [("== None", "is None"), ("eval(", "int("), ("innerHTML", "textContent"), ("i <= n", "i < n")]
+
+class FakeConfig:
+    def __init__(self, latency_ms: float = 800.0, jitter_ms: float = 200.0, ttft_ms: float = 150.0,
+                 malformed_rate: float = 0.0, error_rate: float = 0.0, missing_fix_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ttft_ms = ttft_ms
+        self.malformed_rate = malformed_rate
+        self.error_rate = error_rate
+        self.missing_fix_rate = missing_fix_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "stream": 0, "malformed": 0, "errors": 0, "missing_fix": 0, "models": 0}
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return self.rng.random() < rate
+
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) / 1000.0
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] += 1
+
+def _fix(code: str) -> Tuple[str, List[Dict[str, Any]]]:
+    issues: List[Dict[str, Any]] = []
+    out: List[str] = []
+    for n, line in enumerate(code.split("\n"), 1):
+        new = line
+        for old, rep in _FIXES:
+            if old in new:
+                new = new.replace(old, rep)
+        if new != line:
+            issues.append({"line": n, "severity": "warn", "message": "unsafe or non-idiomatic construct",
+                           "suggestion": "apply the suggested replacement", "patch": new.strip()})
+        out.append(new)
+    return "\n".join(out), issues
+
+def completion_content(cfg: FakeConfig, messages: List[Dict[str, Any]]) -> str:
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    # 재작성 전용 프롬프트(OPENAI_REWRITE_ONLY)면 실제 모델처럼 patch 필드를 쓰지 않는다
+    rewrite = "Never output a diff" in system
+    regions = _REGION.findall(user)
+    if regions:
+        body: Dict[str, Any] = {"regions": [{"id": int(i), "fixed_code": _fix(code)[0]} for i, code in regions]}
+    else:
+        m = _CODE.search(user)
+        code = m.group(1) if m else user
+        fixed, issues = _fix(code)
+        if rewrite:
+            for it in issues: it.pop("patch", None)
+        body = {"summary": f"Reviewed {code.count(chr(10)) + 1} lines, {len(issues)} issue(s).",
+                "issues": issues[:50],
+                "fix": {"strategy": "patch" if issues else "none", "patch": "", "fixed_code": fixed}}
+        if rewrite:
+            del body["fix"]["patch"]
+        if issues and cfg.roll(cfg.missing_fix_rate):
+            cfg.count("missing_fix")
+            body["fix"]["fixed_code"] = ""
+    text = json.dumps(body, ensure_ascii=False)
+    if cfg.roll(cfg.malformed_rate):
+        cfg.count("malformed")
+        text = cfg.rng.choice([f"```json\n{text}\n```", text[: max(1, len(text) * 3 // 4)], text.replace("}", ",}", 1)])
+    return text
+
+def _usage(messages: List[Dict[str, Any]], content: str) -> Dict[str, int]:
+    prompt = sum(len(str(m.get("content") or "")) for m in messages) // 4
+    completion = len(content) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+def make_handler(cfg: FakeConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args: Any) -> None:  # 요청마다 찍지 않는다
+            pass
+
+        def _json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path.rstrip("/") in ("/stats", "/v1/stats"):
+                with cfg.lock:
+                    self._json(200, dict(cfg.stats))
+            elif self.path.rstrip("/").endswith("/models"):
+                # 서버의 warm-up이 커넥션을 미리 열 때 부른다
+                cfg.count("models")
+                self._json(200, {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "bench"}]})
+            else:
+                self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self) -> None:
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            cfg.count("requests")
+            if cfg.roll(cfg.error_rate):
+                cfg.count("errors")
+                time.sleep(cfg.ttft_ms / 1000.0)
+                status = cfg.rng.choice([429, 503])
+                self._json(status, {"error": {"message": "simulated upstream error", "type": "server_error"}},
+                           {"Retry-After": "1"} if status == 429 else None)
+                return
+            messages = req.get("messages") or []
+            content = completion_content(cfg, messages)
+            model = req.get("model") or "fake"
+            total = cfg.delay()
+            if req.get("stream"):
+                cfg.count("stream")
+                self._stream(model, content, messages, total, bool((req.get("stream_options") or {}).get("include_usage")))
+                return
+            time.sleep(total)
+            self._json(200, {"id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                             "model": model,
+                             "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                          "finish_reason": "stop"}],
+                             "usage": _usage(messages, content)})
+
+        def _stream(self, model: str, content: str, messages: List[Dict[str, Any]], total: float,
+                    include_usage: bool) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def _send(obj: Any) -> None:
+                data = ("data: " + (obj if isinstance(obj, str) else json.dumps(obj)) + "\n\n").encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+            ttft = min(total, cfg.ttft_ms / 1000.0)
+            time.sleep(ttft)
+            pieces = [content[i:i + 64] for i in range(0, len(content), 64)] or [""]
+            step = (total - ttft) / len(pieces)
+            for p in pieces:
+                _send({**base, "choices": [{"index": 0, "delta": {"content": p}, "finish_reason": None}]})
+                if step > 0: time.sleep(step)
+            _send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if include_usage:
+                _send({**base, "choices": [], "usage": _usage(messages, content)})
+            _send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+class _Server(ThreadingHTTPServer):
+    # 기본 listen 백로그(5)로는 수백 개 동시 연결(ASGI 모드 부하)에서 연결이 끊긴다
+    request_queue_size = 1024
+
+def serve(cfg: FakeConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    # 백그라운드 스레드로 띄우고 서버를 돌려준다 (port=0이면 빈 포트, server.server_port로 확인)
+    server = _Server((host, port), make_handler(cfg))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server
+
+def add_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--latency-ms", type=float, default=800.0)
+    ap.add_argument("--jitter-ms", type=float, default=200.0)
+    ap.add_argument("--ttft-ms", type=float, default=150.0)
+    ap.add_argument("--malformed-rate", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--missing-fix-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=None)
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(args.latency_ms, args.jitter_ms, args.ttft_ms, args.malformed_rate, args.error_rate,
+                      args.missing_fix_rate, args.seed)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="fake OpenAI-compatible chat completions server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    add_args(ap)
+    args = ap.parse_args(argv)
+    server = serve(config_from_args(args), args.host, args.port)
+    print(f"* fake OpenAI on http://{args.host}:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+# 종단간 부하 테스트: 가짜 OpenAI 서버 + gunicorn으로 띄운 app.py에 동시 요청을 보내 RPS와 p50/p95/p99를 잰다
+#   python -m bench.load [--endpoint analyze|stream] [--concurrency 16] [--duration 30] [--warmup 3]
+#                        [--workers 2] [--threads 8] [--server flask|asgi] [--sizes small,medium] [--repeat-ratio 0.3]
+#                        [--latency-ms 800 --jitter-ms 200 --malformed-rate 0.05 ...]
+#                        [--url http://127.0.0.1:5050]  (이미 떠 있는 서버에 보낼 때; 가짜 서버/gunicorn 생략)
+#                        [--save NAME] [--compare NAME] [--threshold 0.1]
+from __future__ import annotations
+import os, sys, time, json, random, socket, argparse, tempfile, threading, subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import baseline  # noqa: E402
+from bench.corpus import SIZES, make_code  # noqa: E402
+from bench.fake_openai import add_args, config_from_args, serve  # noqa: E402
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LANGS = ("python", "c", "java", "javascript")
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _percentile(sorted_vals: List[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(p * len(sorted_vals)))]
+
+class Payloads:
+    # repeat_ratio 비율만큼은 이미 보낸 본문을 다시 보내 캐시 적중을 섞고, 나머지는 매번 다른 코드(주석 한 줄 차이)
+    def __init__(self, sizes: List[str], repeat_ratio: float, seed: int = 0):
+        self.bases = [(lang, make_code(lang, SIZES[s])) for s in sizes for lang in LANGS]
+        self.repeat_ratio = repeat_ratio
+        self.rng = random.Random(seed)
+        self.sent: List[Dict[str, Any]] = []
+        self.n = 0
+        self.lock = threading.Lock()
+
+    def next(self) -> Dict[str, Any]:
+        with self.lock:
+            if self.sent and self.rng.random() < self.repeat_ratio:
+                return self.rng.choice(self.sent)
+            lang, code = self.bases[self.n % len(self.bases)]
+            self.n += 1
+            mark = "#" if lang == "python" else "//"
+            body = {"code": f"{mark} load {self.n}\n{code}", "language": lang, "userId": f"load-{self.n % 50}"}
+            if len(self.sent) < 1000:
+                self.sent.append(body)
+            return body
+
+def start_gunicorn(port: int, workers: int, threads: int, env: Dict[str, str], quiet: bool = True,
+                   server: str = "flask") -> subprocess.Popen:
+    # asgi: 워커 하나가 이벤트 루프로 동시 요청을 처리하므로 --threads는 쓰지 않는다
+    mode = ["-k", "uvicorn.workers.UvicornWorker", "asgi:app"] if server == "asgi" \
+        else ["--threads", str(threads), "app:app"]
+    cmd = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+           "--timeout", "300", "--log-level", "warning", *mode]
+    # 앱의 요청별 로그는 측정 출력과 섞이지 않도록 기본으로 버린다 (--app-log로 유지)
+    return subprocess.Popen(cmd, cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL if quiet else None)
+
+def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url + "/healthz", timeout=2.0).status_code == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not become ready")
+
+def _one(client: httpx.Client, url: str, endpoint: str, body: Dict[str, Any]) -> Tuple[bool, float, Optional[float]]:
+    # (성공, 전체 지연 ms, 첫 이벤트까지 ms — 스트리밍만)
+    t0 = time.perf_counter()
+    if endpoint == "stream":
+        first: Optional[float] = None
+        ok = False
+        with client.stream("POST", url + "/analyze/stream", json=body) as r:
+            for line in r.iter_lines():
+                if first is None and line.startswith("event:"):
+                    first = (time.perf_counter() - t0) * 1000.0
+                if line.startswith("event: result"):
+                    ok = r.status_code == 200
+                elif line.startswith("event: error"):
+                    ok = False
+        return ok, (time.perf_counter() - t0) * 1000.0, first
+    r = client.post(url + "/analyze", json=body)
+    return r.status_code == 200, (time.perf_counter() - t0) * 1000.0, None
+
+def run_load(url: str, endpoint: str, concurrency: int, duration: float, warmup: float,
+             payloads: Payloads) -> Dict[str, Any]:
+    lat: List[float] = []
+    ttfb: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def _worker() -> None:
+        with httpx.Client(timeout=httpx.Timeout(300.0, connect=5.0)) as client:
+            while time.perf_counter() < stop_at:
+                body = payloads.next()
+                t_start = time.perf_counter()
+                try:
+                    ok, ms, first = _one(client, url, endpoint, body)
+                except Exception:
+                    ok, ms, first = False, (time.perf_counter() - t_start) * 1000.0, None
+                if t_start < measure_from:
+                    continue
+                with lock:
+                    if ok:
+                        lat.append(ms)
+                        if first is not None: ttfb.append(first)
+                    else:
+                        errors[0] += 1
+
+    threads = [threading.Thread(target=_worker, daemon=True) for _ in range(concurrency)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = max(1e-9, time.perf_counter() - measure_from)
+    lat.sort(); ttfb.sort()
+    out = {"requests": len(lat) + errors[0], "errors": errors[0], "rps": round(len(lat) / elapsed, 2),
+           "p50_ms": round(_percentile(lat, 0.50), 1), "p95_ms": round(_percentile(lat, 0.95), 1),
+           "p99_ms": round(_percentile(lat, 0.99), 1), "max_ms": round(lat[-1], 1) if lat else 0.0}
+    if ttfb:
+        out["ttfb_p50_ms"] = round(_percentile(ttfb, 0.50), 1)
+        out["ttfb_p95_ms"] = round(_percentile(ttfb, 0.95), 1)
+    return out
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="end-to-end load test against a fake OpenAI upstream")
+    ap.add_argument("--endpoint", choices=("analyze", "stream"), default="analyze")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--warmup", type=float, default=3.0)
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    ap.add_argument("--sizes", default="small,medium")
+    ap.add_argument("--repeat-ratio", type=float, default=0.3)
+    ap.add_argument("--url", help="target an already running app instead of starting gunicorn")
+    ap.add_argument("--app-log", action="store_true", help="keep the app's stdout request logs")
+    ap.add_argument("--save", metavar="NAME")
+    ap.add_argument("--compare", metavar="NAME")
+    ap.add_argument("--threshold", type=float, default=0.10)
+    add_args(ap)
+    args = ap.parse_args(argv)
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+
+    fake = proc = cfg = None
+    url = args.url
+    tmp = tempfile.mkdtemp(prefix="codewise-load-")
+    try:
+        if url is None:
+            cfg = config_from_args(args)
+            fake = serve(cfg)
+            port = _free_port()
+            env = {**os.environ, "OPENAI_API_KEY": "bench", "DEBUG": "0",
+                   "OPENAI_BASE_URL": f"http://127.0.0.1:{fake.server_port}/v1",
+                   "JOBS_DB": os.path.join(tmp, "jobs.db"), "SUBMISSIONS_DB": os.path.join(tmp, "submissions.db"),
+                   "OPENAI_RPM": "0", "OPENAI_TPM": "0"}
+            proc = start_gunicorn(port, args.workers, args.threads, env, quiet=not args.app_log, server=args.server)
+            url = f"http://127.0.0.1:{port}"
+        wait_ready(url)
+        print(f"* load: {args.endpoint} x{args.concurrency} for {args.duration:.0f}s (+{args.warmup:.0f}s warm-up) -> {url}")
+        res = run_load(url, args.endpoint, args.concurrency, args.duration, args.warmup,
+                       Payloads(sizes, args.repeat_ratio))
+        if cfg is not None:
+            # 가짜 서버가 받은 호출 수 (캐시/병합으로 줄어든 상류 호출 확인용)
+            with cfg.lock:
+                res["upstream"] = dict(cfg.stats)
+        print(json.dumps(res, indent=2))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try: proc.wait(timeout=15)
+            except subprocess.TimeoutExpired: proc.kill()
+        if fake is not None:
+            fake.shutdown()
+
+    case = f"{args.endpoint}/c{args.concurrency}/{'+'.join(sizes)}" + ("/asgi" if args.server == "asgi" else "")
+    results = {case: {k: v for k, v in res.items() if k.endswith(("_ms", "rps"))}}
+    params = {k: v for k, v in vars(args).items() if k not in ("save", "compare", "url", "app_log")}
+    if args.save:
+        print("saved", baseline.save(args.save, "load", results, params))
+    if args.compare:
+        return 1 if baseline.compare(args.compare, "load", results, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
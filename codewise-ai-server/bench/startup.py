@@ -0,0 +1,150 @@
+# 콜드 스타트 벤치마크: import 시간과, 서버 프로세스를 띄운 뒤 첫 응답까지의 시간
+#   python -m bench.startup [--repeat 5] [--runs 3] [--server flask|asgi] [--warmup on|off|both] [--top 10]
+#                           [--latency-ms 50 --jitter-ms 0 ...] [--save NAME] [--compare NAME] [--threshold 0.1]
+# import: 새 인터프리터에서 `import app`(asgi면 `import asgi`)에 걸린 시간과 프로세스 전체 시간의 중앙값.
+#         -X importtime으로 누적 시간이 큰 모듈을 함께 출력한다 (저장/비교에는 넣지 않음)
+# cold:   가짜 OpenAI 서버 + gunicorn 워커 하나를 띄운 시각부터 /healthz 200, /readyz 200, 첫 /analyze 응답까지.
+#         첫 요청과 두 번째 요청의 지연 차이가 첫 요청이 치르는 초기화 비용이다 (warm-up on/off 비교)
+from __future__ import annotations
+import os, sys, time, json, argparse, statistics, tempfile, subprocess
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import baseline  # noqa: E402
+from bench.corpus import SIZES, make_code  # noqa: E402
+from bench.fake_openai import add_args, config_from_args, serve  # noqa: E402
+from bench.load import APP_DIR, _free_port, start_gunicorn  # noqa: E402
+
+_IMPORT_SNIPPET = "import time; t0 = time.perf_counter(); import {module}; print((time.perf_counter() - t0) * 1000.0)"
+
+def _app_env(extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    tmp = tempfile.mkdtemp(prefix="codewise-startup-")
+    return {**os.environ, "OPENAI_API_KEY": "bench", "DEBUG": "0", "LOG_JSON": "0",
+            "JOBS_DB": os.path.join(tmp, "jobs.db"), "SUBMISSIONS_DB": os.path.join(tmp, "submissions.db"),
+            "PROFILES_DB": os.path.join(tmp, "profiles.db"), **(extra or {})}
+
+def measure_import(module: str, repeat: int) -> Dict[str, float]:
+    imports: List[float] = []
+    procs: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", _IMPORT_SNIPPET.format(module=module)], cwd=APP_DIR,
+                             env=_app_env(), capture_output=True, text=True, timeout=120)
+        procs.append((time.perf_counter() - t0) * 1000.0)
+        if out.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{out.stderr}")
+        imports.append(float(out.stdout.strip().splitlines()[-1]))
+    return {"import_ms": round(statistics.median(imports), 1), "process_ms": round(statistics.median(procs), 1)}
+
+def top_imports(module: str, n: int) -> List[Tuple[str, float, float]]:
+    # (모듈, 누적 ms, 자체 ms) 누적 시간 순
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=APP_DIR,
+                         env=_app_env(), capture_output=True, text=True, timeout=120)
+    rows: List[Tuple[str, float, float]] = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cum_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue   # 머리글 줄
+        name = parts[2].strip()
+        if name != module:
+            rows.append((name, cum_us / 1000.0, self_us / 1000.0))
+    rows.sort(key=lambda r: -r[1])
+    return rows[:n]
+
+def _wait(client: httpx.Client, url: str, t0: float, timeout: float = 60.0) -> float:
+    # url이 200을 줄 때까지 폴링하고, t0부터 걸린 ms
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(url).status_code == 200:
+                return (time.perf_counter() - t0) * 1000.0
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not return 200 within {timeout:.0f}s")
+
+def _analyze(client: httpx.Client, url: str, n: int) -> float:
+    # 코드마다 다른 시드: 캐시/유사 제출본 재사용 없이 상류까지 가도록
+    body = {"code": make_code("python", SIZES["small"], seed=n), "language": "python", "userId": f"startup-{n}"}
+    t0 = time.perf_counter()
+    r = client.post(url + "/analyze", json=body)
+    if r.status_code != 200:
+        raise RuntimeError(f"/analyze returned {r.status_code}: {r.text[:200]}")
+    return (time.perf_counter() - t0) * 1000.0
+
+def measure_cold(upstream: str, server: str, warm: bool, quiet: bool = True) -> Dict[str, float]:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = _app_env({"OPENAI_BASE_URL": upstream, "WARMUP": "1" if warm else "0", "OPENAI_RPM": "0", "OPENAI_TPM": "0"})
+    t0 = time.perf_counter()
+    proc = start_gunicorn(port, 1, 4, env, quiet=quiet, server=server)
+    try:
+        with httpx.Client(timeout=httpx.Timeout(60.0, connect=1.0)) as client:
+            res = {"healthz_ms": _wait(client, url + "/healthz", t0)}
+            # warm-up을 끈 워커는 바로 준비된 것으로 답한다
+            res["ready_ms"] = _wait(client, url + "/readyz", t0)
+            res["first_request_ms"] = _analyze(client, url, 1)
+            res["ttfr_ms"] = (time.perf_counter() - t0) * 1000.0
+            res["second_request_ms"] = _analyze(client, url, 2)
+    finally:
+        proc.terminate()
+        try: proc.wait(timeout=15)
+        except subprocess.TimeoutExpired: proc.kill()
+    return res
+
+def _median(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    return {k: round(statistics.median(r[k] for r in runs), 1) for k in runs[0]}
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="import time and time-to-first-response of a cold worker")
+    ap.add_argument("--repeat", type=int, default=5, help="fresh interpreters per import measurement")
+    ap.add_argument("--runs", type=int, default=3, help="cold server starts per warm-up setting")
+    ap.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    ap.add_argument("--warmup", choices=("on", "off", "both"), default="both")
+    ap.add_argument("--top", type=int, default=10, help="slowest imports to list (0 to skip)")
+    ap.add_argument("--app-log", action="store_true", help="keep the app's stdout logs")
+    ap.add_argument("--save", metavar="NAME")
+    ap.add_argument("--compare", metavar="NAME")
+    ap.add_argument("--threshold", type=float, default=0.10)
+    add_args(ap)
+    # 상류 지연은 짧게: 첫 요청의 초기화 비용이 묻히지 않도록
+    ap.set_defaults(latency_ms=50.0, jitter_ms=0.0, ttft_ms=10.0)
+    args = ap.parse_args(argv)
+    module = "asgi" if args.server == "asgi" else "app"
+
+    results: Dict[str, Dict[str, float]] = {}
+    results[f"import/{module}"] = measure_import(module, args.repeat)
+    print(f"* import {module}: {json.dumps(results[f'import/{module}'])}")
+    if args.top > 0:
+        print(f"{'module':<48}{'cumulative_ms':>14}{'self_ms':>10}")
+        for name, cum, own in top_imports(module, args.top):
+            print(f"{name:<48}{cum:>14.1f}{own:>10.1f}")
+
+    cfg = config_from_args(args)
+    fake = serve(cfg)
+    upstream = f"http://127.0.0.1:{fake.server_port}/v1"
+    try:
+        for warm in {"on": (True,), "off": (False,), "both": (False, True)}[args.warmup]:
+            case = f"cold/{args.server}/{'warmup' if warm else 'no-warmup'}"
+            results[case] = _median([measure_cold(upstream, args.server, warm, quiet=not args.app_log)
+                                     for _ in range(args.runs)])
+            print(f"* {case}: {json.dumps(results[case])}")
+    finally:
+        fake.shutdown()
+
+    params = {k: v for k, v in vars(args).items() if k not in ("save", "compare", "app_log", "top")}
+    if args.save:
+        print("saved", baseline.save(args.save, "startup", results, params))
+    if args.compare:
+        return 1 if baseline.compare(args.compare, "startup", results, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
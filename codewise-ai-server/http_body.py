@@ -0,0 +1,110 @@
+# http_body.py
+# 요청/응답 본문 처리 (Flask, ASGI 공용)
+#   - 본문 크기 상한: Content-Length로 읽기 전에 거절하고, 길이를 모르거나(chunked) 압축된 본문은 상한까지만 읽는다
+#   - Content-Encoding: gzip / br 요청 본문 해제 (해제 후 크기도 같은 상한 — 압축 폭탄 방지)
+#   - 응답 압축: Accept-Encoding 협상 (br은 brotli 패키지가 있을 때만)
+#   - compact 응답: Accept: application/vnd.codewise.compact+json 또는 ?format=compact 일 때만
+#     최상위 fixed_code/patch(= fix 아래와 같은 값)와 metrics.comment(= comments)를 빼고 보낸다
+from __future__ import annotations
+import os, zlib
+from typing import Any, Dict, Optional
+
+try:
+    import brotli  # 선택 의존성: 없으면 br 요청은 415, 응답은 gzip으로
+except ImportError:  # pragma: no cover
+    brotli = None  # type: ignore
+
+MAX_BODY_BYTES       = int(os.getenv("MAX_BODY_BYTES", str(4 * 1024 * 1024)))         # 단일 분석 요청
+BATCH_MAX_BODY_BYTES = int(os.getenv("BATCH_MAX_BODY_BYTES", str(32 * 1024 * 1024)))  # /analyze/batch
+COMPRESS_MIN_BYTES   = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))                     # 이보다 작은 응답은 그대로
+COMPRESS_GZIP_LEVEL  = int(os.getenv("COMPRESS_GZIP_LEVEL", "5"))
+COMPRESS_BR_QUALITY  = int(os.getenv("COMPRESS_BR_QUALITY", "4"))
+
+COMPACT_MEDIA_TYPE = "application/vnd.codewise.compact+json"
+REQUEST_ENCODINGS = ("gzip", "br") if brotli is not None else ("gzip",)
+_CHUNK = 64 * 1024
+
+class BodyRejected(Exception):
+    # 상태 코드와 응답 본문 ({"error": ..., 그 밖의 필드})
+    def __init__(self, status: int, error: str, **fields: Any):
+        super().__init__(error)
+        self.status = status
+        self.body: Dict[str, Any] = {"error": error, **fields}
+
+def body_limit(path: str) -> int:
+    return BATCH_MAX_BODY_BYTES if path.rstrip("/").endswith("/batch") else MAX_BODY_BYTES
+
+def too_large(limit: int) -> BodyRejected:
+    return BodyRejected(413, "payload_too_large", max_bytes=limit)
+
+def request_encoding(header: Optional[str]) -> str:
+    enc = (header or "").strip().lower()
+    if enc in ("", "identity"):
+        return ""
+    if enc == "x-gzip":
+        return "gzip"
+    if enc not in REQUEST_ENCODINGS:
+        raise BodyRejected(415, "unsupported_content_encoding", encoding=enc, supported=list(REQUEST_ENCODINGS))
+    return enc
+
+def decode_body(data: bytes, encoding: str, limit: int) -> bytes:
+    # 해제 결과가 limit을 넘는 순간 멈춘다 (끝까지 풀어 본 뒤 검사하지 않음)
+    if not encoding:
+        return data
+    try:
+        if encoding == "gzip":
+            d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            out = d.decompress(data, limit + 1)
+            if len(out) > limit or d.unconsumed_tail:
+                raise too_large(limit)
+            out += d.flush()
+            if len(out) > limit:
+                raise too_large(limit)
+            return out
+        parts = []
+        total = 0
+        d = brotli.Decompressor()
+        for i in range(0, len(data), _CHUNK):
+            part = d.process(data[i:i + _CHUNK])
+            total += len(part)
+            if total > limit:
+                raise too_large(limit)
+            parts.append(part)
+        return b"".join(parts)
+    except BodyRejected:
+        raise
+    except Exception as e:
+        raise BodyRejected(400, "invalid_body_encoding", detail=str(e))
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    # q=0인 항목은 제외하고 br > gzip 순으로 고른다
+    offered: Dict[str, float] = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try: q = float(params[2:])
+            except ValueError: q = 0.0
+        if name:
+            offered[name] = q
+    for enc in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if offered.get(enc, offered.get("*", 0.0)) > 0:
+            return enc
+    return None
+
+def encode_body(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESS_BR_QUALITY)
+    return zlib.compress(data, COMPRESS_GZIP_LEVEL, wbits=16 + zlib.MAX_WBITS)
+
+def wants_compact(accept: Optional[str], fmt: Optional[str]) -> bool:
+    return fmt == "compact" or COMPACT_MEDIA_TYPE in (accept or "")
+
+def compact(out: Dict[str, Any]) -> Dict[str, Any]:
+    # 얕은 복사로 중복 필드만 뺀다 (큰 문자열은 복사하지 않음)
+    slim = {k: v for k, v in out.items() if k not in ("fixed_code", "patch")}
+    m = slim.get("metrics")
+    if isinstance(m, dict) and "comment" in m:
+        slim["metrics"] = {k: v for k, v in m.items() if k != "comment"}
+    return slim
@@ -0,0 +1,154 @@
+from __future__ import annotations
+import os, time, uuid, sqlite3, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from providers.metrics import log_event
+from providers.response import dumps_str, loads
+from providers.transport import DeadlineExceeded, deadline
+
+# ---- 비동기 분석 작업 (/analyze/jobs) ----
+# 작업 상태는 로컬 SQLite에 저장하므로 같은 호스트의 어느 gunicorn 워커든 폴링에 응답할 수 있다.
+JOBS_DB_PATH       = os.getenv("JOBS_DB") or os.path.join(tempfile.gettempdir(), "codewise-jobs.db")
+JOBS_WORKERS       = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_MAX_QUEUE     = int(os.getenv("JOBS_MAX_QUEUE", "32"))
+JOBS_TIMEOUT_SEC   = float(os.getenv("JOBS_TIMEOUT_SEC", "120"))
+JOBS_RETENTION_SEC = float(os.getenv("JOBS_RETENTION_SEC", "3600"))
+JOBS_LOST_SEC      = float(os.getenv("JOBS_LOST_SEC", "60"))   # 마감 뒤에도 running이면 워커가 사라진 것으로 본다
+
+QUEUED, RUNNING, DONE, FAILED, TIMEOUT = "queued", "running", "done", "failed", "timeout"
+_ACTIVE = (QUEUED, RUNNING)
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("job queue is full")
+        self.retry_after = retry_after
+
+class JobStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        d = os.path.dirname(os.path.abspath(path))
+        if d: os.makedirs(d, exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS analyze_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL, "
+            "started_at REAL, finished_at REAL, deadline REAL NOT NULL, "
+            "result TEXT, error TEXT)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id: str, deadline: float) -> None:
+        now = time.time()
+        c = self._conn()
+        c.execute("INSERT INTO analyze_jobs (id, status, created_at, deadline) VALUES (?, ?, ?, ?)",
+                  (job_id, QUEUED, now, deadline))
+        c.execute("DELETE FROM analyze_jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                  (now - JOBS_RETENTION_SEC,))
+
+    def transition(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+                   error: Optional[str] = None) -> bool:
+        # 아직 활성 상태인 작업만 전이시킨다 (타임아웃 처리된 작업을 늦게 끝난 워커가 덮어쓰지 않도록)
+        now = time.time()
+        if status == RUNNING:
+            cur = self._conn().execute(
+                "UPDATE analyze_jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, now, job_id, QUEUED))
+        else:
+            cur = self._conn().execute(
+                "UPDATE analyze_jobs SET status = ?, finished_at = ?, result = ?, error = ? "
+                "WHERE id = ? AND status IN (?, ?)",
+                (status, now, dumps_str(result) if result is not None else None,
+                 error, job_id, *_ACTIVE))
+        return cur.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT id, status, created_at, started_at, finished_at, deadline, result, error "
+            "FROM analyze_jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row: return None
+        job = {"jobId": row[0], "status": row[1], "created_at": row[2], "started_at": row[3],
+               "finished_at": row[4], "deadline": row[5]}
+        # 마감은 작업 스레드가 지킨다 (상류 호출에 남은 예산만 준다). 여기서는 실행되지 않을 작업만 정리한다:
+        # 마감까지 시작 못 한 작업, 마감이 한참 지나도 끝나지 않은 작업(워커 프로세스가 죽음)
+        now = time.time()
+        if job["status"] == QUEUED and now > job["deadline"]:
+            if self.transition(job_id, TIMEOUT, error="job timed out"):
+                return self.get(job_id)
+        elif job["status"] == RUNNING and now > job["deadline"] + JOBS_LOST_SEC:
+            if self.transition(job_id, FAILED, error="job worker lost"):
+                return self.get(job_id)
+        if row[6] is not None: job["result"] = loads(row[6])
+        if row[7] is not None: job["error"] = row[7]
+        return job
+
+class JobRunner:
+    def __init__(self, store: JobStore, workers: int = JOBS_WORKERS,
+                 max_queue: int = JOBS_MAX_QUEUE, timeout_sec: float = JOBS_TIMEOUT_SEC):
+        self.store = store
+        self.max_queue = max_queue
+        self.timeout_sec = timeout_sec
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyze-job")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0, "timeout": 0}
+
+    def submit(self, fn: Callable[..., Dict[str, Any]], **kwargs: Any) -> str:
+        # 어드미션 컨트롤: 이 워커에서 대기+실행 중인 작업 수가 한도를 넘으면 즉시 거절
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise QueueFull(retry_after=max(1, int(self.timeout_sec // 4)))
+            self._pending += 1
+            self._stats["submitted"] += 1
+        job_id = uuid.uuid4().hex
+        try:
+            self.store.create(job_id, time.time() + self.timeout_sec)
+            self._pool.submit(self._run, job_id, fn, kwargs)
+        except Exception:
+            with self._lock: self._pending -= 1
+            raise
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable[..., Dict[str, Any]], kwargs: Dict[str, Any]) -> None:
+        try:
+            job = self.store.get(job_id)
+            if not job or not self.store.transition(job_id, RUNNING):
+                self._count(TIMEOUT); return
+            try:
+                # 남은 예산이 이 작업의 상류 호출/대기의 timeout이 된다. 넘기면 호출을 끊고 슬롯을 돌려준다
+                with deadline(job["deadline"] - time.time()):
+                    out = fn(**kwargs)
+            except DeadlineExceeded:
+                self.store.transition(job_id, TIMEOUT, error="job timed out"); self._count(TIMEOUT)
+                return
+            except Exception as e:
+                log_event("job_failed", level="error", job_id=job_id, error=repr(e))
+                self.store.transition(job_id, FAILED, error=str(e)); self._count(FAILED)
+                return
+            if self.store.transition(job_id, DONE, result=out):
+                self._count(DONE)
+            else:
+                self._count(TIMEOUT)
+        finally:
+            with self._lock: self._pending -= 1
+
+    def _count(self, status: str) -> None:
+        with self._lock:
+            self._stats[status] += 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["pending"] = self._pending
+        out["max_queue"] = self.max_queue
+        return out
@@ -0,0 +1,179 @@
+from __future__ import annotations
+import os, json, time, hashlib, sqlite3, threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import log_event
+from .response import dumps, loads
+
+# ---- /analyze 결과 캐시 (메모리 LRU + 선택적 SQLite 디스크 계층) ----
+CACHE_ENABLED   = os.getenv("ANALYZE_CACHE", "1") == "1"
+CACHE_TTL_SEC   = float(os.getenv("ANALYZE_CACHE_TTL_SEC", "86400"))
+CACHE_MAX_BYTES = int(os.getenv("ANALYZE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_MAX_ITEMS = int(os.getenv("ANALYZE_CACHE_MAX_ITEMS", "4096"))
+CACHE_DB_PATH   = os.getenv("ANALYZE_CACHE_DB", "")  # 비어 있으면 디스크 계층 비활성화
+
+def normalize_code(code: str) -> str:
+    # 줄바꿈/행말 공백 차이만 있는 재제출은 같은 키로 취급 (선행 빈 줄은 라인 번호에 영향을 주므로 유지)
+    text = (code or "").replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(l.rstrip() for l in text.split("\n")).rstrip("\n")
+
+def profile_fingerprint(user_profile: Optional[Dict[str, Any]]) -> str:
+    if not isinstance(user_profile, dict) or not user_profile:
+        return ""
+    cached = getattr(user_profile, "fingerprint", None)   # profiles.Profile은 미리 계산해 둔다
+    if cached is not None:
+        return cached
+    try:
+        raw = json.dumps(user_profile, ensure_ascii=False, sort_keys=True, default=str)
+    except Exception:
+        raw = repr(sorted(user_profile.items(), key=lambda kv: str(kv[0])))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+def make_key(code: str, language: str, purpose: Optional[str],
+             user_profile: Optional[Dict[str, Any]], model: str, prompt_version: str) -> str:
+    h = hashlib.sha256()
+    for part in (prompt_version, model, language or "", purpose or "",
+                 profile_fingerprint(user_profile), normalize_code(code)):
+        h.update(part.encode("utf-8")); h.update(b"\x1f")
+    return h.hexdigest()
+
+class _DiskTier:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        d = os.path.dirname(os.path.abspath(path))
+        if d: os.makedirs(d, exist_ok=True)
+        with self._conn() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS analyze_cache ("
+                      "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value BLOB NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 여러 gunicorn 워커가 같은 파일을 공유하므로 WAL + busy timeout
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, now: float) -> Optional[Tuple[float, bytes]]:
+        row = self._conn().execute(
+            "SELECT expires_at, value FROM analyze_cache WHERE key = ?", (key,)).fetchone()
+        if not row: return None
+        if row[0] <= now:
+            self._conn().execute("DELETE FROM analyze_cache WHERE key = ?", (key,))
+            return None
+        return float(row[0]), bytes(row[1])
+
+    def set(self, key: str, expires_at: float, value: bytes) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO analyze_cache (key, expires_at, value) VALUES (?, ?, ?)",
+            (key, expires_at, value))
+
+class ResultCache:
+    def __init__(self, ttl_sec: float = CACHE_TTL_SEC, max_bytes: int = CACHE_MAX_BYTES,
+                 max_items: int = CACHE_MAX_ITEMS, db_path: str = "", enabled: bool = True):
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.enabled = enabled
+        self._mem: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk: Optional[_DiskTier] = None
+        if enabled and db_path:
+            try: self._disk = _DiskTier(db_path)
+            except Exception as e:
+                log_event("cache_disk_disabled", level="warning", path=db_path, error=repr(e))
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expired": 0}
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        return cls(db_path=CACHE_DB_PATH, enabled=CACHE_ENABLED)
+
+    def _count(self, name: str, n: int = 1) -> None:
+        self._stats[name] += n
+
+    def _mem_put(self, key: str, expires_at: float, blob: bytes) -> None:
+        old = self._mem.pop(key, None)
+        if old is not None: self._bytes -= len(old[1])
+        self._mem[key] = (expires_at, blob)
+        self._bytes += len(blob)
+        while self._mem and (self._bytes > self.max_bytes or len(self._mem) > self.max_items):
+            _, (_, ev) = self._mem.popitem(last=False)
+            self._bytes -= len(ev)
+            self._count("evictions")
+
+    def get(self, key: str, count: bool = True) -> Optional[Dict[str, Any]]:
+        # count=False: single-flight 재확인처럼 통계에 잡히면 안 되는 조회
+        if not self.enabled: return None
+        now = time.time()
+        with self._lock:
+            ent = self._mem.get(key)
+            if ent is not None:
+                if ent[0] > now:
+                    self._mem.move_to_end(key)
+                    if count: self._count("hits")
+                    return loads(ent[1])
+                self._mem.pop(key)
+                self._bytes -= len(ent[1])
+                self._count("expired")
+        if self._disk is not None:
+            try: found = self._disk.get(key, now)
+            except Exception: found = None
+            if found is not None:
+                with self._lock:
+                    self._mem_put(key, found[0], found[1])
+                    if count: self._count("disk_hits")
+                return loads(found[1])
+        if count:
+            with self._lock:
+                self._count("misses")
+        return None
+
+    def contains(self, key: str) -> bool:
+        # 역직렬화 없이 적중 여부만 (스케줄러가 캐시로 끝날 요청을 줄 세우지 않도록). 통계에는 넣지 않는다
+        if not self.enabled: return False
+        now = time.time()
+        with self._lock:
+            ent = self._mem.get(key)
+            if ent is not None and ent[0] > now:
+                return True
+        if self._disk is not None:
+            try: found = self._disk.get(key, now)
+            except Exception: found = None
+            if found is not None:
+                with self._lock:
+                    self._mem_put(key, found[0], found[1])
+                return True
+        return False
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        if not self.enabled: return
+        # 직렬화된 바이트로 보관해야 크기 기반 축출이 정확하고, 호출자 쪽 변경이 캐시에 새지 않는다
+        blob = dumps(value)
+        if len(blob) > self.max_bytes: return
+        expires_at = time.time() + self.ttl_sec
+        with self._lock:
+            self._mem_put(key, expires_at, blob)
+            self._count("sets")
+        if self._disk is not None:
+            try: self._disk.set(key, expires_at, blob)
+            except Exception as e:
+                log_event("cache_disk_write_failed", level="warning", error=repr(e))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear(); self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["items"] = len(self._mem)
+            out["bytes"] = self._bytes
+        lookups = out["hits"] + out["disk_hits"] + out["misses"]
+        out["hit_ratio"] = round((out["hits"] + out["disk_hits"]) / lookups, 4) if lookups else 0.0
+        out["disk"] = bool(self._disk)
+        return out
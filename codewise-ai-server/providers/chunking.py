@@ -0,0 +1,141 @@
+from __future__ import annotations
+import os, contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .fix_recovery import unified_patch
+from .metrics import log_event
+from .transport import Cancelled
+
+# ---- 대용량 파일 분할 분석 ----
+# 함수/클래스 경계(Python은 ast, C 계열은 중괄호 깊이 — local_analyzer의 functions 목록)에서 원본을 잘라
+# 조각마다 LLM을 동시에 호출하고, 조각 기준 라인 번호를 원본 기준으로 되돌린 뒤 fixed_code/patch를 하나로 합친다.
+CHUNKING_ENABLED  = os.getenv("ANALYZE_CHUNKING", "1") == "1"
+CHUNK_MIN_LINES   = int(os.getenv("ANALYZE_CHUNK_MIN_LINES", "400"))
+CHUNK_MIN_CHARS   = int(os.getenv("ANALYZE_CHUNK_MIN_CHARS", "24000"))
+CHUNK_TARGET_LINES = int(os.getenv("ANALYZE_CHUNK_TARGET_LINES", "150"))
+CHUNK_CONCURRENCY = int(os.getenv("ANALYZE_CHUNK_CONCURRENCY", "4"))
+
+# 경계를 위로 끌어올릴 때 함께 가져갈 줄 (데코레이터, 주석, 빈 줄)
+_LEAD_PREFIXES = ("@", "#", "//", "/*", "*")
+
+class Chunk:
+    __slots__ = ("index", "start", "end", "text")
+
+    def __init__(self, index: int, start: int, end: int, text: str):
+        self.index = index
+        self.start = start      # 원본 기준 첫 줄 (1부터)
+        self.end = end          # 원본 기준 마지막 줄 (포함)
+        self.text = text
+
+    @property
+    def offset(self) -> int:
+        return self.start - 1
+
+def should_chunk(code: str, report: Dict[str, Any]) -> bool:
+    if not CHUNKING_ENABLED:
+        return False
+    return report["metrics"]["loc"] >= CHUNK_MIN_LINES or len(code) >= CHUNK_MIN_CHARS
+
+def outer_functions(functions: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+    # 다른 함수 안에 들어 있지 않은 함수의 (시작, 끝) 줄
+    spans: List[Tuple[int, int]] = []
+    last_end = 0
+    for f in sorted(functions, key=lambda f: (f["line"], -f.get("end_line", f["line"]))):
+        if f["line"] > last_end:
+            end = max(f["line"], f.get("end_line", f["line"]))
+            spans.append((f["line"], end))
+            last_end = end
+    return spans
+
+def _cut_candidates(lines: List[str], functions: List[Dict[str, Any]]) -> List[int]:
+    # 새 조각이 시작될 수 있는 줄 번호(0부터) 목록
+    cuts = set()
+    for start, end in outer_functions(functions):
+        i = start - 1
+        while i > 0 and (not lines[i - 1].strip() or lines[i - 1].lstrip().startswith(_LEAD_PREFIXES)):
+            i -= 1
+        while i < start - 1 and not lines[i].strip():
+            i += 1
+        cuts.add(i)
+        cuts.add(end)
+    if not cuts:
+        # 구조를 못 구한 경우(문법 오류, 미지원 언어): 빈 줄 뒤에 들여쓰기 없이 시작하는 줄
+        for i in range(1, len(lines)):
+            if not lines[i - 1].strip() and lines[i][:1] not in ("", " ", "\t"):
+                cuts.add(i)
+    return sorted(c for c in cuts if 0 < c < len(lines))
+
+def split_chunks(code: str, functions: List[Dict[str, Any]],
+                 target_lines: int = CHUNK_TARGET_LINES) -> List[Chunk]:
+    lines = code.splitlines()
+    bounds = [0]
+    for c in _cut_candidates(lines, functions):
+        if c - bounds[-1] >= target_lines:
+            bounds.append(c)
+    # 꼬리가 너무 짧으면 앞 조각에 붙인다
+    if len(bounds) > 1 and len(lines) - bounds[-1] < target_lines // 4:
+        bounds.pop()
+    bounds.append(len(lines))
+    return [Chunk(n, s + 1, e, "\n".join(lines[s:e])) for n, (s, e) in enumerate(zip(bounds, bounds[1:]))]
+
+def remap_issue(it: Dict[str, Any], chunk: Chunk) -> Dict[str, Any]:
+    # 조각 기준 라인 -> 원본 기준 라인 (범위를 벗어나면 조각 안으로 자른다)
+    n = chunk.end - chunk.start + 1
+    line = min(max(int(it.get("line") or 1), 1), n)
+    return {**it, "line": line + chunk.offset}
+
+def run_chunks(
+    chunks: List[Chunk],
+    fn: Callable[[Chunk], Dict[str, Any]],
+    concurrency: int = CHUNK_CONCURRENCY,
+) -> List[Optional[Dict[str, Any]]]:
+    # 조각별 결과(실패한 조각은 None)를 원래 순서대로 돌려준다
+    def _one(ch: Chunk) -> Optional[Dict[str, Any]]:
+        try:
+            return fn(ch)
+        except Cancelled:
+            raise
+        except Exception as e:
+            log_event("chunk_failed", level="warning", start=ch.start, end=ch.end, error=repr(e))
+            return None
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks))),
+                            thread_name_prefix="analyze-chunk") as pool:
+        # 요청별 계측(contextvar)이 조각 스레드에도 이어지도록 조각마다 현재 컨텍스트를 복사해 실행
+        futures = [pool.submit(contextvars.copy_context().run, _one, ch) for ch in chunks]
+        return [f.result() for f in futures]
+
+def merge_results(
+    code: str,
+    chunks: List[Chunk],
+    results: List[Optional[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    # 조각 결과(summary, issues, fix.fixed_code — 이미 정규화된 값)를 원본 하나에 대한 모델 응답 형태로 합친다
+    summaries: List[str] = []
+    issues: List[Dict[str, Any]] = []
+    fixed_parts: List[str] = []
+    for ch, res in zip(chunks, results):
+        if res is None:
+            fixed_parts.append(ch.text)
+            continue
+        if res.get("summary"):
+            summaries.append(f"[L{ch.start}-{ch.end}] {res['summary']}")
+        issues.extend(remap_issue(it, ch) for it in res.get("issues") or [])
+        fc = res.get("fixed_code") or ""
+        if fc.strip():
+            # 모델이 조각 끝 빈 줄을 지우는 경우가 많아 원래 조각의 끝 빈 줄 수를 유지
+            fc = fc.rstrip("\n") + "\n" * (len(ch.text) - len(ch.text.rstrip("\n")))
+        fixed_parts.append(fc if fc.strip() else ch.text)
+
+    fixed = "\n".join(fixed_parts)
+    if code.endswith("\n"):
+        fixed += "\n"
+    changed = fixed != code
+    patch = unified_patch(code, fixed)
+    ok = sum(1 for r in results if r is not None)
+    head = f"Analyzed in {len(chunks)} chunks" + (f" ({len(chunks) - ok} failed)" if ok < len(chunks) else "") + "."
+    return {
+        "summary": " ".join([head] + summaries),
+        "issues": sorted(issues, key=lambda it: it["line"]),
+        "fix": {"strategy": "patch" if changed else "none", "patch": patch, "fixed_code": fixed},
+    }
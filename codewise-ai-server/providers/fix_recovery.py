@@ -0,0 +1,404 @@
+from __future__ import annotations
+import os, re, threading
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .linediff import line_diff
+from .metrics import event, log_event, stage
+from .transport import Cancelled
+
+# ---- fixed_code 복구 파이프라인 ----
+# 모델이 fix.fixed_code를 빠뜨렸을 때 LLM 재호출 없이 최대한 복구한다.
+#   1) fix.patch: 컨텍스트가 조금 어긋난 hunk도 오프셋 탐색 + fuzz(앞뒤 컨텍스트 줄 무시)로 적용
+#   2) issues[].patch: 스니펫/ed 형식/diff를 원본 위치에 맞춰 병합 (들여쓰기 보정, 겹침 제거)
+#   3) 그래도 남는 부분만 region 단위로 fix 재요청 (전체 코드 재전송 X)
+# 단계별 사용 횟수는 RECOVERY_STATS로 집계한다.
+DIFF_MAX_OFFSET   = int(os.getenv("RECOVERY_DIFF_MAX_OFFSET", "200"))
+DIFF_FUZZ         = int(os.getenv("RECOVERY_DIFF_FUZZ", "2"))
+REGION_CONTEXT    = int(os.getenv("RECOVERY_REGION_CONTEXT", "5"))
+REGION_MAX        = int(os.getenv("RECOVERY_REGION_MAX", "8"))
+REGION_RETRY      = os.getenv("RECOVERY_REGION_RETRY", "1") == "1"
+
+TIERS = ("model", "diff", "diff_fuzzy", "snippets", "region_retry", "partial", "no_change", "unrecovered")
+
+# (start 0-based, 원본에서 바뀌는 줄 수, 새 줄들)
+Edit = Tuple[int, int, List[str]]
+# region 재요청: (시작 줄, 끝 줄(포함), 해당 구간 이슈 메시지들) -> {region 인덱스: 교체 코드}
+RegionRetry = Callable[[str, List[Tuple[int, int, List[str]]]], Dict[int, str]]
+
+class _RecoveryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tiers: Dict[str, int] = {t: 0 for t in TIERS}
+        self.fuzzy_hunks = 0
+        self.failed_hunks = 0
+        self.region_calls = 0
+        self.region_failures = 0
+
+    def hit(self, tier: str) -> None:
+        with self._lock:
+            self.tiers[tier] = self.tiers.get(tier, 0) + 1
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for k, v in counts.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(self.tiers.values())
+            return {"tiers": dict(self.tiers), "total": total,
+                    "llm_retry_ratio": round(self.tiers["region_retry"] / total, 4) if total else 0.0,
+                    "fuzzy_hunks": self.fuzzy_hunks, "failed_hunks": self.failed_hunks,
+                    "region_calls": self.region_calls, "region_failures": self.region_failures}
+
+RECOVERY_STATS = _RecoveryStats()
+
+def _norm(s: str) -> str:
+    return " ".join(s.split())
+
+# ---- unified diff (관대한 적용) ----
+_HUNK_HDR = re.compile(r"^@@\s*-(\d+)(?:,(\d+))?\s+\+(\d+)(?:,(\d+))?\s*@@")
+
+class Hunk:
+    __slots__ = ("start", "ops")
+
+    def __init__(self, start: Optional[int]):
+        self.start = start                      # 헤더의 원본 시작 줄 (1부터). 헤더가 깨졌으면 None
+        self.ops: List[Tuple[str, str]] = []    # (" " | "-" | "+", text)
+
+def parse_hunks(diff_text: str) -> List[Hunk]:
+    hunks: List[Hunk] = []
+    cur: Optional[Hunk] = None
+    lines = diff_text.splitlines()
+    for k, ln in enumerate(lines):
+        if ln.startswith("@@"):
+            m = _HUNK_HDR.match(ln)
+            cur = Hunk(int(m.group(1)) if m else None)
+            hunks.append(cur)
+            continue
+        if cur is None or ln.startswith("\\"):
+            continue
+        if ln.startswith("--- ") and k + 1 < len(lines) and lines[k + 1].startswith("+++ "):
+            cur = None   # 다음 파일 헤더
+            continue
+        tag = ln[:1]
+        if tag in ("-", "+"):
+            cur.ops.append((tag, ln[1:]))
+        elif tag == " ":
+            cur.ops.append((" ", ln[1:]))
+        else:
+            # 앞 공백이 빠진 컨텍스트 줄(빈 줄 포함)도 컨텍스트로 받아준다
+            cur.ops.append((" ", ln))
+    return [h for h in hunks if any(t != " " for t, _ in h.ops)]
+
+def _trim_context(ops: List[Tuple[str, str]], fuzz: int) -> Tuple[List[Tuple[str, str]], int]:
+    # 앞뒤 컨텍스트 줄을 최대 fuzz개씩 버린다. 버린 앞쪽 줄 수도 돌려준다
+    lead = 0
+    while lead < fuzz and lead < len(ops) and ops[lead][0] == " ":
+        lead += 1
+    trail = 0
+    while trail < fuzz and len(ops) - trail > lead and ops[len(ops) - 1 - trail][0] == " ":
+        trail += 1
+    return ops[lead:len(ops) - trail], lead
+
+def _find_block(norm_lines: List[str], block: List[str], hint: Optional[int], max_offset: int) -> Optional[int]:
+    n, m = len(norm_lines), len(block)
+    if m == 0 or m > n:
+        return None
+    if hint is None:
+        positions = range(0, n - m + 1)
+    else:
+        hint = min(max(hint, 0), max(0, n - m))
+        positions = [hint]
+        for d in range(1, max_offset + 1):
+            if hint - d >= 0: positions.append(hint - d)
+            if hint + d <= n - m: positions.append(hint + d)
+            if hint - d < 0 and hint + d > n - m: break
+    first = block[0]
+    for p in positions:
+        if norm_lines[p] == first and norm_lines[p:p + m] == block:
+            return p
+    return None
+
+def _locate_hunk(lines: List[str], norm_lines: List[str], h: Hunk, hint: Optional[int]) -> Optional[Tuple[Edit, bool]]:
+    for fuzz in range(0, DIFF_FUZZ + 1):
+        ops, lead = _trim_context(h.ops, fuzz) if fuzz else (h.ops, 0)
+        if fuzz and lead == 0 and len(ops) == len(h.ops):
+            break   # 더 버릴 컨텍스트가 없음
+        old = [_norm(t) for tag, t in ops if tag != "+"]
+        h_hint = None if hint is None else hint + lead
+        if not old:
+            # 순수 삽입 hunk: 헤더 위치를 믿는다
+            if h_hint is None:
+                return None
+            pos = min(max(h_hint, 0), len(lines))
+            return (pos, 0, [t for tag, t in ops if tag == "+"]), False
+        pos = _find_block(norm_lines, old, h_hint, DIFF_MAX_OFFSET)
+        if pos is None:
+            continue
+        new: List[str] = []
+        k = pos
+        for tag, t in ops:
+            if tag == " ":
+                new.append(lines[k]); k += 1     # 컨텍스트는 원본 줄(원래 공백) 유지
+            elif tag == "-":
+                k += 1
+            else:
+                new.append(t)
+        raw_exact = all(lines[pos + j] == t for j, t in enumerate(t for tag, t in ops if tag != "+"))
+        return (pos, len(old), new), bool(fuzz) or pos != h_hint or not raw_exact
+    return None
+
+def apply_edits(lines: List[str], edits: List[Edit]) -> Tuple[List[str], List[Edit], List[Edit]]:
+    # 겹치지 않는 편집만 적용. (결과 줄, 적용된 편집, 겹쳐서 버린 편집)
+    out: List[str] = []
+    applied: List[Edit] = []; rejected: List[Edit] = []
+    i = 0
+    for e in sorted(edits, key=lambda e: (e[0], e[1])):
+        pos, n_old, new = e
+        if pos < i:
+            rejected.append(e); continue
+        out.extend(lines[i:pos]); out.extend(new)
+        i = pos + n_old
+        applied.append(e)
+    out.extend(lines[i:])
+    return out, applied, rejected
+
+def unified_patch(original_text: str, fixed_text: str) -> str:
+    # 원본 대비 fixed_code의 unified diff (같으면 빈 문자열). 계산/캐시는 linediff
+    if original_text == fixed_text:
+        return ""
+    return line_diff(original_text, fixed_text).patch
+
+def _shift(line: int, applied: List[Edit]) -> int:
+    # 원본 줄 번호(1부터) -> 편집 적용 후 줄 번호
+    return line + sum(len(new) - n_old for pos, n_old, new in applied if pos < line - 1)
+
+_LEADING_INT = re.compile(r"\s*(\d+)")
+
+def _issue_line(it: Dict[str, Any]) -> int:
+    # 이슈의 line (1부터). "12-14" 같은 범위는 시작 줄, 숫자가 아니면 0
+    m = _LEADING_INT.match(str(it.get("line") or ""))
+    return int(m.group(1)) if m else 0
+
+class DiffResult:
+    __slots__ = ("text", "applied", "failed", "fuzzy", "edits")
+
+    def __init__(self, text: Optional[str], applied: int, failed: List[Tuple[int, int]], fuzzy: int,
+                 edits: Optional[List[Edit]] = None):
+        self.text = text          # 하나 이상 적용됐으면 결과 텍스트
+        self.applied = applied
+        self.failed = failed      # 못 붙인 hunk의 (결과 기준 시작 줄, 줄 수)
+        self.fuzzy = fuzzy
+        self.edits = edits or []  # 적용된 편집 (원본 줄 번호를 결과 기준으로 옮길 때)
+
+def apply_diff(original_text: str, diff_text: str) -> DiffResult:
+    lines = original_text.splitlines()
+    norm_lines = [_norm(l) for l in lines]
+    edits: List[Edit] = []
+    failed_orig: List[Tuple[int, int]] = []
+    fuzzy = 0
+    offset = 0   # 앞 hunk에서 찾은 실제 위치와 헤더의 차이를 다음 hunk 탐색에 반영 (GNU patch와 같은 방식)
+    for h in parse_hunks(diff_text or ""):
+        hint = None if h.start is None else max(0, h.start - 1) + offset
+        found = _locate_hunk(lines, norm_lines, h, hint)
+        n_old = sum(1 for t, _ in h.ops if t != "+")
+        if found is None:
+            failed_orig.append(((hint or 0) + 1, max(1, n_old)))
+            continue
+        edit, is_fuzzy = found
+        if h.start is not None:
+            offset = edit[0] - (h.start - 1)
+        edits.append(edit); fuzzy += int(is_fuzzy)
+    if not edits:
+        return DiffResult(None, 0, failed_orig, 0)
+    out, applied, rejected = apply_edits(lines, edits)
+    failed_orig += [(pos + 1, max(1, n_old)) for pos, n_old, _ in rejected]
+    failed = [(_shift(s, applied), n) for s, n in failed_orig]
+    return DiffResult("\n".join(out), len(applied), failed, fuzzy, applied)
+
+# ---- issues[].patch 스니펫 병합 ----
+_ED_CHANGE_HDR = re.compile(r"^\s*\d+\s*[acd]\s*\d+\s*$")
+
+def sanitize_snippet(raw: str) -> str:
+    if not raw: return ""
+    lines = [l.rstrip("\r") for l in raw.splitlines()]
+    out: List[str] = []
+    in_block = False
+    for ln in lines:
+        if _ED_CHANGE_HDR.match(ln):
+            in_block = True
+            continue
+        if ln.strip() == "---":
+            continue
+        if ln.startswith(">"):
+            out.append(ln[1:].lstrip()); continue
+        if ln.startswith("<"):
+            continue
+        if not in_block:
+            out.append(ln)
+    cleaned = "\n".join(out).strip()
+    return cleaned if cleaned else raw
+
+def _indent(s: str) -> str:
+    return s[:len(s) - len(s.lstrip())]
+
+def _place_snippet(lines: List[str], norm_lines: List[str], ln: int, snippet: List[str]) -> Edit:
+    # 이슈 라인 근처(±1)에서 스니펫과 가장 비슷한 원본 구간을 골라 그 구간을 교체한다
+    idx = ln - 1
+    if not (0 <= idx < len(lines)):
+        return (len(lines), 0, ([""] if lines and lines[-1] != "" else []) + snippet)
+    snip_norm = "\n".join(_norm(s) for s in snippet)
+    best = (0.0, idx, 1)
+    for s in (idx, idx - 1, idx + 1):
+        if not (0 <= s < len(lines)):
+            continue
+        for k in range(1, min(len(snippet) + 1, len(lines) - s) + 1):
+            score = SequenceMatcher(None, "\n".join(norm_lines[s:s + k]), snip_norm, autojunk=False).ratio()
+            # 같은 점수면 원래 이슈 라인에서 시작하는 쪽을 우선
+            if score > best[0] + 1e-9:
+                best = (score, s, k)
+    _, start, k = best if best[0] >= 0.3 else (0.0, idx, 1)
+    base = _indent(lines[start])
+    if base and snippet and not any(_indent(s) for s in snippet if s.strip()):
+        # 모델이 들여쓰기를 지운 스니펫은 원본 줄의 들여쓰기에 맞춘다
+        snippet = [base + s if s.strip() else s for s in snippet]
+    return (start, k, snippet)
+
+class SnippetResult:
+    __slots__ = ("text", "applied", "failed_lines", "edits")
+
+    def __init__(self, text: Optional[str], applied: int, failed_lines: List[int],
+                 edits: Optional[List[Edit]] = None):
+        self.text = text
+        self.applied = applied
+        self.failed_lines = failed_lines   # 결과 기준 줄 번호
+        self.edits = edits or []
+
+def merge_snippets(original_text: str, issues: List[Dict[str, Any]]) -> SnippetResult:
+    lines = original_text.splitlines()
+    norm_lines = [_norm(l) for l in lines]
+    edits: List[Edit] = []
+    owner: Dict[int, int] = {}          # id(edit) -> 이슈 라인
+    failed: List[int] = []
+    for it in issues or []:
+        p = (it.get("patch") or "").strip()
+        if not p: continue
+        ln = _issue_line(it)
+        if "@@" in p and p.lstrip().startswith(("---", "@@")):
+            # 이슈별 unified diff도 원본 좌표로 풀어 같은 편집 목록에 넣는다
+            for h in parse_hunks(p):
+                hint = None if h.start is None else h.start - 1
+                found = _locate_hunk(lines, norm_lines, h, hint)
+                if found is None:
+                    failed.append(ln or (h.start or 1))
+                else:
+                    edits.append(found[0]); owner[id(found[0])] = ln
+            continue
+        snippet = sanitize_snippet(p).splitlines()
+        e = _place_snippet(lines, norm_lines, ln, snippet)
+        if e[1] and [_norm(s) for s in e[2]] == norm_lines[e[0]:e[0] + e[1]]:
+            continue   # 바뀌는 것이 없는 스니펫
+        edits.append(e); owner[id(e)] = ln
+    if not edits:
+        return SnippetResult(None, 0, failed)
+    out, applied, rejected = apply_edits(lines, edits)
+    failed += [owner.get(id(e), e[0] + 1) for e in rejected]
+    return SnippetResult("\n".join(out), len(applied), [_shift(l, applied) for l in failed if l > 0], applied)
+
+# ---- 단계별 복구 ----
+def regions_for(lines_total: int, line_numbers: List[int], context: int = REGION_CONTEXT,
+                max_regions: int = REGION_MAX) -> List[Tuple[int, int]]:
+    # 문제 줄 주변 ±context 구간을 겹치면 합쳐서 (시작, 끝) 목록으로
+    spans: List[Tuple[int, int]] = []
+    for ln in sorted(set(l for l in line_numbers if l > 0)):
+        s, e = max(1, ln - context), min(lines_total, ln + context)
+        if spans and s <= spans[-1][1] + 1:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], e))
+        else:
+            spans.append((s, e))
+    if len(spans) > max_regions:
+        spans = [(spans[0][0], spans[-1][1])]
+    return spans
+
+def _splice_regions(text: str, regions: List[Tuple[int, int]], replacements: Dict[int, str]) -> Optional[str]:
+    lines = text.splitlines()
+    done = 0
+    # 모델이 없는 region id를 돌려줘도 나머지 교체는 살린다 (거른 뒤 아래쪽 구간부터)
+    valid = [i for i in replacements if 0 <= i < len(regions) and (replacements[i] or "").strip()]
+    for i in sorted(valid, key=lambda i: regions[i][0], reverse=True):
+        s, e = regions[i]
+        lines[s - 1:e] = replacements[i].rstrip("\n").splitlines()
+        done += 1
+    return "\n".join(lines) if done else None
+
+def recover_fixed(
+    code: str,
+    fix: Dict[str, Any],
+    issues: List[Dict[str, Any]],
+    retry: Optional[RegionRetry] = None,
+    record: bool = True,
+) -> Tuple[str, str]:
+    # (fixed_code, 사용한 단계). 실패하면 원본 그대로와 "unrecovered"
+    tier, fixed = _recover(code, fix, issues, retry if REGION_RETRY else None)
+    if record:
+        RECOVERY_STATS.hit(tier)
+        event("recovery", tier)
+    return fixed, tier
+
+def _recover(code: str, fix: Dict[str, Any], issues: List[Dict[str, Any]],
+             retry: Optional[RegionRetry]) -> Tuple[str, str]:
+    fixed = str((fix or {}).get("fixed_code") or "")
+    if fixed.strip():
+        return "model", fixed
+
+    base, tier = code, ""
+    applied: List[Edit] = []   # base에 적용된 편집 (이슈의 원본 줄 번호 -> base 줄 번호)
+    pending: List[int] = []
+    diff_text = str((fix or {}).get("patch") or "")
+    if diff_text.strip():
+        with stage("recovery_diff"):
+            res = apply_diff(code, diff_text)
+        RECOVERY_STATS.add(fuzzy_hunks=res.fuzzy, failed_hunks=len(res.failed))
+        if res.text is not None:
+            base, tier, applied = res.text, ("diff_fuzzy" if res.fuzzy else "diff"), res.edits
+            pending = [s + j for s, n in res.failed for j in range(n)]
+            if not pending:
+                return tier, base
+
+    if not tier:
+        with stage("recovery_snippets"):
+            res2 = merge_snippets(code, issues)
+        if res2.text is not None:
+            base, tier, applied = res2.text, "snippets", res2.edits
+            pending = res2.failed_lines
+            if not pending:
+                return tier, base
+        else:
+            # 패치가 전혀 없으면 이슈 라인 주변만 다시 요청
+            pending = [_issue_line(it) for it in issues or [] if it.get("severity") != "info"]
+            if not pending:
+                return "no_change", code
+
+    if retry is not None and pending:
+        regions = regions_for(len(base.splitlines()), pending)
+        # regions는 base 기준이므로 이슈 줄도 base 기준으로 옮겨서 고른다
+        placed = [(_shift(ln, applied), it) for it in issues or [] for ln in (_issue_line(it),) if ln > 0]
+        msgs = [[f"line {ln}: {it.get('message', '')}" for ln, it in placed if s <= ln <= e] for s, e in regions]
+        RECOVERY_STATS.add(region_calls=1)
+        try:
+            replaced = _splice_regions(base, regions, retry(base, [(s, e, m) for (s, e), m in zip(regions, msgs)]))
+        except Cancelled:
+            raise
+        except Exception as ex:
+            event("recovery_error", "region_retry")
+            log_event("recovery_region_retry_failed", error=repr(ex))
+            replaced = None
+        if replaced is not None:
+            return "region_retry", replaced
+        RECOVERY_STATS.add(region_failures=1)
+
+    if base != code:
+        return "partial", base
+    return "unrecovered", code
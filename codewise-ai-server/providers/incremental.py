@@ -0,0 +1,141 @@
+from __future__ import annotations
+import os, threading
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+from .chunking import outer_functions
+from .fix_recovery import Edit, apply_edits
+
+# ---- 증분 재분석 ----
+# 이전 제출본과 새 코드를 줄 단위로 비교해 바뀐 줄이 속한 함수(없으면 ±context 줄)만 다시 분석하고,
+# 바뀌지 않은 구간의 이슈/수정 사항은 줄 번호만 옮겨서 재사용한다.
+INCREMENTAL_ENABLED    = os.getenv("ANALYZE_INCREMENTAL", "1") == "1"
+INCREMENTAL_MAX_CHANGE = float(os.getenv("ANALYZE_INCREMENTAL_MAX_CHANGE", "0.5"))
+INCREMENTAL_CONTEXT    = int(os.getenv("ANALYZE_INCREMENTAL_CONTEXT", "3"))
+
+Opcodes = List[Tuple[str, int, int, int, int]]
+
+class _IncrementalStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.fallbacks = 0          # 이전 제출본은 찾았지만 변경이 커서 전체 분석
+        self.total_lines = 0
+        self.reanalyzed_lines = 0
+        self.carried_issues = 0
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for k, v in counts.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"runs": self.runs, "fallbacks": self.fallbacks, "carried_issues": self.carried_issues,
+                    "reanalyzed_ratio": round(self.reanalyzed_lines / self.total_lines, 4) if self.total_lines else 0.0}
+
+INCREMENTAL_STATS = _IncrementalStats()
+
+class Plan:
+    __slots__ = ("opcodes", "regions", "changed_lines")
+
+    def __init__(self, opcodes: Opcodes, regions: List[Tuple[int, int]], changed_lines: int):
+        self.opcodes = opcodes          # 이전 코드 -> 새 코드 (SequenceMatcher, 0부터)
+        self.regions = regions          # 새 코드 기준 재분석 구간 (시작, 끝) 1부터, 끝 포함
+        self.changed_lines = changed_lines
+
+    @property
+    def reanalyzed_lines(self) -> int:
+        return sum(e - s + 1 for s, e in self.regions)
+
+def line_opcodes(a: List[str], b: List[str]) -> Opcodes:
+    # 빈 줄/괄호 줄이 많아 autojunk를 켜면 큰 파일에서 정렬이 틀어진다
+    return SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+
+def map_line(opcodes: Opcodes, i: int) -> Optional[int]:
+    # 이전 코드의 줄(0부터) -> 새 코드의 줄. 바뀐 줄이면 None
+    for tag, i1, i2, j1, j2 in opcodes:
+        if i1 <= i < i2:
+            return j1 + (i - i1) if tag == "equal" else None
+    return None
+
+def plan_incremental(prev_code: str, code: str, functions: List[Dict[str, Any]]) -> Optional[Plan]:
+    # 바뀐 줄이 너무 많으면(None) 전체 분석이 낫다
+    prev_lines, lines = prev_code.splitlines(), code.splitlines()
+    opcodes = line_opcodes(prev_lines, lines)
+    changed: List[int] = []   # 새 코드 기준 줄 (1부터)
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            continue
+        if j2 > j1:
+            changed.extend(range(j1 + 1, j2 + 1))
+        else:
+            # 삭제만 있는 경우 맞닿은 두 줄을 변경으로 본다
+            changed.extend(l for l in (j1, j1 + 1) if 1 <= l <= len(lines))
+    spans = outer_functions(functions)
+    regions: List[Tuple[int, int]] = []
+    for ln in sorted(set(changed)):
+        if regions and regions[-1][0] <= ln <= regions[-1][1]:
+            continue
+        scope = next(((s, e) for s, e in spans if s <= ln <= e), None)
+        if scope is None:
+            scope = (max(1, ln - INCREMENTAL_CONTEXT), min(len(lines), ln + INCREMENTAL_CONTEXT))
+        if regions and scope[0] <= regions[-1][1] + 1:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], scope[1]))
+        else:
+            regions.append(scope)
+    plan = Plan(opcodes, regions, len(set(changed)))
+    if lines and plan.reanalyzed_lines > INCREMENTAL_MAX_CHANGE * len(lines):
+        return None
+    return plan
+
+def _in_regions(line: int, regions: List[Tuple[int, int]]) -> bool:
+    return any(s <= line <= e for s, e in regions)
+
+def carry_issues(prev_issues: List[Dict[str, Any]], plan: Plan) -> List[Dict[str, Any]]:
+    # 바뀌지 않은 줄의 이슈만 새 줄 번호로 옮긴다 (재분석 구간 안은 새 결과로 대체)
+    out: List[Dict[str, Any]] = []
+    for it in prev_issues or []:
+        try: line = int(it.get("line") or 0)
+        except Exception: continue
+        j = map_line(plan.opcodes, line - 1) if line > 0 else None
+        if j is None or _in_regions(j + 1, plan.regions):
+            continue
+        out.append({**it, "line": j + 1})
+    return out
+
+def carry_fix_edits(prev_code: str, prev_fixed: str, plan: Plan) -> List[Edit]:
+    # 이전 fixed_code가 이전 코드에 가한 수정(hunk) 중 통째로 바뀌지 않은 구간에 있는 것만 새 코드 좌표로 옮긴다
+    if not prev_fixed.strip():
+        return []
+    prev_lines, fixed_lines = prev_code.splitlines(), prev_fixed.splitlines()
+    edits: List[Edit] = []
+    for tag, i1, i2, j1, j2 in line_opcodes(prev_lines, fixed_lines):
+        if tag == "equal":
+            continue
+        if i2 > i1:
+            start, last = map_line(plan.opcodes, i1), map_line(plan.opcodes, i2 - 1)
+            if start is None or last is None or last - start != i2 - 1 - i1:
+                continue
+        else:
+            # 순수 삽입: 바로 앞 줄이 그대로 남아 있을 때만 그 뒤에 넣는다
+            prev_at = map_line(plan.opcodes, i1 - 1) if i1 > 0 else -1
+            if prev_at is None:
+                continue
+            start = prev_at + 1
+        n_old = i2 - i1
+        lo, hi = start + 1, start + max(n_old, 1)
+        if any(s <= hi and lo <= e for s, e in plan.regions):
+            continue
+        edits.append((start, n_old, fixed_lines[j1:j2]))
+    return edits
+
+def rebuild_fixed(code: str, carried: List[Edit], regions: List[Tuple[int, int, Optional[str]]]) -> str:
+    # 새 코드 위에 (옮겨 온 이전 수정 + 재분석 구간의 수정 결과)를 적용
+    edits = list(carried)
+    for s, e, fixed in regions:
+        if fixed is not None and fixed.strip():
+            edits.append((s - 1, e - s + 1, fixed.rstrip("\n").splitlines()))
+    out, _, _ = apply_edits(code.splitlines(), edits)
+    text = "\n".join(out)
+    return text + "\n" if code.endswith("\n") else text
@@ -0,0 +1,98 @@
+from __future__ import annotations
+import json
+from typing import Any, List, Optional, Tuple
+
+# ---- 스트리밍 JSON 증분 파서 ----
+# 모델이 토큰 단위로 내보내는 최상위 JSON 객체를 따라가면서
+#   ("field", key, value)  : 최상위 키의 값이 완성됐을 때 (summary, metrics, fix ...)
+#   ("item",  key, value)  : 최상위 배열(issues 등)의 원소 하나가 완성됐을 때
+# 이벤트를 돌려준다. 이미 본 문자는 다시 훑지 않으므로 전체 비용은 입력 길이에 선형.
+
+_WS = " \t\r\n"
+_DELIMS = ",]}:" + _WS
+
+class _Frame:
+    __slots__ = ("kind", "start", "key", "expect")
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind            # "obj" | "arr"
+        self.start = start
+        self.key: Optional[str] = None
+        self.expect = "key" if kind == "obj" else "value"
+
+class StreamingJSONScanner:
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.done = False
+        self._stack: List[_Frame] = []
+        self._in_str = False
+        self._esc = False
+        self._str_start = -1
+        self._str_is_key = False
+        self._prim_start = -1
+
+    def feed(self, chunk: str) -> List[Tuple[str, Optional[str], Any]]:
+        events: List[Tuple[str, Optional[str], Any]] = []
+        if not chunk or self.done:
+            return events
+        self.text += chunk
+        text, stack = self.text, self._stack
+        i = self.pos
+        n = len(text)
+        while i < n:
+            ch = text[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    if self._str_is_key:
+                        try: stack[-1].key = json.loads(text[self._str_start:i + 1])
+                        except Exception: stack[-1].key = None
+                    else:
+                        self._complete(self._str_start, i + 1, events)
+                i += 1
+                continue
+
+            if self._prim_start >= 0 and ch in _DELIMS:
+                self._complete(self._prim_start, i, events)
+                self._prim_start = -1
+
+            if ch == '"':
+                self._in_str = True
+                self._str_start = i
+                self._str_is_key = bool(stack) and stack[-1].kind == "obj" and stack[-1].expect == "key"
+            elif ch in "{[":
+                stack.append(_Frame("obj" if ch == "{" else "arr", i))
+            elif ch in "}]":
+                if stack:
+                    fr = stack.pop()
+                    self._complete(fr.start, i + 1, events)
+                    if not stack:
+                        self.done = True
+                        i += 1
+                        break
+            elif ch == ":":
+                if stack: stack[-1].expect = "value"
+            elif ch == ",":
+                if stack and stack[-1].kind == "obj": stack[-1].expect = "key"
+            elif ch not in _WS and self._prim_start < 0 and stack:
+                self._prim_start = i
+            i += 1
+        self.pos = i
+        return events
+
+    def _complete(self, start: int, end: int, events: List[Tuple[str, Optional[str], Any]]) -> None:
+        stack = self._stack
+        if len(stack) == 1 and stack[0].kind == "obj":
+            kind, key = "field", stack[0].key
+        elif len(stack) == 2 and stack[0].kind == "obj" and stack[1].kind == "arr":
+            kind, key = "item", stack[0].key
+        else:
+            return
+        try: value = json.loads(self.text[start:end])
+        except Exception: return
+        events.append((kind, key, value))
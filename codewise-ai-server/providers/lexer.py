@@ -0,0 +1,195 @@
+from __future__ import annotations
+import re
+from itertools import compress, count, repeat
+from operator import contains
+from typing import Dict, List, Optional, Set, Tuple
+
+# ---- 단일 패스 라인 분류 렉서 ----
+# 주석/문자열만 골라내는 정규식 하나로 원문을 한 번 치환하면서
+#   주석 -> 줄마다 표식 문자 \x00, 문자열 -> "S" (줄바꿈은 보존, TODO/FIXME는 치환 중에 집계)
+# 으로 바꾼 뒤, 표식이 남은 텍스트를 한 번 split 해서 blank / comment / code 줄 수를 센다.
+# 줄마다 splitlines + 문자 단위 스캔을 반복하지 않고, 블록 주석 안의 문자열·문자열 안의 주석 기호,
+# Python docstring도 올바르게 구분한다.
+# # 주석 언어의 line_stats는 같은 토큰 규칙을 치환 대신 split 결과 위에서 적용해 센다 (_hash_line_stats).
+C_LIKE_LANGS = ("c","cpp","java","javascript","typescript","csharp","go","rust","kotlin","swift","php")
+HASH_COMMENT_LANGS = ("python","ruby")
+# 작은따옴표가 문자열인 언어. 나머지 C 계열은 문자 리터럴('a', '\\n')만 인정한다
+# (러스트 수명 'a, C++14 자릿수 구분 1'000'000 을 닫히지 않은 문자열로 읽지 않도록)
+SQ_STRING_LANGS = ("javascript","typescript","php")
+
+# 문자열/블록 주석은 unrolled-loop 형태로 써서 문자마다 alternation 을 시도하지 않게 한다
+_C_COMMENT = r"//[^\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|/\*.*\Z"
+_DQ_STRING = r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"?'
+_SQ_STRING = r"'[^'\\\n]*(?:\\.[^'\\\n]*)*'?"
+_SQ_CHAR   = r"'(?:\\[^\n][^'\\\n]*|[^'\\\n])'"
+_BQ_STRING = r"`[^`\\]*(?:\\.[^`\\]*)*`?"
+
+_C_SPECIAL      = re.compile("|".join((_C_COMMENT, _DQ_STRING, _SQ_STRING, _BQ_STRING)), re.S)
+_C_CHAR_SPECIAL = re.compile("|".join((_C_COMMENT, _DQ_STRING, _SQ_CHAR, _BQ_STRING)), re.S)
+
+_HASH_SPECIAL = re.compile(r"""
+    \#[^\n]*
+  | \"\"\"[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*(?:\"\"\"|\Z)
+  | '''[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*(?:'''|\Z)
+  | "[^"\\\n]*(?:\\.[^"\\\n]*)*"?
+  | '[^'\\\n]*(?:\\.[^'\\\n]*)*'?
+""", re.X | re.S)
+
+# line_stats 전용: 같은 토큰으로 split 한 번(C 수준) 해서 [코드, 토큰, 코드, ...]를 얻는다. 일치 항목마다 콜백을
+# 부르는 sub보다 훨씬 싸고, 줄의 첫 토큰인지(docstring) 따질 것은 삼중 따옴표 문자열뿐이다.
+# (캡처 그룹은 바깥 하나만: 그룹을 나누면 sre의 첫 글자 최적화가 꺼져 몇 배 느려진다)
+_HASH_SPLIT = re.compile("(" + _HASH_SPECIAL.pattern + ")", re.X | re.S)
+_TRIPLE_QUOTES = ('"""', "'''")
+
+_TODO_LINE = re.compile(r"^[^\n]*?(?:TODO|FIXME)", re.M)
+_DROP_MARK = {0: None}
+_MARK_OR_SPACE = "\x00 \t\r\f\v"
+
+def _string_marks(text: str) -> str:
+    n = text.count("\n")
+    return "S" + "\nS" * n if n else "S"
+
+def _mark(code: str, lang: str) -> Tuple[Optional[str], int]:
+    # (표식 치환된 텍스트, TODO/FIXME 주석 줄 수). 주석 문법을 모르는 언어는 (None, 0)
+    todos = 0
+
+    def _comment(text: str) -> str:
+        nonlocal todos
+        if "TODO" in text or "FIXME" in text:
+            todos += sum(1 for l in text.split("\n") if "TODO" in l or "FIXME" in l)
+        return "\x00" + "\n\x00" * text.count("\n")
+
+    def _c_repl(m: "re.Match[str]") -> str:
+        t = m.group()
+        return _comment(t) if t[0] == "/" else _string_marks(t)
+
+    def _hash_repl(m: "re.Match[str]") -> str:
+        t = m.group()
+        if t[0] == "#":
+            return _comment(t)
+        if t[:3] in ('"""', "'''"):
+            # 줄의 첫 토큰으로 나온 삼중 따옴표 문자열은 docstring(주석)으로 취급
+            start = m.start()
+            if not code[code.rfind("\n", 0, start) + 1:start].strip():
+                return _comment(t)
+        return _string_marks(t)
+
+    if lang in C_LIKE_LANGS:
+        return (_C_SPECIAL if lang in SQ_STRING_LANGS else _C_CHAR_SPECIAL).sub(_c_repl, code), todos
+    if lang in HASH_COMMENT_LANGS:
+        return _HASH_SPECIAL.sub(_hash_repl, code), todos
+    return None, 0
+
+def _with(lines: List[str], needle: str) -> List[str]:
+    # needle이 들어 있는 줄들 (줄마다 바이트코드 없이 C 수준 map/compress로)
+    return list(compress(lines, map(contains, lines, repeat(needle))))
+
+def _hash_line_stats(code: str, n_lines: int) -> Dict[str, int]:
+    # _mark(code, lang)과 같은 표식 규칙을 split 결과 위에서 적용한다 (표식 치환 없이 줄 수만 필요할 때)
+    parts = _HASH_SPLIT.split(code)
+    toks = parts[1::2]
+    comments = list(compress(toks, map(str.startswith, toks, repeat("#"))))
+    todo = _with(comments, "TODO")
+    todos = len(todo) + sum(map(contains, comments, repeat("FIXME"))) - sum(map(contains, todo, repeat("FIXME")))
+    marks = ["\x00" if t[0] == "#" else "S" if "\n" not in t else _string_marks(t) for t in toks]
+    for k in compress(count(), map(str.startswith, toks, repeat(_TRIPLE_QUOTES))):
+        # 줄의 첫 토큰인 삼중 따옴표 문자열은 docstring(주석)
+        gap = parts[2 * k]
+        if (k == 0 or "\n" in gap) and not gap[gap.rfind("\n") + 1:].strip():
+            t = toks[k]
+            if "TODO" in t or "FIXME" in t:
+                todos += sum(1 for l in t.split("\n") if "TODO" in l or "FIXME" in l)
+            marks[k] = "\x00" + "\n\x00" * t.count("\n")
+    parts[1::2] = marks
+    lines = "".join(parts).split("\n")
+    if code.endswith("\n") or not code:
+        lines.pop()   # 마지막 줄바꿈 뒤 (파일 끝까지 열린 토큰이면 표식이 남아 있을 수 있다)
+    blank = lines.count("") + sum(map(str.isspace, lines))
+    commented = _with(lines, "\x00")
+    pure = list(map(str.strip, commented, repeat(_MARK_OR_SPACE))).count("")
+    return {"loc": n_lines, "blank": blank, "comments": len(commented), "code": n_lines - blank - pure,
+            "todos": todos}
+
+def line_stats(code: str, lang: str) -> Dict[str, int]:
+    lang = (lang or "").lower()
+    n_lines = code.count("\n") + (0 if code.endswith("\n") or not code else 1)
+    if lang in HASH_COMMENT_LANGS:
+        return _hash_line_stats(code, n_lines)
+    marked, todos = _mark(code, lang)
+    if marked is None:
+        # 주석 문법을 모르는 언어는 기존처럼 줄 전체에서 TODO/FIXME를 찾는다
+        nonblank = sum(1 for l in code.split("\n") if l.strip())
+        return {"loc": n_lines, "blank": n_lines - nonblank, "comments": 0, "code": nonblank,
+                "todos": len(_TODO_LINE.findall(code))}
+
+    lines = marked.split("\n")
+    if code.endswith("\n"):
+        lines.pop()   # 마지막 줄바꿈 뒤 (파일 끝까지 열린 블록 주석/문자열이면 표식이 남아 있을 수 있다)
+    nonblank = [l for l in lines if l.strip()]
+    commented = [l for l in nonblank if "\x00" in l]
+    pure_comment = sum(1 for l in commented if not l.translate(_DROP_MARK).strip())
+    return {"loc": n_lines, "blank": n_lines - len(nonblank), "comments": len(commented),
+            "code": len(nonblank) - pure_comment, "todos": todos}
+
+def comment_only_lines(code: str, lang: str) -> Set[int]:
+    # 주석만 있는 줄 번호(0부터). 블록 주석/docstring 내부 줄도 포함
+    marked, _ = _mark(code, (lang or "").lower())
+    if marked is None:
+        return set()
+    return {i for i, l in enumerate(marked.split("\n")) if "\x00" in l and not l.translate(_DROP_MARK).strip()}
+
+# ---- 언어 추정 ----
+# 그룹 없는 단순 alternation 이어야 sre의 접두 문자 최적화가 살아 있어 네 번 따로 검색하는 것보다 빠르다
+_LANG_HINTS = re.compile(r"#include\s*<|class\s+\w|import\s+\w+;|def\s+\w+\(|function\s+\w+\(|=>")
+_HINT_KIND = {"#": "cpp", "c": "jclass", "i": "jimport", "d": "python", "f": "javascript", "=": "javascript"}
+_NEEDS_WORD_BOUNDARY = ("c", "d", "f")
+
+def guess_language(language: str, code: str) -> str:
+    # 힌트를 한 번에 수집하고 기존 우선순위(cpp > java > python > javascript)대로 결정
+    if language and language.lower() != "auto":
+        return language.lower()
+    found = set()
+    for m in _LANG_HINTS.finditer(code):
+        head = m.group()[0]
+        st = m.start()
+        if head in _NEEDS_WORD_BOUNDARY and st and (code[st - 1].isalnum() or code[st - 1] == "_"):
+            continue
+        kind = _HINT_KIND[head]
+        if kind == "cpp": return "cpp"
+        found.add(kind)
+    if "jclass" in found and "jimport" in found: return "java"
+    if "python" in found: return "python"
+    if "javascript" in found: return "javascript"
+    return "auto"
+
+# ---- C 계열 토큰 (로컬 분석기의 함수/복잡도/규칙용) ----
+_C_TOKEN_TEMPLATE = r"""
+    (?P<nl>\n)
+  | (?P<ws>[ \t\r\f\v]+)
+  | (?P<lcom>//[^\n]*)
+  | (?P<bcom>/\*.*?(?:\*/|\Z))
+  | (?P<str>"(?:\\.|[^"\\\n])*"?|{sq}|`(?:\\.|[^`\\])*`?)
+  | (?P<num>\d[\w.]*)
+  | (?P<id>[A-Za-z_$][\w$]*)
+  | (?P<op>&&|\|\||===|!==|==|!=|<=|>=|=>|->|::|\+\+|--|<<|>>|[-+*/%=<>!&|^~?:;,.(){{}}\[\]#@\\])
+  | (?P<other>.)
+"""
+_C_TOKEN = re.compile(_C_TOKEN_TEMPLATE.format(sq=r"'(?:\\.|[^'\\\n])*'?"), re.X | re.S)
+_C_CHAR_TOKEN = re.compile(_C_TOKEN_TEMPLATE.format(sq=_SQ_CHAR), re.X | re.S)
+
+def c_tokens(code: str, lang: str = "") -> List[Tuple[str, str, int]]:
+    # (kind, text, line) 목록. 공백/줄바꿈은 버리고 줄 번호만 추적
+    toks: List[Tuple[str, str, int]] = []
+    line = 1
+    pattern = _C_TOKEN if not lang or lang in SQ_STRING_LANGS else _C_CHAR_TOKEN
+    for m in pattern.finditer(code):
+        kind = m.lastgroup or "other"
+        if kind == "nl":
+            line += 1; continue
+        if kind == "ws":
+            continue
+        text = m.group()
+        toks.append((kind, text, line))
+        if kind in ("bcom", "str"):
+            line += text.count("\n")
+    return toks
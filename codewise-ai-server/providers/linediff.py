@@ -0,0 +1,234 @@
+from __future__ import annotations
+import os, hashlib, threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+# ---- 줄 단위 diff (fix.patch / 이슈별 patch 계산) ----
+# 재작성 전용 모드(OPENAI_REWRITE_ONLY)에서는 모델이 diff를 만들지 않으므로, 원본과 fixed_code의 diff를 서버가 만든다.
+#   - 공통 앞/뒤 줄을 잘라 내고, 양쪽에 한 번씩만 나오는 줄을 기준점으로 구간을 나눈다 (patience diff)
+#     기준점 사이의 작은 구간만 SequenceMatcher로 정렬하므로 큰 파일의 몇 군데 수정도 빠르다
+#   - 출력 형식은 difflib.unified_diff(fromfile="original", tofile="fixed", lineterm="")와 같다
+#     (같은 줄이 반복될 때 어느 쪽에 맞출지는 다를 수 있다)
+#   - 같은 (원본, 수정본) 쌍은 LRU로 재사용한다 (압축 복원/조각 병합/후처리가 같은 diff를 여러 번 구한다)
+LINEDIFF_CONTEXT       = int(os.getenv("LINEDIFF_CONTEXT", "3"))        # fix.patch 컨텍스트 줄 수
+LINEDIFF_ISSUE_CONTEXT = int(os.getenv("LINEDIFF_ISSUE_CONTEXT", "1"))  # 이슈별 patch (가까운 수정끼리 덜 합쳐지게)
+LINEDIFF_CACHE_ITEMS   = int(os.getenv("LINEDIFF_CACHE_ITEMS", "1024"))
+
+# (태그, 원본 시작, 원본 끝, 수정본 시작, 수정본 끝) — SequenceMatcher.get_opcodes()와 같은 꼴 (0부터, 끝 미포함)
+Opcode = Tuple[str, int, int, int, int]
+
+_SMALL = 64   # 이 크기 이하 구간은 바로 SequenceMatcher로 (고유 줄 기준점 찾기가 더 비싸다)
+
+def _unique_anchors(a: List[str], b: List[str], alo: int, ahi: int, blo: int, bhi: int) -> List[Tuple[int, int]]:
+    # 양쪽 구간에서 한 번씩만 나오는 줄의 짝 중 순서가 맞는 가장 긴 열 (patience diff의 기준점)
+    count: Dict[str, List[int]] = {}
+    for i in range(alo, ahi):
+        c = count.get(a[i])
+        if c is None: count[a[i]] = [1, i, 0, -1]
+        else: c[0] += 1
+    for j in range(blo, bhi):
+        c = count.get(b[j])
+        if c is not None:
+            c[2] += 1; c[3] = j
+    pairs = sorted((c[1], c[3]) for c in count.values() if c[0] == 1 and c[2] == 1)
+    if not pairs:
+        return []
+    # b 쪽 번호의 최장 증가 부분열 (patience sorting)
+    tails: List[int] = []
+    prev: List[int] = [-1] * len(pairs)
+    for k, (_i, j) in enumerate(pairs):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if pairs[tails[mid]][1] < j: lo = mid + 1
+            else: hi = mid
+        if lo: prev[k] = tails[lo - 1]
+        if lo == len(tails): tails.append(k)
+        else: tails[lo] = k
+    out: List[Tuple[int, int]] = []
+    k = tails[-1]
+    while k >= 0:
+        out.append(pairs[k]); k = prev[k]
+    out.reverse()
+    return out
+
+def _matches(a: List[str], b: List[str]) -> List[Tuple[int, int]]:
+    # 같은 줄로 짝지은 (원본 줄, 수정본 줄) 목록 (양쪽 모두 증가)
+    out: List[Tuple[int, int]] = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        # 공통 앞/뒤 줄
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            out.append((alo, blo)); alo += 1; blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1; bhi -= 1; out.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi) if (ahi - alo) + (bhi - blo) > _SMALL else []
+        if not anchors:
+            # 빈 줄/괄호 줄이 많아 autojunk를 켜면 정렬이 틀어진다 (기준점 사이 구간이라 작다)
+            sm = SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            for i, j, size in sm.get_matching_blocks():
+                out.extend((alo + i + k, blo + j + k) for k in range(size))
+            continue
+        pi, pj = alo, blo
+        for i, j in anchors:
+            out.append((i, j))
+            stack.append((pi, i, pj, j))
+            pi, pj = i + 1, j + 1
+        stack.append((pi, ahi, pj, bhi))
+    out.sort()
+    return out
+
+def _opcodes(a: List[str], b: List[str]) -> List[Opcode]:
+    ops: List[Opcode] = []
+    i = j = 0
+    for mi, mj in _matches(a, b) + [(len(a), len(b))]:
+        if i < mi or j < mj:
+            tag = "replace" if i < mi and j < mj else ("delete" if i < mi else "insert")
+            ops.append((tag, i, mi, j, mj))
+        if mi < len(a):
+            if ops and ops[-1][0] == "equal":
+                t, a1, _a2, b1, _b2 = ops.pop()
+                ops.append((t, a1, mi + 1, b1, mj + 1))
+            else:
+                ops.append(("equal", mi, mi + 1, mj, mj + 1))
+        i, j = mi + 1, mj + 1
+    return ops or [("equal", 0, 0, 0, 0)]
+
+def _group(ops: List[Opcode], n: int) -> List[List[Opcode]]:
+    # SequenceMatcher.get_grouped_opcodes(n)와 같은 규칙으로 hunk 단위로 묶는다
+    codes = list(ops)
+    if codes[0][0] == "equal":
+        t, i1, i2, j1, j2 = codes[0]
+        codes[0] = t, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        t, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = t, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    nn = n + n
+    groups: List[List[Opcode]] = []
+    group: List[Opcode] = []
+    for t, i1, i2, j1, j2 in codes:
+        if t == "equal" and i2 - i1 > nn:
+            group.append((t, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((t, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+def _range(start: int, stop: int) -> str:
+    # unified diff 범위 표기 (difflib._format_range_unified와 같음)
+    beginning, length = start + 1, stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+class Hunk:
+    __slots__ = ("old_start", "old_end", "new_start", "new_end", "text")
+
+    def __init__(self, old_start: int, old_end: int, new_start: int, new_end: int, text: str):
+        self.old_start = old_start   # 원본 줄 범위 (1부터, 끝 포함, 컨텍스트 포함)
+        self.old_end = old_end
+        self.new_start = new_start
+        self.new_end = new_end
+        self.text = text             # "@@ ... @@"로 시작하는 hunk 본문
+
+def _hunks(a: List[str], b: List[str], ops: List[Opcode], context: int) -> List[Hunk]:
+    out: List[Hunk] = []
+    for group in _group(ops, context):
+        first, last = group[0], group[-1]
+        lines = [f"@@ -{_range(first[1], last[2])} +{_range(first[3], last[4])} @@"]
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(" " + line for line in a[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                lines.extend("-" + line for line in a[i1:i2])
+            if tag in ("replace", "insert"):
+                lines.extend("+" + line for line in b[j1:j2])
+        out.append(Hunk(first[1] + 1, max(first[1] + 1, last[2]), first[3] + 1, last[4], "\n".join(lines)))
+    return out
+
+class LineDiff:
+    __slots__ = ("opcodes", "hunks", "issue_hunks", "patch")
+
+    def __init__(self, a: List[str], b: List[str], context: int = LINEDIFF_CONTEXT,
+                 issue_context: int = LINEDIFF_ISSUE_CONTEXT):
+        self.opcodes = _opcodes(a, b)
+        same = a == b
+        self.hunks: List[Hunk] = [] if same else _hunks(a, b, self.opcodes, context)
+        self.issue_hunks: List[Hunk] = [] if same else (
+            self.hunks if issue_context == context else _hunks(a, b, self.opcodes, issue_context))
+        self.patch = "\n".join(["--- original", "+++ fixed"] + [h.text for h in self.hunks]) if self.hunks else ""
+
+    def hunk_at(self, line: int) -> Optional[Hunk]:
+        # 원본 줄(1부터)을 덮는 이슈용 hunk. 바뀐 곳에서 컨텍스트 줄 수보다 멀면 None
+        for h in self.issue_hunks:
+            if h.old_start <= line <= h.old_end:
+                return h
+            if h.old_start > line:
+                break
+        return None
+
+class _DiffCache:
+    def __init__(self, max_items: int = LINEDIFF_CACHE_ITEMS):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[bytes, LineDiff]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, original_text: str, fixed_text: str) -> LineDiff:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(original_text.encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+        h.update(fixed_text.encode("utf-8", "surrogatepass"))
+        key = h.digest()
+        with self._lock:
+            d = self._items.get(key)
+            if d is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return d
+            self.misses += 1
+        d = LineDiff(original_text.splitlines(), fixed_text.splitlines())
+        if self.max_items > 0:
+            with self._lock:
+                self._items[key] = d
+                while len(self._items) > self.max_items:
+                    self._items.popitem(last=False)
+        return d
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "cached": len(self._items),
+                    "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+DIFF_CACHE = _DiffCache()
+
+def line_diff(original_text: str, fixed_text: str) -> LineDiff:
+    return DIFF_CACHE.get(original_text, fixed_text)
+
+def issue_hunks(diff: LineDiff, issues: List[Dict[str, Any]], overwrite: bool = False) -> int:
+    # 이슈 줄을 덮는 hunk를 그 이슈의 patch로. 모델이 준 patch는 overwrite일 때만 바꾼다. 채운 개수
+    filled = 0
+    if not diff.issue_hunks:
+        return 0
+    for it in issues:
+        if not overwrite and str(it.get("patch") or "").strip():
+            continue
+        try: line = int(it.get("line") or 0)
+        except (TypeError, ValueError): continue
+        h = diff.hunk_at(line) if line > 0 else None
+        if h is not None:
+            it["patch"] = h.text
+            filled += 1
+    return filled
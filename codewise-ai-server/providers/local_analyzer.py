@@ -0,0 +1,380 @@
+from __future__ import annotations
+import os, re, io, ast, math, keyword, tokenize
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .lexer import C_LIKE_LANGS, c_tokens, line_stats
+from .metrics import log_event
+
+# ---- 로컬 정적 분석 엔진 ----
+# metrics(LOC/빈 줄/주석/TODO/함수별 McCabe/유지보수 지수)는 모델에게 묻지 않고 여기서 계산한다.
+# 줄 분류는 lexer 단일 패스(Python 주석/코드 줄은 어차피 도는 tokenize 결과로), Python 구조는 ast + tokenize,
+# C 계열은 lexer 토큰 기반. 규칙 팩은 rule() 데코레이터로 확장.
+
+LOCAL_RULE_PACKS = [p.strip() for p in os.getenv("LOCAL_RULE_PACKS", "").split(",") if p.strip()]
+# 규칙 팩 이슈를 모델 응답에도 보탤지 (기본 비활성화: 모델 경로의 issues는 모델이 지적한 것만)
+LOCAL_MERGE_ISSUES = os.getenv("LOCAL_MERGE_ISSUES", "0") == "1"
+
+# LLM 생략 fast path (기본 비활성화)
+FAST_PATH_ENABLED        = os.getenv("LOCAL_FAST_PATH", "0") == "1"
+FAST_PATH_MAX_LOC        = int(os.getenv("LOCAL_FAST_PATH_MAX_LOC", "3"))
+FAST_PATH_CLEAN_MAX_LOC  = int(os.getenv("LOCAL_FAST_PATH_CLEAN_MAX_LOC", "0"))
+FAST_PATH_MAX_COMPLEXITY = int(os.getenv("LOCAL_FAST_PATH_MAX_COMPLEXITY", "3"))
+
+class Source:
+    # 규칙 함수에 넘기는 분석 컨텍스트
+    def __init__(self, code: str, lang: str):
+        self.code = code
+        self.lang = lang
+        self.lines = code.splitlines()
+        self.tree: Optional[ast.AST] = None
+        self.syntax_error: Optional[SyntaxError] = None
+        self.tokens: List[Tuple[str, str, int]] = []   # C 계열: (kind, text, line)
+        self.comments: Optional[List[Tuple[int, str]]] = None   # (시작 줄, 주석 원문). 토큰화하지 못했으면 None
+
+Rule = Callable[[Source], List[Dict[str, Any]]]
+RULE_PACKS: Dict[str, List[Rule]] = {}
+
+def rule(*packs: str) -> Callable[[Rule], Rule]:
+    def deco(fn: Rule) -> Rule:
+        for p in packs:
+            RULE_PACKS.setdefault(p, []).append(fn)
+        return fn
+    return deco
+
+def _packs_for(lang: str) -> List[str]:
+    if lang == "python": packs = ["common", "python"]
+    elif lang in ("c", "cpp"): packs = ["common", "c_like", "c"]
+    elif lang == "java": packs = ["common", "c_like", "java"]
+    elif lang in ("javascript", "typescript"): packs = ["common", "c_like", "javascript"]
+    elif lang in C_LIKE_LANGS: packs = ["common", "c_like"]
+    else: packs = ["common"]
+    if LOCAL_RULE_PACKS:
+        packs = [p for p in packs if p in LOCAL_RULE_PACKS]
+    return packs
+
+def _issue(line: int, severity: str, message: str, suggestion: str = "") -> Dict[str, Any]:
+    return {"line": line, "severity": severity, "message": message, "suggestion": suggestion, "patch": ""}
+
+# ---- Python ----
+_MATCH_CASE = getattr(ast, "match_case", None)
+
+def _py_decisions(node: ast.AST) -> int:
+    # 중첩 함수/클래스는 별도 항목으로 집계하므로 내려가지 않는다
+    n = 0
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        if isinstance(child, (ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler)):
+            n += 1
+        elif isinstance(child, ast.BoolOp):
+            n += len(child.values) - 1
+        elif isinstance(child, ast.comprehension):
+            n += 1 + len(child.ifs)
+        elif _MATCH_CASE is not None and isinstance(child, _MATCH_CASE):
+            n += 1
+        n += _py_decisions(child)
+    return n
+
+def _py_functions(tree: ast.AST) -> List[Dict[str, Any]]:
+    funcs: List[Dict[str, Any]] = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            funcs.append({"name": node.name, "line": node.lineno,
+                          "end_line": node.end_lineno or node.lineno,
+                          "complexity": 1 + _py_decisions(node)})
+    funcs.sort(key=lambda f: f["line"])
+    return funcs
+
+def _py_docstring_lines(tree: ast.AST) -> Set[int]:
+    out: Set[int] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = getattr(node, "body", None) or []
+            if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], "value", None), ast.Constant) \
+                    and isinstance(body[0].value.value, str):
+                out.update(range(body[0].lineno, (body[0].end_lineno or body[0].lineno) + 1))
+    return out
+
+def _py_scan(src: Source) -> Dict[str, Any]:
+    # Halstead 연산자/피연산자 + 주석 줄/코드 줄 (lexer의 # 주석 빠른 경로는 문자열 안의 '#'와 docstring을 구분하지 않으므로
+    # 같은 tokenize 결과로 센다). 토큰화가 끝까지 못 가면 줄 집합은 None
+    comment_lines: Set[int] = set()
+    code_lines: Set[int] = set()
+    comments: List[Tuple[int, str]] = []
+    ops: Dict[str, int] = {}; operands: Dict[str, int] = {}
+    complete = True
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(src.code).readline):
+            tt, text, (srow, _), (erow, _), _ = tok
+            if tt == tokenize.COMMENT:
+                comment_lines.add(srow)
+                comments.append((srow, text))
+            elif tt in (tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER):
+                continue
+            else:
+                code_lines.update(range(srow, erow + 1))
+                if tt == tokenize.OP or (tt == tokenize.NAME and keyword.iskeyword(text)):
+                    ops[text] = ops.get(text, 0) + 1
+                elif tt in (tokenize.NAME, tokenize.NUMBER, tokenize.STRING):
+                    operands[text] = operands.get(text, 0) + 1
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        complete = False
+    out: Dict[str, Any] = {"ops": ops, "operands": operands, "comment_lines": None, "code_lines": None,
+                           "comments": None}
+    if complete:
+        doc_lines = _py_docstring_lines(src.tree) if src.tree is not None else set()
+        out["comment_lines"], out["code_lines"] = comment_lines | doc_lines, code_lines - doc_lines
+        out["comments"] = comments
+    return out
+
+@rule("python")
+def _py_bare_except(src: Source) -> List[Dict[str, Any]]:
+    if src.tree is None: return []
+    return [_issue(n.lineno, "warn", "Bare except clause swallows all exceptions",
+                   "Catch specific exception types (e.g. except ValueError:).")
+            for n in ast.walk(src.tree) if isinstance(n, ast.ExceptHandler) and n.type is None]
+
+@rule("python")
+def _py_mutable_default(src: Source) -> List[Dict[str, Any]]:
+    if src.tree is None: return []
+    out = []
+    for n in ast.walk(src.tree):
+        if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for d in list(n.args.defaults) + [d for d in n.args.kw_defaults if d is not None]:
+                if isinstance(d, (ast.List, ast.Dict, ast.Set)):
+                    out.append(_issue(n.lineno, "warn", f"Mutable default argument in '{n.name}'",
+                                      "Use None as the default and create the object inside the function."))
+    return out
+
+@rule("python")
+def _py_eval_exec(src: Source) -> List[Dict[str, Any]]:
+    if src.tree is None: return []
+    return [_issue(n.lineno, "warn", f"Use of {n.func.id}() on dynamic input is unsafe",
+                   "Avoid eval/exec; parse input explicitly (e.g. ast.literal_eval).")
+            for n in ast.walk(src.tree)
+            if isinstance(n, ast.Call) and isinstance(n.func, ast.Name) and n.func.id in ("eval", "exec")]
+
+@rule("python")
+def _py_compare_none(src: Source) -> List[Dict[str, Any]]:
+    if src.tree is None: return []
+    out = []
+    for n in ast.walk(src.tree):
+        if isinstance(n, ast.Compare):
+            for op, right in zip(n.ops, n.comparators):
+                if isinstance(op, (ast.Eq, ast.NotEq)) and isinstance(right, ast.Constant) and right.value is None:
+                    out.append(_issue(n.lineno, "info", "Comparison to None with ==/!=",
+                                      "Use 'is None' / 'is not None'."))
+    return out
+
+@rule("python")
+def _py_syntax_error(src: Source) -> List[Dict[str, Any]]:
+    e = src.syntax_error
+    if e is None: return []
+    return [_issue(int(e.lineno or 1), "error", f"SyntaxError: {e.msg}", "Fix the syntax error before running.")]
+
+# ---- C 계열 ----
+_C_CONTROL = {"if", "for", "while", "switch", "catch", "return", "sizeof", "else", "do", "try",
+              "synchronized", "using", "lock", "foreach", "new", "throw", "typeof", "when"}
+_C_DECISION_WORDS = {"if", "for", "while", "case", "catch", "foreach", "elif"}
+_TERNARY_LANGS = {"c", "cpp", "java", "javascript", "typescript", "csharp", "php"}
+_C_SIG_PUNCT = {":", "->", "<", ">", ",", "[", "]", "?", "*", "&", ".", "::"}
+_HALSTEAD_OP_WORDS = _C_CONTROL | _C_DECISION_WORDS
+
+def _c_functions(toks: List[Tuple[str, str, int]], lang: str) -> Tuple[List[Dict[str, Any]], int]:
+    # '{' 직전이 ')'(또는 ')' 뒤 한정자/throws 절, '=>')이고 '(' 앞 식별자가 제어 키워드가 아니면 함수 본문으로 본다
+    sig = [t for t in toks if t[0] not in ("lcom", "bcom")]
+    funcs: List[Dict[str, Any]] = []
+    stack: List[Optional[Dict[str, Any]]] = []   # '{' 마다 함수 정보(또는 None)
+    module_decisions = 0
+    for i, (kind, text, line) in enumerate(sig):
+        if text == "{" and kind == "op":
+            fn = None
+            j = i - 1
+            # 반환 타입/한정자(const, throws X, -> i32, : number ...)는 건너뛴다
+            while j >= 0 and i - j <= 16 and (
+                    (sig[j][0] == "id" and sig[j][1] not in _C_CONTROL) or sig[j][1] in _C_SIG_PUNCT):
+                j -= 1
+            if j >= 0 and sig[j][1] == "=>":
+                fn = {"name": "<lambda>", "line": line, "complexity": 1}
+            elif j >= 0 and sig[j][1] == ")":
+                depth = 0; k = j
+                while k >= 0:
+                    if sig[k][1] == ")": depth += 1
+                    elif sig[k][1] == "(":
+                        depth -= 1
+                        if depth == 0: break
+                    k -= 1
+                if k > 0 and sig[k - 1][0] == "id" and sig[k - 1][1] not in _C_CONTROL:
+                    fn = {"name": sig[k - 1][1], "line": sig[k - 1][2], "complexity": 1}
+            stack.append(fn)
+            if fn is not None: funcs.append(fn)
+            continue
+        if text == "}" and kind == "op":
+            if stack:
+                fn = stack.pop()
+                if fn is not None: fn["end_line"] = line
+            continue
+        is_decision = (kind == "id" and text in _C_DECISION_WORDS) or (kind == "op" and text in ("&&", "||")) \
+            or (kind == "op" and text == "?" and lang in _TERNARY_LANGS)
+        if is_decision:
+            owner = next((f for f in reversed(stack) if f is not None), None)
+            if owner is not None: owner["complexity"] += 1
+            else: module_decisions += 1
+    for f in funcs:
+        f.setdefault("end_line", f["line"])
+    return funcs, module_decisions
+
+def _c_halstead(toks: List[Tuple[str, str, int]]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    ops: Dict[str, int] = {}; operands: Dict[str, int] = {}
+    for kind, text, _ in toks:
+        if kind == "op" or (kind == "id" and text in _HALSTEAD_OP_WORDS):
+            ops[text] = ops.get(text, 0) + 1
+        elif kind in ("id", "num", "str"):
+            operands[text] = operands.get(text, 0) + 1
+    return ops, operands
+
+@rule("c")
+def _c_missing_semicolon(src: Source) -> List[Dict[str, Any]]:
+    out = []
+    for i, line in enumerate(src.lines, 1):
+        if re.search(r"\bprintf\s*\(", line) and ";" not in line:
+            out.append(_issue(i, "warn", "Possible missing semicolon after printf(...)", "Add ';'."))
+    return out
+
+@rule("c")
+def _c_unsafe_string_apis(src: Source) -> List[Dict[str, Any]]:
+    out = []
+    for i, (kind, text, line) in enumerate(src.tokens):
+        if kind != "id" or i + 1 >= len(src.tokens) or src.tokens[i + 1][1] != "(":
+            continue
+        if text == "gets":
+            out.append(_issue(line, "error", "gets() cannot bound its input (buffer overflow)",
+                              "Use fgets(buf, sizeof buf, stdin)."))
+        elif text in ("strcpy", "strcat", "sprintf"):
+            out.append(_issue(line, "warn", f"{text}() does not check the destination size",
+                              {"sprintf": "Use snprintf."}.get(text, f"Use {text[:3]}n{text[3:]} or a bounded copy.")))
+    return out
+
+@rule("java")
+def _java_string_eq(src: Source) -> List[Dict[str, Any]]:
+    out = []
+    t = src.tokens
+    for i, (kind, text, line) in enumerate(t):
+        if kind == "op" and text in ("==", "!=") and (
+                (i > 0 and t[i - 1][0] == "str" and t[i - 1][1].startswith('"')) or
+                (i + 1 < len(t) and t[i + 1][0] == "str" and t[i + 1][1].startswith('"'))):
+            out.append(_issue(line, "warn", "Use equals() for string comparison",
+                              "Compare strings with \"literal\".equals(value)."))
+    return out
+
+@rule("javascript")
+def _js_loose_equality(src: Source) -> List[Dict[str, Any]]:
+    return [_issue(line, "warn", "Loose comparison with == / !=", "Use === / !== to avoid type coercion.")
+            for kind, text, line in src.tokens if kind == "op" and text in ("==", "!=")]
+
+@rule("javascript")
+def _js_eval(src: Source) -> List[Dict[str, Any]]:
+    t = src.tokens
+    return [_issue(line, "warn", "Use of eval() is unsafe", "Avoid eval; parse data with JSON.parse.")
+            for i, (kind, text, line) in enumerate(t)
+            if kind == "id" and text == "eval" and i + 1 < len(t) and t[i + 1][1] == "("]
+
+def _todo_lines(src: Source) -> List[int]:
+    # 주석 토큰 안의 TODO/FIXME 줄 (문자열 안의 "TODO"는 제외). 토큰이 없는 언어/코드는 줄 단위로
+    if src.comments is None:
+        return [i for i, l in enumerate(src.lines, 1) if "TODO" in l or "FIXME" in l]
+    found: Set[int] = set()
+    for ln, text in src.comments:
+        if "TODO" in text or "FIXME" in text:
+            found.update(ln + k for k, part in enumerate(text.split("\n")) if "TODO" in part or "FIXME" in part)
+    return sorted(found)
+
+@rule("common")
+def _todo_comments(src: Source) -> List[Dict[str, Any]]:
+    return [_issue(i, "info", "TODO/FIXME comment present", "Track or resolve the pending work.")
+            for i in _todo_lines(src)]
+
+# ---- 지표 ----
+def _maintainability_index(volume: float, complexity: int, sloc: int, comment_pct: float) -> Optional[float]:
+    # radon/SEI 변형식, 0~100 범위
+    if sloc <= 0: return None
+    if volume <= 0: return 100.0
+    mi = 171 - 5.2 * math.log(volume) - 0.23 * complexity - 16.2 * math.log(sloc) \
+        + 50 * math.sin(math.sqrt(2.46 * math.radians(comment_pct)))
+    return round(min(max(0.0, mi * 100 / 171.0), 100.0), 2)
+
+def _halstead_volume(ops: Dict[str, int], operands: Dict[str, int]) -> float:
+    vocab = len(ops) + len(operands)
+    length = sum(ops.values()) + sum(operands.values())
+    return length * math.log2(vocab) if vocab > 1 else 0.0
+
+def analyze_local(code: str, lang: str) -> Dict[str, Any]:
+    lang = (lang or "auto").lower()
+    src = Source(code, lang)
+    stats = line_stats(code, lang)
+
+    funcs: List[Dict[str, Any]] = []
+    module_decisions = 0
+    ops: Dict[str, int] = {}; operands: Dict[str, int] = {}
+    parsed = True
+
+    if lang == "python":
+        try:
+            src.tree = ast.parse(code)
+        except SyntaxError as e:
+            src.syntax_error = e; parsed = False
+        scan = _py_scan(src)
+        ops, operands = scan["ops"], scan["operands"]
+        if scan["code_lines"] is not None:
+            stats["code"], stats["comments"] = len(scan["code_lines"]), len(scan["comment_lines"])
+        src.comments = scan["comments"]
+        if src.tree is not None:
+            funcs = _py_functions(src.tree)
+            module_decisions = _py_decisions(src.tree)
+    elif lang in C_LIKE_LANGS:
+        src.tokens = c_tokens(code, lang)
+        src.comments = [(ln, text) for kind, text, ln in src.tokens if kind in ("lcom", "bcom")]
+        funcs, module_decisions = _c_functions(src.tokens, lang)
+        ops, operands = _c_halstead(src.tokens)
+    else:
+        parsed = False
+
+    if src.comments is not None:
+        stats["todos"] = len(_todo_lines(src))
+
+    complexities = [f["complexity"] for f in funcs] or ([1 + module_decisions] if parsed else [])
+    sloc = stats["code"]
+    comments = stats["comments"]
+    metrics: Dict[str, Any] = {
+        "loc": stats["loc"],
+        "language": lang,
+        "blank": stats["blank"],
+        "comments": comments,
+        "todos": stats["todos"],
+        "mccabe_complexity": float(sum(complexities)) if complexities else None,
+        "avg_complexity": round(sum(complexities) / len(complexities), 2) if complexities else None,
+        "max_complexity": float(max(complexities)) if complexities else None,
+        "maintainability_index": _maintainability_index(
+            _halstead_volume(ops, operands), sum(complexities), sloc,
+            100.0 * comments / max(1, sloc + comments)) if parsed else None,
+    }
+
+    issues: List[Dict[str, Any]] = []
+    for pack in _packs_for(lang):
+        for fn in RULE_PACKS.get(pack, []):
+            try: issues.extend(fn(src))
+            except Exception as e:
+                log_event("local_rule_failed", level="error", rule=getattr(fn, "__name__", repr(fn)), error=repr(e))
+    issues.sort(key=lambda it: it["line"])
+    return {"metrics": metrics, "issues": issues, "functions": funcs, "parsed": parsed}
+
+def fast_path_ok(report: Dict[str, Any]) -> bool:
+    # 아주 작은 제출물, 또는 (설정 시) 규칙 위반이 없고 단순한 제출물은 LLM 호출 없이 응답
+    if not FAST_PATH_ENABLED:
+        return False
+    m = report["metrics"]
+    if m["loc"] - (m["blank"] or 0) <= FAST_PATH_MAX_LOC:
+        return True
+    if not report["parsed"] or report["issues"] or m["loc"] > FAST_PATH_CLEAN_MAX_LOC:
+        return False
+    return (m["max_complexity"] or 0) <= FAST_PATH_MAX_COMPLEXITY
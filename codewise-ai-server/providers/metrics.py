@@ -0,0 +1,240 @@
+from __future__ import annotations
+import os, json, time, bisect, threading, contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# ---- 단계별 계측 / Prometheus 텍스트 노출 ----
+# stage("llm") 같은 구간을 재서 (1) 프로세스 전체 히스토그램과 (2) 현재 요청의 RequestTimer에 함께 쌓는다.
+# RequestTimer는 contextvar로 전달되므로 스레드 풀로 넘길 때는 contextvars.copy_context()로 감싸야 한다.
+# 외부 의존성(prometheus_client) 없이 /metrics 텍스트 형식(0.0.4)만 직접 만든다.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+LOG_JSON        = os.getenv("LOG_JSON", "1") == "1"
+_DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[Dict[str, Any], float]
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    items = ['{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+             for k, v in labels]
+    return "{" + ",".join(items) + "}" if items else ""
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = _DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[Labels, List[Any]] = {}   # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for key, s in sorted(series.items()):
+            acc = 0
+            for b, n in zip(self.buckets, s):
+                acc += n
+                out.append(f"{self.name}_bucket{_fmt_labels(key + (('le', _fmt_value(b)),))} {acc}")
+            out.append(f"{self.name}_bucket{_fmt_labels(key + (('le', '+Inf'),))} {s[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(round(s[-2], 6))}")
+            out.append(f"{self.name}_count{_fmt_labels(key)} {s[-1]}")
+        return out
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._series: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for key, v in sorted(series.items()):
+            out.append(f"{self.name}{_fmt_labels(key)} {_fmt_value(v)}")
+        return out
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Collector] = []
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = _DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = Histogram(name, help, buckets)
+            return m
+
+    def counter(self, name: str, help: str) -> Counter:
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = Counter(name, help)
+            return m
+
+    def register_collector(self, fn: Collector) -> None:
+        # 이미 다른 곳에서 세고 있는 통계(cache_stats 등)를 스크레이프 시점에 읽어 노출
+        # fn() -> [(name, "counter"|"gauge", help, [(labels, value), ...]), ...]
+        with self._lock:
+            self._collectors.append(fn)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        for fn in collectors:
+            try:
+                families = list(fn())
+            except Exception as e:
+                log_event("metrics_collector_failed", level="error", collector=getattr(fn, "__name__", repr(fn)),
+                          error=repr(e))
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f"{name}{_fmt_labels(_labels(labels))} {_fmt_value(float(value))}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram("codewise_stage_seconds", "Time spent in each analysis stage")
+REQUEST_SECONDS = REGISTRY.histogram("codewise_request_seconds", "HTTP request latency")
+EVENTS = REGISTRY.counter("codewise_events_total", "Analysis path events (cache, fallback, recovery tier, ...)")
+
+class RequestTimer:
+    # 요청 하나의 단계별 누계(ms)와 로그용 필드
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.fields: Dict[str, Any] = {}
+
+    def add(self, stage: str, ms: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + ms
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def note(self, **fields: Any) -> None:
+        with self._lock:
+            self.fields.update(fields)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000.0
+
+    def server_timing(self) -> str:
+        # 구간이 겹칠 수 있어(동시 조각 분석) 합이 total보다 클 수 있다
+        with self._lock:
+            parts = [f"{k};dur={v:.1f}" for k, v in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"duration_ms": round(self.elapsed_ms(), 1),
+                    "stages_ms": {k: round(v, 1) for k, v in self.stages.items()},
+                    **self.fields}
+
+_CURRENT: contextvars.ContextVar[Optional[RequestTimer]] = contextvars.ContextVar("codewise_request_timer", default=None)
+
+def start_request() -> RequestTimer:
+    timer = RequestTimer()
+    _CURRENT.set(timer)
+    return timer
+
+def current_timer() -> Optional[RequestTimer]:
+    return _CURRENT.get()
+
+def observe_stage(name: str, seconds: float) -> None:
+    if not METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timer = _CURRENT.get()
+    if timer is not None:
+        timer.add(name, seconds * 1000.0)
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - t0)
+
+def event(name: str, value: str = "") -> None:
+    # 분기(캐시 적중, 대체 응답, 복구 단계 등) 횟수. 현재 요청 로그에도 name=value로 남긴다
+    if METRICS_ENABLED:
+        EVENTS.inc(1, event=name, value=value)
+    timer = _CURRENT.get()
+    if timer is not None:
+        timer.note(**{name: value or True})
+
+def log_json(record: Dict[str, Any]) -> None:
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+def log_event(name: str, level: str = "info", **fields: Any) -> None:
+    # 요청 로그에 실리지 않는 진단 한 줄 (상류 재시도, 복구 실패 등). 횟수는 event()/통계로 따로 센다
+    # warning/error는 LOG_JSON이 꺼져 있어도 사람이 읽는 한 줄로 남긴다 (실패가 조용히 사라지지 않게)
+    if LOG_JSON:
+        log_json({"ts": round(time.time(), 3), "event": name, "level": level, **fields})
+    elif level != "info":
+        print(f"[{level.upper()}] {name}", *(f"{k}={v}" for k, v in fields.items()), flush=True)
+
+def stats_collector(group: str, fn: Callable[[], Optional[Dict[str, Any]]], label: str = "name") -> Collector:
+    # /healthz용 통계 dict를 게이지로 펼친다: 숫자 -> codewise_<group>_<key>,
+    # {이름: 숫자} -> <key>{key=이름}, {이름: {필드: 숫자}} -> <key>_<필드>{<label>=이름}
+    def _num(v: Any) -> bool:
+        return isinstance(v, (int, float))   # bool 포함 (0/1)
+
+    def _collect() -> Iterable[Tuple[str, str, str, List[Sample]]]:
+        data = fn() or {}
+        for key, v in data.items():
+            name = f"codewise_{group}_{key}"
+            if _num(v):
+                yield name, "gauge", f"{group} {key}", [({}, float(v))]
+            elif isinstance(v, dict) and v and all(_num(x) for x in v.values()):
+                yield name, "gauge", f"{group} {key}", [({"key": k}, float(x)) for k, x in v.items()]
+            elif isinstance(v, dict) and v and all(isinstance(x, dict) for x in v.values()):
+                fields: Dict[str, List[Sample]] = {}
+                for n, sub in v.items():
+                    for f, x in sub.items():
+                        if _num(x):
+                            fields.setdefault(f, []).append(({label: n}, float(x)))
+                for f, samples in fields.items():
+                    yield f"{name}_{f}", "gauge", f"{group} {key} {f}", samples
+    return _collect
@@ -0,0 +1,378 @@
+from __future__ import annotations
+import os, re, hashlib, threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from .fix_recovery import Edit, apply_edits, unified_patch
+from .incremental import line_opcodes
+from .lexer import C_LIKE_LANGS, HASH_COMMENT_LANGS
+from .response import dumps, loads
+
+# ---- 유사 제출본 색인 (변수명/주석/공백만 다른 과제 제출 재사용) ----
+# 1) 정규화 토큰: 주석·공백을 버리고 식별자는 "$", 문자열/숫자 리터럴은 S/N으로 (Python은 들여쓰기 토큰 포함)
+# 2) 지문: 토큰 k-gram 해시를 winnowing으로 추려 집합으로, 그 집합의 MinHash(one-permutation, 64칸)
+# 3) LSH: 시그니처를 띠(band)로 나눠 버킷에 넣고, 같은 버킷의 후보만 실제 지문 Jaccard로 비교
+# 가장 비슷한 후보가 NEARDUP_THRESHOLD 이상이면
+#   - 구조가 같으면(리터럴까지 같고 식별자만 일대일로 다름) 이슈/수정을 식별자·줄 번호만 바꿔 재사용 (transfer)
+#   - 아니면 그 결과를 프롬프트 힌트로 넘긴다 (호출자)
+NEARDUP_ENABLED    = os.getenv("ANALYZE_NEARDUP", "1") == "1"
+NEARDUP_THRESHOLD  = float(os.getenv("ANALYZE_NEARDUP_THRESHOLD", "0.8"))   # 지문 Jaccard 유사도 하한
+NEARDUP_MAX_ITEMS  = int(os.getenv("ANALYZE_NEARDUP_MAX_ITEMS", "2048"))
+NEARDUP_MIN_TOKENS = int(os.getenv("ANALYZE_NEARDUP_MIN_TOKENS", "40"))     # 이보다 짧은 코드는 색인하지 않음
+NEARDUP_KGRAM      = int(os.getenv("ANALYZE_NEARDUP_KGRAM", "5"))
+NEARDUP_WINDOW     = int(os.getenv("ANALYZE_NEARDUP_WINDOW", "4"))
+
+_BINS, _ROWS = 64, 4   # 시그니처 64칸을 4칸씩 16개 띠로: Jaccard 0.8이면 후보가 될 확률 ~0.9998, 0.3이면 ~0.12
+
+_C_TOKEN = re.compile(r"""
+    (?P<nl>\n)
+  | (?P<cont>\\\n)
+  | (?P<ws>[ \t\r\f\v]+)
+  | (?P<com>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<str>"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?|`(?:\\.|[^`\\])*`?)
+  | (?P<num>\d[\w.]*)
+  | (?P<id>[A-Za-z_$][\w$]*)
+  | (?P<op>&&|\|\||===|!==|==|!=|<=|>=|=>|->|::|\+\+|--|<<|>>|\S)
+""", re.X | re.S)
+
+_HASH_TOKEN = re.compile(r"""
+    (?P<nl>\n)
+  | (?P<cont>\\\n)
+  | (?P<ws>[ \t\r\f\v]+)
+  | (?P<com>\#[^\n]*)
+  | (?P<str>[rRbBuUfF]{0,2}(?:\"\"\"(?:\\.|[^\\])*?(?:\"\"\"|\Z)|'''(?:\\.|[^\\])*?(?:'''|\Z)
+                            |"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?))
+  | (?P<num>\d[\w.]*)
+  | (?P<id>[A-Za-z_]\w*[?!]?)
+  | (?P<op>\*\*|//|==|!=|<=|>=|->|:=|<<|>>|\S)
+""", re.X | re.S)
+
+# 이름을 바꾸지 않는 단어: 언어 키워드와 자주 쓰는 표준 라이브러리 이름 (바뀌면 다른 코드로 본다)
+KEYWORDS = frozenset("""
+    False None True and as assert async await break class continue def del elif else except finally for from
+    global if import in is lambda nonlocal not or pass raise return try while with yield
+    auto case catch char const default delete do double enum export extends final float function goto
+    implements instanceof int interface let long namespace new null package private protected public short
+    signed sizeof static struct super switch template this throw throws typedef typeof union unsigned using
+    var void volatile true false nil fn func go defer chan map range type impl mut pub use mod match loop
+    where trait crate boolean byte bool val fun when object override begin end elsif unless until module
+    rescue ensure then self
+    print println printf scanf puts len input str list dict set tuple open sorted sum min max abs enumerate
+    zip filter isinstance System out String Integer Math Scanner console log std cout cin endl vector
+    malloc free main length size append push
+""".split())
+
+Token = Tuple[str, str, int, int]   # (종류, 텍스트, 줄(1부터), 시작 오프셋)
+
+def tokenize(code: str, lang: str) -> Optional[List[Token]]:
+    # 주석/공백을 뺀 토큰. 주석 문법을 모르는 언어는 None
+    if lang in C_LIKE_LANGS:
+        rx, indents = _C_TOKEN, None
+    elif lang in HASH_COMMENT_LANGS:
+        rx, indents = _HASH_TOKEN, ([0] if lang == "python" else None)
+    else:
+        return None
+    toks: List[Token] = []
+    line, line_begin, at_start, depth = 1, 0, True, 0
+    for m in rx.finditer(code):
+        kind = m.lastgroup or "op"
+        if kind == "nl":
+            line += 1; line_begin = m.end(); at_start = True
+            continue
+        if kind == "cont":
+            line += 1
+            continue
+        if kind == "ws":
+            continue
+        text = m.group()
+        if kind == "com" or (kind == "str" and at_start and indents is not None and text.lstrip("rRbBuUfF")[:3] in ('"""', "'''")):
+            # 주석, 그리고 줄의 첫 토큰인 삼중 따옴표 문자열(docstring)은 버린다
+            line += text.count("\n")
+            continue
+        if indents is not None and at_start and depth == 0:
+            width = len(code[line_begin:m.start()].expandtabs(8))
+            if width > indents[-1]:
+                indents.append(width)
+                toks.append(("op", "<indent>", line, m.start()))
+            while width < indents[-1]:
+                indents.pop()
+                toks.append(("op", "<dedent>", line, m.start()))
+        at_start = False
+        if text in ("(", "[", "{"):
+            depth += 1
+        elif text in (")", "]", "}"):
+            depth = max(0, depth - 1)
+        toks.append((kind, text, line, m.start()))
+        if kind == "str":
+            line += text.count("\n")
+    return toks
+
+def _renamable(tok: Token) -> bool:
+    return tok[0] == "id" and tok[1] not in KEYWORDS
+
+def _canonical(tok: Token) -> str:
+    # 지문용: 리터럴 값도 지운다 (출력 문구만 다른 제출본도 비슷하게 잡히도록)
+    if _renamable(tok): return "$"
+    if tok[0] == "str": return "S"
+    if tok[0] == "num": return "N"
+    return tok[1]
+
+def _strict(tok: Token) -> str:
+    # 재사용 판정용: 식별자만 지우고 리터럴은 그대로
+    return "$" if _renamable(tok) else tok[1]
+
+def winnow(canon: List[str], k: int = NEARDUP_KGRAM, w: int = NEARDUP_WINDOW) -> FrozenSet[int]:
+    # k-gram 해시 중 w개 창마다 최솟값만 남긴다 (토큰 몇 개가 바뀌어도 나머지 지문은 유지)
+    if len(canon) < k:
+        return frozenset()
+    # 색인은 프로세스 메모리에만 있으므로 (실행마다 값이 바뀌는) 내장 hash로 충분하다
+    grams = [hash(g) & 0xFFFFFFFF for g in zip(*(canon[j:] for j in range(k)))]
+    if len(grams) <= w:
+        return frozenset([min(grams)])
+    return frozenset(min(grams[i:i + w]) for i in range(len(grams) - w + 1))
+
+def minhash(fps: FrozenSet[int]) -> Tuple[int, ...]:
+    # one-permutation MinHash: 섞은 해시의 위 6비트로 칸을 고르고 칸마다 최솟값. 빈 칸은 다음 칸 값으로 채운다
+    sig: List[Optional[int]] = [None] * _BINS
+    for f in fps:
+        x = (f * 0x9E3779B1) & 0xFFFFFFFF
+        b, v = x >> 26, x & 0x3FFFFFF
+        cur = sig[b]
+        if cur is None or v < cur:
+            sig[b] = v
+    if all(v is None for v in sig):
+        return (0,) * _BINS
+    filled = list(sig)
+    for b in range(_BINS):
+        step = 1
+        while filled[b] is None:
+            src = sig[(b + step) % _BINS]
+            if src is not None:
+                filled[b] = src + (step << 26)   # 빌려 온 값은 거리만큼 구분해 둔다
+            step += 1
+    return tuple(filled)  # type: ignore[arg-type]
+
+class Sketch:
+    __slots__ = ("tokens", "fps", "bands", "digest")
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.fps = winnow([_canonical(t) for t in tokens])
+        sig = minhash(self.fps)
+        self.bands = [sig[i:i + _ROWS] for i in range(0, _BINS, _ROWS)]
+        self.digest = hashlib.sha1("\x1f".join(_strict(t) for t in tokens).encode("utf-8")).digest()
+
+def sketch(code: str, lang: str) -> Optional[Sketch]:
+    toks = tokenize(code, lang)
+    if toks is None or len(toks) < NEARDUP_MIN_TOKENS:
+        return None
+    return Sketch(toks)
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    if not a or not b:
+        return 0.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+class Match:
+    __slots__ = ("similarity", "identical", "code", "content")
+
+    def __init__(self, similarity: float, identical: bool, code: str, content: Dict[str, Any]):
+        self.similarity = similarity
+        self.identical = identical      # 식별자 이름만 다른 같은 구조
+        self.code = code
+        self.content = content
+
+class _Entry:
+    __slots__ = ("scope", "code", "blob", "fps", "keys", "digest")
+
+    def __init__(self, scope: str, code: str, blob: bytes, sk: Sketch):
+        self.scope = scope
+        self.code = code
+        self.blob = blob
+        self.fps = sk.fps
+        self.digest = sk.digest
+        self.keys = [(scope, i, band) for i, band in enumerate(sk.bands)]
+
+class NearDupIndex:
+    def __init__(self, threshold: float = NEARDUP_THRESHOLD, max_items: int = NEARDUP_MAX_ITEMS, enabled: bool = True):
+        self.threshold = threshold
+        self.max_items = max_items
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, bytes], _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], set] = {}
+        self._stats = {"lookups": 0, "reused": 0, "hinted": 0, "misses": 0, "transfer_failed": 0,
+                       "indexed": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> "NearDupIndex":
+        return cls(enabled=NEARDUP_ENABLED)
+
+    def note(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _drop(self, ident: Tuple[str, bytes]) -> None:
+        ent = self._entries.pop(ident)
+        for key in ent.keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(ident)
+                if not bucket: del self._buckets[key]
+
+    def add(self, scope: str, code: str, lang: str, content: Dict[str, Any]) -> None:
+        # scope: 언어/목적/프로필/모델이 같은 결과끼리만 비교하도록 나누는 키
+        if not self.enabled: return
+        sk = sketch(code, lang)
+        if sk is None: return
+        ident = (scope, sk.digest)
+        ent = _Entry(scope, code, dumps(content), sk)
+        with self._lock:
+            if ident in self._entries:
+                self._drop(ident)
+            self._entries[ident] = ent
+            for key in ent.keys:
+                self._buckets.setdefault(key, set()).add(ident)
+            self._stats["indexed"] += 1
+            while len(self._entries) > self.max_items:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def lookup(self, scope: str, code: str, lang: str) -> Optional[Match]:
+        if not self.enabled: return None
+        sk = sketch(code, lang)
+        if sk is None: return None
+        with self._lock:
+            self._stats["lookups"] += 1
+            seen = set()
+            for i, band in enumerate(sk.bands):
+                seen.update(self._buckets.get((scope, i, band), ()))
+            best: Optional[Tuple[bool, float, _Entry]] = None
+            for ident in seen:
+                ent = self._entries[ident]
+                cand = (ent.digest == sk.digest, jaccard(sk.fps, ent.fps), ent)
+                if best is None or cand[:2] > best[:2]:
+                    best = cand
+            if best is None or best[1] < self.threshold:
+                self._stats["misses"] += 1
+                return None
+            identical, sim, ent = best
+            self._entries.move_to_end((ent.scope, ent.digest))
+        return Match(sim, identical, ent.code, loads(ent.blob))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["items"] = len(self._entries)
+        n = out["lookups"]
+        out["threshold"] = self.threshold
+        out["hit_rate"] = round(out["reused"] / n, 4) if n else 0.0
+        out["near_rate"] = round((out["reused"] + out["hinted"]) / n, 4) if n else 0.0
+        return out
+
+# ---- 결과 옮기기 (구조가 같은 제출본) ----
+def _indent(s: str) -> str:
+    return s[:len(s) - len(s.lstrip())]
+
+def _line_map(a: List[Token], b: List[Token]) -> Dict[int, int]:
+    # 이전 코드 줄 -> 새 코드 줄. 한 줄의 토큰이 통째로 한 줄에 대응할 때만 (줄 나눔이 다른 곳은 빠진다)
+    per_a: Dict[int, set] = {}
+    count_a: Dict[int, int] = {}
+    count_b: Dict[int, int] = {}
+    for ta, tb in zip(a, b):
+        per_a.setdefault(ta[2], set()).add(tb[2])
+        count_a[ta[2]] = count_a.get(ta[2], 0) + 1
+        count_b[tb[2]] = count_b.get(tb[2], 0) + 1
+    return {la: next(iter(lbs)) for la, lbs in per_a.items()
+            if len(lbs) == 1 and count_b[next(iter(lbs))] == count_a[la]}
+
+def _rename_text(text: str, rx: Optional["re.Pattern[str]"], renames: Dict[str, str]) -> str:
+    if rx is None or not text:
+        return text
+    return rx.sub(lambda m: renames[m.group()], text)
+
+def transfer(prev_code: str, prev: Dict[str, Any], prev_fixed: str, code: str,
+             lang: str) -> Optional[Tuple[Dict[str, Any], int]]:
+    # (prev의 summary/issues/fix를 새 코드 기준으로 옮긴 모델 응답 모양 dict, 바뀐 식별자 수). 옮길 수 없으면 None
+    a, b = tokenize(prev_code, lang), tokenize(code, lang)
+    if a is None or b is None or len(a) != len(b):
+        return None
+    renames: Dict[str, str] = {}
+    back: Dict[str, str] = {}
+    for ta, tb in zip(a, b):
+        if _renamable(ta) and _renamable(tb):
+            if renames.setdefault(ta[1], tb[1]) != tb[1] or back.setdefault(tb[1], ta[1]) != ta[1]:
+                return None   # 일대일 대응이 아님
+        elif _strict(ta) != _strict(tb):
+            return None
+    changed = {k: v for k, v in renames.items() if k != v}
+    rx = re.compile(r"(?<![\w$])(?:" + "|".join(re.escape(k) for k in sorted(changed, key=len, reverse=True)) + r")(?![\w$])") \
+        if changed else None
+    lmap = _line_map(a, b)
+    prev_lines, lines = prev_code.splitlines(), code.splitlines()
+
+    issues: List[Dict[str, Any]] = []
+    for it in prev.get("issues") or []:
+        try: line = int(it.get("line") or 0)
+        except Exception: continue
+        j = lmap.get(line)
+        if j is None:
+            continue
+        moved = {**it, "line": j}
+        for f in ("message", "suggestion", "patch"):
+            if isinstance(moved.get(f), str):
+                moved[f] = _rename_text(moved[f], rx, changed)
+        issues.append(moved)
+
+    fixed = code
+    if prev_fixed.strip() and prev_fixed != prev_code:
+        # 수정본의 식별자도 토큰 단위로 바꾼다. 수정이 새로 들인 이름이 새 코드의 다른 변수와 겹치면 포기
+        ftoks = tokenize(prev_fixed, lang) or []
+        parts: List[str] = []
+        pos = 0
+        for kind, text, _, start in ftoks:
+            if not (kind == "id" and text not in KEYWORDS):
+                continue
+            new = renames.get(text)
+            if new is None:
+                if text in back and back[text] != text:
+                    return None
+                continue
+            if new != text:
+                parts.append(prev_fixed[pos:start]); parts.append(new)
+                pos = start + len(text)
+        parts.append(prev_fixed[pos:])
+        fixed_lines = "".join(parts).splitlines()
+        if len(fixed_lines) != len(prev_fixed.splitlines()):
+            return None
+        edits: List[Edit] = []
+        for tag, i1, i2, j1, j2 in line_opcodes(prev_lines, prev_fixed.splitlines()):
+            if tag == "equal":
+                continue
+            if i2 > i1:
+                targets = [lmap.get(i + 1) for i in range(i1, i2)]
+                if any(t is None for t in targets) or targets != list(range(targets[0], targets[0] + len(targets))):
+                    return None
+                if any(_indent(prev_lines[i]) != _indent(lines[t - 1]) for i, t in zip(range(i1, i2), targets)):
+                    return None
+                start = targets[0] - 1
+            elif i1 == 0:
+                start = 0
+            else:
+                anchor = lmap.get(i1)
+                if anchor is None or _indent(prev_lines[i1 - 1]) != _indent(lines[anchor - 1]):
+                    return None
+                start = anchor
+            edits.append((start, i2 - i1, fixed_lines[j1:j2]))
+        out, _, rejected = apply_edits(lines, edits)
+        if rejected:
+            return None
+        fixed = "\n".join(out) + ("\n" if code.endswith("\n") else "")
+
+    strategy = str((prev.get("fix") or {}).get("strategy") or "patch")
+    return {
+        "summary": _rename_text(str(prev.get("summary") or ""), rx, changed),
+        "issues": issues,
+        "fix": {"strategy": strategy if fixed != code else "none", "patch": unified_patch(code, fixed), "fixed_code": fixed},
+    }, len(changed)
@@ -1,26 +1,81 @@
 from __future__ import annotations
-import os, json, textwrap, re
-from typing import Dict, Any, Optional, List
-from openai import OpenAI
+import os, time, textwrap, copy, asyncio, threading, contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Dict, Any, Optional, List, Tuple, Iterator
 
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-MAX_TOKENS   = int(os.getenv("OPENAI_MAX_TOKENS", "4096"))
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from .cache import ResultCache, make_key, profile_fingerprint
+from .singleflight import SingleFlight, follower_error, leader_interrupted
+from .jsonstream import StreamingJSONScanner
+from .local_analyzer import LOCAL_MERGE_ISSUES, analyze_local, fast_path_ok
+from .lexer import guess_language
+from .chunking import Chunk, should_chunk, split_chunks, run_chunks, merge_results, remap_issue
+from .fix_recovery import RECOVERY_STATS, apply_diff, merge_snippets, recover_fixed, unified_patch
+from .linediff import DIFF_CACHE, LineDiff, issue_hunks, line_diff
+from .incremental import (INCREMENTAL_ENABLED, INCREMENTAL_STATS, carry_fix_edits, carry_issues,
+                          plan_incremental, rebuild_fixed)
+from .submissions import SubmissionStore
+from .neardup import NearDupIndex, transfer
+from .profiles import header_text
+from .metrics import event, log_event, observe_stage, stage
+from .rules import RuleEngine
+from .response import RESPONSE_STATS, check_model, parse_model_json
+from .schema import MODEL_RESPONSE_FORMAT, REWRITE_RESPONSE_FORMAT, validate_model
+from .transport import (BREAKER_FALLBACK, OPENAI_CONNECT_TIMEOUT, Cancelled, Transport, build_async_http_client,
+                        build_http_client, cancel_event, cancel_scope, check_cancel, check_deadline)
+from . import mock_ai
+from .prompt_budget import (TokenUsage, TOKEN_STATS, compact_code, count_tokens, output_budget,
+                            profile_prompt_text, restore_line)
 
-SEVERITY_DOWNGRADE_RULES = [
-    (r"use\s+equals\(\)\s+for\s+string\s+comparison", "warn"),
-    (r"loose\s+comparison|===", "warn"),
-    (r"potential\s+xss|sanitize\s+user\s+input", "warn"),
-]
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")   # 기본 모델 (openai:<model> 제공자는 요청 범위에서 바꾼다)
+MAX_TOKENS   = int(os.getenv("OPENAI_MAX_TOKENS", "4096"))   # 요청별 max_tokens 상한 (실제 값은 입력 크기로 산정)
+# 1이면 분석 호출에 MODEL_SCHEMA를 structured output(json_schema, strict)으로 보낸다 (지원 모델만: gpt-4o 계열 등)
+JSON_SCHEMA  = os.getenv("OPENAI_JSON_SCHEMA", "0") == "1"
+# 1이면 모델은 fix.fixed_code와 이슈 줄 번호만 생성하고, fix.patch와 이슈별 patch는 서버가 원본과의 줄 diff로 만든다
+# (같은 수정을 diff로 한 번 더 쓰게 하지 않아 출력 토큰/시간이 준다). 0이면 기존처럼 모델이 diff도 쓴다
+REWRITE_ONLY = os.getenv("OPENAI_REWRITE_ONLY", "1") == "1"
+# 프롬프트/후처리 로직이 바뀌면 올려서 기존 캐시 항목을 무효화
+PROMPT_VERSION = "v5" if REWRITE_ONLY else "v5p"
 
-SYSTEM_PROMPT = textwrap.dedent("""
-You are a meticulous senior code reviewer and fixer.
-Return *strict JSON* only (no markdown). Keys: summary, metrics, issues, fix.
+# 이 요청이 쓸 모델. 캐시 키/토큰 수/호출/결과의 model이 모두 이 값을 따른다 (조각 스레드에도 컨텍스트로 이어진다)
+_MODEL: ContextVar[Optional[str]] = ContextVar("openai_model", default=None)
 
-- metrics: {
-    loc, language, maintainability_index, avg_complexity, mccabe_complexity,
-    blank, comments, todos, max_complexity
-  }
+def _model() -> str:
+    return _MODEL.get() or OPENAI_MODEL
+
+@contextmanager
+def _using_model(model: Optional[str]) -> Iterator[None]:
+    if not model:
+        yield; return
+    token = _MODEL.set(model)
+    try:
+        yield
+    finally:
+        _MODEL.reset(token)
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI, OpenAI
+
+# SDK(openai) import만 수백 ms가 걸리므로 클라이언트는 첫 호출(또는 warm())에서 만든다 (그 전에 바꿔 끼우면 그것을 쓴다)
+client: Optional["OpenAI"] = None
+_HTTP: Optional["httpx.Client"] = None
+_CLIENT_LOCK = threading.Lock()
+TRANSPORT = Transport.from_env()
+_ASYNC_CLIENT: Optional["AsyncOpenAI"] = None
+_ASYNC_HTTP: Optional["httpx.AsyncClient"] = None
+RESULT_CACHE = ResultCache.from_env()
+INFLIGHT = SingleFlight.from_env()
+NEARDUP = NearDupIndex.from_env()
+
+# 심각도 조정 / 목적 추론 규칙은 providers/rules.json (RULES_PATH)
+RULES = RuleEngine.from_env()
+
+_PATCH_SYSTEM_PROMPT = textwrap.dedent("""
+You are a meticulous senior code reviewer and fixer.
+Return *strict JSON* only (no markdown). Keys: summary, issues, fix.
+Metrics are computed by the server; do not output them.
 
 - issues: array of {
     line, severity in ["error","warn","info"], message, suggestion, patch
@@ -39,13 +94,39 @@ Hard rules:
 4) Keep style conventional for the language; avoid external deps.
 """).strip()
 
-FORCE_REWRITE_PROMPT = textwrap.dedent("""
-You previously analyzed code but did not provide fix.fixed_code.
-Now produce JSON with the SAME SCHEMA, and you MUST include a full corrected and enhanced version
-of the source under fix.fixed_code. Keep other fields sensible. No markdown. Only JSON.
-<code>
-{code}
-</code>
+_REWRITE_SYSTEM_PROMPT = textwrap.dedent("""
+You are a meticulous senior code reviewer and fixer.
+Return *strict JSON* only (no markdown). Keys: summary, issues, fix.
+Metrics and diffs are computed by the server; do not output them.
+
+- issues: array of {
+    line (in the original code), severity in ["error","warn","info"], message, suggestion
+  }
+
+- fix: {
+    "strategy": one of ["none","patch","full_rewrite"],
+    "fixed_code": full corrected & enhanced source code as a single string
+  }
+
+Hard rules:
+1) Output MUST be valid JSON. No extra text. No markdown fences. No comments.
+2) Escape newlines properly. Avoid backticks and trailing commas.
+3) Always provide `fix.fixed_code` (the original code unchanged if nothing needs fixing). Never output a diff.
+4) Keep style conventional for the language; avoid external deps.
+""").strip()
+
+SYSTEM_PROMPT = _REWRITE_SYSTEM_PROMPT if REWRITE_ONLY else _PATCH_SYSTEM_PROMPT
+_RESPONSE_FORMAT = REWRITE_RESPONSE_FORMAT if REWRITE_ONLY else MODEL_RESPONSE_FORMAT
+
+REGION_FIX_SYSTEM = "You are a meticulous code fixer. Return *strict JSON* only (no markdown)."
+
+REGION_FIX_PROMPT = textwrap.dedent("""
+You previously reviewed this code but the fix for some regions is missing.
+For each region below return the corrected replacement for exactly those lines (same start and end),
+keeping everything outside the region unchanged.
+Return JSON: {{"regions": [{{"id": <region id>, "fixed_code": "<replacement lines>"}}]}}
+
+{regions}
 """).strip()
 
 def _line_comment_prefix(lang: str) -> str:
@@ -71,10 +152,7 @@ def _decorate_for_purpose(code: str, lang: str, purpose: Optional[str], user_pro
         None:"Baseline"
     }.get(purpose if purpose in {"security_hardening","performance_opt","teach_beginner","general_refactor"} else None)
 
-    up = ""
-    if isinstance(user_profile, dict) and user_profile:
-        try: up = json.dumps(user_profile, ensure_ascii=False)[:300]
-        except Exception: up = ""
+    up = header_text(user_profile)
 
     tip_lines = []
     if purpose == "teach_beginner":
@@ -94,169 +172,46 @@ def _decorate_for_purpose(code: str, lang: str, purpose: Optional[str], user_pro
     return header + code
 
 def _apply_unified_diff(original_text: str, diff_text: str) -> Optional[str]:
+    # 모든 hunk가 (오프셋/fuzz 허용으로) 붙었을 때만 결과를 돌려준다
     if not diff_text or not diff_text.strip():
         return None
-    try:
-        orig = original_text.splitlines()
-        out: List[str] = []
-        i = 0
-        lines = diff_text.splitlines()
-
-        def _parse_hunk_header(h: str):
-            m = re.match(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@", h)
-            if not m: return None
-            a, a_len, b, b_len = m.groups()
-            return {"aStart": int(a), "aLen": int(a_len) if a_len else 1,
-                    "bStart": int(b), "bLen": int(b_len) if b_len else 1}
-
-        k = 0
-        while k < len(lines):
-            ln = lines[k]
-            if ln.startswith('--- ') or ln.startswith('+++ '):
-                k += 1; continue
-            if ln.startswith('@@'):
-                h = _parse_hunk_header(ln)
-                if not h: return None
-                target = h["aStart"] - 1
-                while i < target and i < len(orig):
-                    out.append(orig[i]); i += 1
-                k += 1
-                while k < len(lines) and not lines[k].startswith('@@'):
-                    body = lines[k]
-                    if body.startswith(' '):
-                        out.append(orig[i] if i < len(orig) else ""); i += 1
-                    elif body.startswith('-'):
-                        i += 1
-                    elif body.startswith('+'):
-                        out.append(body[1:])
-                    elif body.startswith('\\ No newline at end of file'):
-                        pass
-                    elif body.startswith('--- ') or body.startswith('+++ '):
-                        break
-                    else:
-                        return None
-                    k += 1
-                continue
-            k += 1
-        while i < len(orig):
-            out.append(orig[i]); i += 1
-        return "\n".join(out)
-    except Exception:
-        return None
-
-# ---- ed-style / 스니펫 정규화 ----
-_ED_CHANGE_HDR = re.compile(r"^\s*\d+\s*[acd]\s*\d+\s*$")
-
-def _sanitize_patch_snippet(raw: str) -> str:
-    if not raw: return ""
-    lines = [l.rstrip("\r") for l in raw.splitlines()]
-    out: List[str] = []
-    in_block = False
-    for ln in lines:
-        if _ED_CHANGE_HDR.match(ln):
-            in_block = True
-            continue
-        if ln.strip() == "---":
-            continue
-        if ln.startswith(">"):
-            out.append(ln[1:].lstrip()); continue
-        if ln.startswith("<"):
-            continue
-        if not in_block:
-            out.append(ln)
-    cleaned = "\n".join(out).strip()
-    return cleaned if cleaned else raw
+    res = apply_diff(original_text, diff_text)
+    return res.text if res.text is not None and not res.failed else None
 
 def _apply_issue_patches(original_text: str, issues: List[Dict[str, Any]]) -> Optional[str]:
     if not issues: return None
-    snippet_issues = []
-    for it in issues:
-        p = (it.get("patch") or "").strip()
-        if not p: continue
-        if p.startswith("---") and "@@" in p:
-            continue
-        ln = int(it.get("line") or 0)
-        snippet_issues.append((ln, _sanitize_patch_snippet(p)))
-
-    if not snippet_issues:
-        return None
-
-    snippet_issues.sort(key=lambda x: x[0], reverse=True)
-    lines = original_text.splitlines()
+    return merge_snippets(original_text, issues).text
 
-    for ln, snippet in snippet_issues:
-        idx = max(0, ln - 1)
-        snippet_lines = snippet.splitlines()
-        if 0 <= idx < len(lines):
-            lines[idx:idx+1] = snippet_lines
-        else:
-            if lines and lines[-1] != "": lines.append("")
-            lines.extend(snippet_lines)
-
-    return "\n".join(lines)
+def _result_version() -> str:
+    # 같은 입력의 결과를 바꾸는 서버 쪽 설정 (캐시/병합 키에 들어간다)
+    return f"{PROMPT_VERSION}+{RULES.version}" + ("+local" if LOCAL_MERGE_ISSUES else "")
 
 def _guess_language(language: str, code: str) -> str:
-    if language and language.lower() != "auto":
-        return language.lower()
-    if re.search(r"#include\s*<", code): return "cpp"
-    if re.search(r"\bclass\s+\w+\b", code) and re.search(r"import\s+\w+;", code): return "java"
-    if re.search(r"\bdef\s+\w+\(", code): return "python"
-    if re.search(r"\bfunction\s+\w+\(|=>", code): return "javascript"
-    return "auto"
-
-def _strip_c_like_strings(line: str) -> str:
-    out = []; in_s = None; esc = False
-    for ch in line:
-        if esc: esc = False; continue
-        if ch == '\\': esc = True; continue
-        if in_s:
-            if ch == in_s: in_s = None
-            continue
-        else:
-            if ch in ('"', "'"):
-                in_s = ch; continue
-            out.append(ch)
-    return "".join(out)
-
-def _compute_basic_metrics(code: str, language: str) -> Dict[str, Optional[int]]:
-    lang = _guess_language(language, code)
-    lines = code.splitlines()
-    blank = sum(1 for l in lines if not l.strip())
-    todos = sum(1 for l in lines if "TODO" in l or "FIXME" in l)
-
-    comments = 0
-    if lang in ("c","cpp","java","javascript","typescript","csharp","go","rust","kotlin","swift","php"):
-        in_block = False
-        for l in lines:
-            s_nostr = _strip_c_like_strings(l)
-            s = s_nostr.strip()
-            if in_block:
-                comments += 1
-                if "*/" in s: in_block = False
-                continue
-            if "/*" in s:
-                comments += 1
-                if "*/" not in s: in_block = True
-                continue
-            if "//" in s:
-                comments += 1
-                continue
-    elif lang in ("python","ruby"):
-        for l in lines:
-            if l.strip().startswith("#") or "#" in l:
-                comments += 1
-
-    return {"blank": blank, "comments": comments, "todos": todos}
+    return guess_language(language, code)
 
 def _normalize_severity(msg: str, sev: str) -> str:
-    base = (sev or "info").lower()
-    text = (msg or "").lower()
-    for pattern, target in SEVERITY_DOWNGRADE_RULES:
-        if re.search(pattern, text):
-            return target
-    return base
-
-def _coerce_defaults(payload: Dict[str, Any], language: str, code: str) -> Dict[str, Any]:
+    return RULES.severity(msg, sev)
+
+def _coerce_issue(it: Any, trusted: bool = False) -> Optional[Dict[str, Any]]:
+    if trusted:
+        # 스키마 검증을 통과한 항목: 타입 변환 없이 기본값만 채운다
+        return {"line": it["line"], "severity": _normalize_severity(it["message"], it["severity"]),
+                "message": it["message"], "suggestion": it.get("suggestion", ""), "patch": it.get("patch", "")}
+    if not isinstance(it, dict): return None
+    try: line = int(it.get("line"))
+    except: line = 0
+    sev_raw = str(it.get("severity", "info"))
+    msg = str(it.get("message", ""))
+    return {
+        "line": line,
+        "severity": _normalize_severity(msg, sev_raw),
+        "message": msg,
+        "suggestion": str(it.get("suggestion", "")),
+        "patch": str(it.get("patch", "")),
+    }
+
+def _coerce_defaults(payload: Dict[str, Any], language: str, code: str,
+                     report: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     def _num(x, d=None):
         try: return float(x)
         except: return d
@@ -264,36 +219,29 @@ def _coerce_defaults(payload: Dict[str, Any], language: str, code: str) -> Dict[
         try: return int(x)
         except: return d
 
-    issues = []
-    for it in payload.get("issues", []) or []:
-        if not isinstance(it, dict): continue
-        sev_raw = str(it.get("severity", "info"))
-        msg = str(it.get("message", ""))
-        issues.append({
-            "line": _int(it.get("line"), 0),
-            "severity": _normalize_severity(msg, sev_raw),
-            "message": msg,
-            "suggestion": str(it.get("suggestion", "")),
-            "patch": str(it.get("patch", "")),
-        })
+    trusted = not validate_model(payload)
+    issues = [c for c in (_coerce_issue(it, trusted) for it in payload.get("issues", []) or []) if c is not None]
 
+    # metrics는 로컬 엔진 값이 우선. 로컬에서 구할 수 없는 값(미지원 언어 등)만 모델 응답으로 채운다
+    if report is None:
+        report = analyze_local(code, _guess_language(language, code))
+    local = report["metrics"]
     m = payload.get("metrics") or {}
     raw_comments = m.get("comments", m.get("comment"))
-    base = _compute_basic_metrics(code, language)
     f = payload.get("fix") or {}
 
     out = {
         "summary": str(payload.get("summary", "")),
         "metrics": {
-            "loc": _int(m.get("loc"), len(code.splitlines())),
-            "language": _guess_language(language, code),
-            "maintainability_index": _num(m.get("maintainability_index")),
-            "avg_complexity": _num(m.get("avg_complexity")),
-            "mccabe_complexity": _num(m.get("mccabe_complexity")),
-            "blank": _int(m.get("blank")) if m.get("blank") is not None else base["blank"],
-            "comments": _int(raw_comments) if raw_comments is not None else base["comments"],
-            "todos": _int(m.get("todos")) if m.get("todos") is not None else base["todos"],
-            "max_complexity": _num(m.get("max_complexity")),
+            "loc": local["loc"],
+            "language": local["language"],
+            "maintainability_index": local["maintainability_index"] if local["maintainability_index"] is not None else _num(m.get("maintainability_index")),
+            "avg_complexity": local["avg_complexity"] if local["avg_complexity"] is not None else _num(m.get("avg_complexity")),
+            "mccabe_complexity": local["mccabe_complexity"] if local["mccabe_complexity"] is not None else _num(m.get("mccabe_complexity")),
+            "blank": local["blank"],
+            "comments": local["comments"] if report["parsed"] or raw_comments is None else _int(raw_comments),
+            "todos": local["todos"],
+            "max_complexity": local["max_complexity"] if local["max_complexity"] is not None else _num(m.get("max_complexity")),
         },
         "issues": issues,
         "fix": {
@@ -303,47 +251,113 @@ def _coerce_defaults(payload: Dict[str, Any], language: str, code: str) -> Dict[
         },
     }
     out["metrics"]["comment"] = out["metrics"]["comments"]
+
+    if LOCAL_MERGE_ISSUES:
+        # 로컬 규칙 팩이 찾은 이슈 중 모델이 같은 줄에서 지적하지 않은 것만 보탠다
+        seen_lines = {it["line"] for it in issues}
+        extra = [c for c in (_coerce_issue(it) for it in report["issues"]) if c is not None and c["line"] not in seen_lines]
+        if extra:
+            out["issues"] = sorted(issues + extra, key=lambda it: it["line"])
     return out
 
 def _infer_purpose_from_code_and_issues(code: str, issues: List[Dict[str, Any]]) -> str:
-    txt = (code or "").lower()
-    joined = " ".join([(it.get("message") or "") + " " + (it.get("suggestion") or "") for it in (issues or [])]).lower()
-    hay = txt + " " + joined
-    if any(k in hay for k in ["xss","sql","sanitize","escape","injection","eval(","md5(","sha1("]):
-        return "security_hardening"
-    if any(k in hay for k in ["optimiz","optimize","performance","perf","benchmark","bottleneck","n^2","o(n^2)"]):
-        return "performance_opt"
-    if any(k in hay for k in ["tutorial","beginner","for learning","교육","학습","주석 추가"]):
-        return "teach_beginner"
-    return "general_refactor"
-
-def _chat_json(system: str, user: str) -> Dict[str, Any]:
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        temperature=0,
-        max_tokens=MAX_TOKENS,
-        response_format={"type": "json_object"},
-        messages=[{"role":"system","content":system},
-                  {"role":"user","content":user}],
-    )
-    raw = resp.choices[0].message.content or "{}"
-    try:
-        return json.loads(raw)
-    except Exception:
-        return {}
+    return RULES.purpose(code, issues)
 
-def analyze(
-    code: str,
-    language: str = "auto",
-    submissionId: Optional[str] = None,
-    userId: Optional[str] = None,
-    purpose: Optional[str] = None,
-    user_profile: Optional[Dict[str, Any]] = None,
-    **kwargs: Any,
-) -> Dict[str, Any]:
-    if not code or not code.strip():
-        raise ValueError("code is required")
+def _chat_params(system: str, user: str, max_tokens: int, structured: bool = False) -> Dict[str, Any]:
+    # structured: 응답이 MODEL_SCHEMA 모양인 분석 호출 (영역 재요청 등 다른 모양은 json_object)
+    fmt = _RESPONSE_FORMAT if (structured and JSON_SCHEMA) else {"type": "json_object"}
+    return {"temperature": 0, "max_tokens": max_tokens, "response_format": fmt,
+            "messages": [{"role":"system","content":system},
+                         {"role":"user","content":user}]}
+
+def _record_usage(usage: Optional[TokenUsage], u: Any, estimated: int, max_tokens: int) -> None:
+    if usage is not None:
+        usage.add(getattr(u, "prompt_tokens", None), getattr(u, "completion_tokens", None),
+                  estimated, max_tokens)
 
+def _parse_json(raw: str, structured: bool = False) -> Dict[str, Any]:
+    # 깨진 JSON은 로컬에서 복구해 호출 결과를 살린다. 분석 응답은 스키마 통과율도 센다
+    with stage("parse_json"):
+        parsed = parse_model_json(raw)
+        if structured and parsed:
+            check_model(parsed)
+    return parsed
+
+def _chat_json(system: str, user: str, max_tokens: Optional[int] = None,
+               usage: Optional[TokenUsage] = None, estimated: int = 0, structured: bool = False) -> Dict[str, Any]:
+    max_tokens = max_tokens or MAX_TOKENS
+    if cancel_event() is not None:
+        # 취소될 수 있는 호출(헤지 경쟁 등)은 스트림으로 받는다: 청크마다 취소를 보고, 취소되면 연결을 끊어 생성도 멈춘다
+        raw = "".join(_chat_json_stream(system, user, max_tokens, usage, estimated, structured))
+        return _parse_json(raw or "{}", structured)
+    with stage("llm"):
+        resp = TRANSPORT.call(_client().chat.completions.create, _model(), estimated + max_tokens,
+                              **_chat_params(system, user, max_tokens, structured))
+    _record_usage(usage, getattr(resp, "usage", None), estimated, max_tokens)
+    return _parse_json(resp.choices[0].message.content or "{}", structured)
+
+def _chat_json_stream(system: str, user: str, max_tokens: Optional[int] = None,
+                      usage: Optional[TokenUsage] = None, estimated: int = 0,
+                      structured: bool = False) -> Iterator[str]:
+    max_tokens = max_tokens or MAX_TOKENS
+    stream = TRANSPORT.stream(_client().chat.completions.create, _model(), estimated + max_tokens,
+                              stream=True, stream_options={"include_usage": True},
+                              **_chat_params(system, user, max_tokens, structured))
+    u = None
+    t0 = time.perf_counter()
+    first = True
+    for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            u = chunk.usage   # 마지막 청크(choices 비어 있음)에 실림
+        if not chunk.choices: continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if first:
+                observe_stage("llm_first_token", time.perf_counter() - t0)
+                first = False
+            yield delta
+    observe_stage("llm", time.perf_counter() - t0)
+    _record_usage(usage, u, estimated, max_tokens)
+
+def _client() -> "OpenAI":
+    global client, _HTTP
+    if client is None:
+        with _CLIENT_LOCK:
+            if client is None:
+                from openai import OpenAI
+                _HTTP = build_http_client()
+                # 재시도는 TRANSPORT가 맡으므로 SDK 재시도는 끈다
+                client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=_HTTP, max_retries=0)
+    return client
+
+def _async_client() -> "AsyncOpenAI":
+    # 비동기 서버 모드에서만 쓰므로 처음 호출할 때 만든다 (이벤트 루프 스레드에서만 불리므로 잠금 없음)
+    global _ASYNC_CLIENT, _ASYNC_HTTP
+    if _ASYNC_CLIENT is None:
+        from openai import AsyncOpenAI
+        _ASYNC_HTTP = build_async_http_client()
+        _ASYNC_CLIENT = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=_ASYNC_HTTP, max_retries=0)
+    return _ASYNC_CLIENT
+
+async def _achat_json(system: str, user: str, max_tokens: Optional[int] = None,
+                      usage: Optional[TokenUsage] = None, estimated: int = 0,
+                      structured: bool = False) -> Dict[str, Any]:
+    # _chat_json의 비동기판 (같은 TRANSPORT 한도/서킷을 공유)
+    max_tokens = max_tokens or MAX_TOKENS
+    with stage("llm"):
+        resp = await TRANSPORT.acall(_async_client().chat.completions.create, _model(), estimated + max_tokens,
+                                     **_chat_params(system, user, max_tokens, structured))
+    _record_usage(usage, getattr(resp, "usage", None), estimated, max_tokens)
+    return _parse_json(resp.choices[0].message.content or "{}", structured)
+
+async def aclose() -> None:
+    # ASGI 종료 시 비동기 클라이언트의 커넥션 풀을 닫는다
+    global _ASYNC_CLIENT, _ASYNC_HTTP
+    if _ASYNC_CLIENT is not None:
+        c, _ASYNC_CLIENT, _ASYNC_HTTP = _ASYNC_CLIENT, None, None
+        await c.close()
+
+def _build_user_prompt(code: str, purpose: Optional[str], user_profile: Optional[Dict[str, Any]]) -> str:
     purpose_note = {
         "security_hardening": "Focus on removing security smells (taint, XSS, SQLi, unsafe APIs). Add minimal safeguards.",
         "performance_opt":    "Focus on improving performance (algorithmic complexity, avoid redundant allocations, efficient IO).",
@@ -352,16 +366,20 @@ def analyze(
         None:                 "Keep code functionally equivalent and idiomatic.",
     }.get(purpose if purpose in {"security_hardening","performance_opt","teach_beginner","general_refactor"} else None)
 
+    patch_goal = ("Do not write diffs; fix.patch and issue patches are derived from fix.fixed_code."
+                  if REWRITE_ONLY else "Provide minimal patch (unified diff) in fix.patch.")
+
     profile_hint = ""
-    if isinstance(user_profile, dict) and user_profile:
-        profile_hint = f"\nUser profile hints (optional): {json.dumps(user_profile, ensure_ascii=False)[:1000]}"
+    profile_text = profile_prompt_text(user_profile)
+    if profile_text:
+        profile_hint = f"\nUser profile hints (optional): {profile_text}"
 
     user_prompt = textwrap.dedent(f"""
     You are a code reviewer & fixer. Return JSON only (schema in system prompt).
 
     Goals:
     - Fix correctness issues and smells with line numbers.
-    - Provide minimal patch (unified diff) in fix.patch.
+    - {patch_goal}
     - Provide a full corrected & enhanced code in fix.fixed_code.
     - Enhancement guideline: {purpose_note}
     {profile_hint}
@@ -370,77 +388,428 @@ def analyze(
     - Keep original functionality unless unsafe.
     - Avoid external dependencies; keep code self-contained.
     - If you add comments (teach_beginner), keep them concise and helpful.
-
-    <code>
-    {code}
-    </code>
     """).strip()
+    # 코드는 dedent 뒤에 붙여야 들여쓰기가 그대로 전달된다 (함수 본문만 있는 조각 등)
+    return f"{user_prompt}\n\n<code>\n{code}\n</code>"
+
+CHUNK_PROMPT_NOTE = textwrap.dedent("""
+Note: the code above is lines {start}-{end} of a {total}-line file, split at function boundaries.
+Review only this excerpt. Issue line numbers MUST be relative to the excerpt (its first line is 1).
+fix.fixed_code must contain only the corrected excerpt, not the whole file.
+""").strip()
+
+NEARDUP_PROMPT_NOTE = textwrap.dedent("""
+Note: a submission {similarity}% similar to this code (different names, comments or formatting) was reviewed earlier
+with the findings below. Confirm and reuse the ones that still apply, adding only what is new; keep the summary brief.
+{findings}
+""").strip()
+
+class _Prompt:
+    # LLM에 보낼 압축된 user 프롬프트와 예산. line_map은 압축본 줄 -> 원본 줄 (압축으로 줄이 바뀐 경우만)
+    __slots__ = ("text", "code", "line_map", "max_tokens", "estimated")
+
+    def __init__(self, text: str, code: str, line_map: Optional[List[int]], max_tokens: int, estimated: int):
+        self.text = text
+        self.code = code
+        self.line_map = line_map
+        self.max_tokens = max_tokens
+        self.estimated = estimated
 
+def _system_tokens() -> int:
+    return count_tokens(SYSTEM_PROMPT, _model())
+
+def _prepare_prompt(
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    usage: Optional[TokenUsage] = None,
+    note: str = "",
+) -> _Prompt:
+    sent, line_map = compact_code(code, _guess_language(language, code), purpose)
+    code_tokens = count_tokens(sent, _model())
+    if usage is not None and sent != code:
+        usage.saved(count_tokens(code, _model()) - code_tokens)
+    text = _build_user_prompt(sent, purpose, user_profile)
+    if note:
+        text += "\n\n" + note
+    estimated = _system_tokens() + count_tokens(text, _model())
+    return _Prompt(text, sent, line_map, output_budget(code_tokens, MAX_TOKENS), estimated)
+
+def _restore_compacted(parsed: Dict[str, Any], code: str, prompt: _Prompt) -> Dict[str, Any]:
+    # 압축본 기준으로 온 응답을 원본 기준으로: 이슈 라인 복원, diff는 압축본에 적용, patch는 원본 대비로 다시 만든다
+    if prompt.code == code or not isinstance(parsed, dict):
+        return parsed
+    parsed = dict(parsed)
+    issues = []
+    for it in parsed.get("issues") or []:
+        if isinstance(it, dict):
+            try: it = {**it, "line": restore_line(int(it.get("line") or 0), prompt.line_map)}
+            except Exception: pass
+        issues.append(it)
+    parsed["issues"] = issues
+    f = dict(parsed.get("fix") or {})
+    fixed = str(f.get("fixed_code") or "")
+    if not fixed.strip() and f.get("patch"):
+        fixed = _apply_unified_diff(prompt.code, str(f["patch"])) or ""
+        if fixed.strip():
+            f["fixed_code"] = fixed
+            if f.get("strategy") in ("none", "", None): f["strategy"] = "patch"
+    if fixed.strip():
+        f["patch"] = unified_patch(code, fixed)
+    else:
+        f["patch"] = ""
+    parsed["fix"] = f
+    return parsed
+
+def _analyze_content(
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+) -> Tuple[Dict[str, Any], bool]:
+    # 요청 식별 필드(submissionId/userId)와 무관한 분석 본문만 생성. 두 번째 값은 캐시 가능 여부
+    with stage("local"):
+        report = analyze_local(code, _guess_language(language, code))
+    if fast_path_ok(report):
+        event("path", "fast")
+        return _local_content(code, language, purpose, user_profile, report), True
+    near, hint = _near_duplicate(code, language, purpose, user_profile, report)
+    if near is not None:
+        return near, True
+    if should_chunk(code, report):
+        chunks = split_chunks(code, report["functions"])
+        if len(chunks) > 1:
+            event("path", "chunked")
+            return _analyze_chunked(code, language, purpose, user_profile, report, chunks)
+    event("path", "full")
+    usage = TokenUsage()
     try:
-        parsed = _chat_json(SYSTEM_PROMPT, user_prompt)
-    except Exception:
-        parsed = {"summary":"smoke test ok",
-                  "metrics":{"loc":len(code.splitlines()),"language":language},
-                  "issues":[], "fix":{"strategy":"none","patch":"","fixed_code":""}}
-
-    out = _coerce_defaults(parsed, language, code)
-
-    fixed = (out.get("fix", {}) or {}).get("fixed_code", "") or ""
-
-    if not fixed:
-        diff_text = (out.get("fix", {}) or {}).get("patch", "") or ""
-        applied = _apply_unified_diff(code, diff_text) if diff_text else None
-        if applied and applied.strip():
-            fixed = applied
-            out["fix"]["fixed_code"] = fixed
-            if out["fix"].get("strategy") in ("none","",None):
-                out["fix"]["strategy"] = "patch"
-
-    if not fixed and out.get("issues"):
-        replaced = _apply_issue_patches(code, out["issues"])
-        if replaced and replaced.strip():
-            fixed = replaced
-            out["fix"]["fixed_code"] = fixed
-            if out["fix"].get("strategy") in ("none","",None):
-                out["fix"]["strategy"] = "patch"
-
-    if not fixed:
-        try:
-            forced = _chat_json(SYSTEM_PROMPT, FORCE_REWRITE_PROMPT.format(code=code))
-            f2 = forced.get("fix", {}) if isinstance(forced, dict) else {}
-            fc2 = (f2.get("fixed_code") or "").strip()
-            if fc2:
-                fixed = fc2
-                out["fix"]["fixed_code"] = fixed
-                if out["fix"].get("strategy") in ("none","",None):
-                    out["fix"]["strategy"] = "full_rewrite"
-            if not out.get("summary") and forced.get("summary"):
-                out["summary"] = forced["summary"]
-            if out["issues"] == [] and isinstance(forced.get("issues"), list):
-                out["issues"] = forced["issues"]
-        except Exception:
-            pass
-
-    if not fixed:
-        fixed = code
-        out["fix"]["fixed_code"] = fixed
-        if out["fix"].get("strategy") in ("none","",None):
-            out["fix"]["strategy"] = "none"
+        with stage("prompt"):
+            prompt = _prepare_prompt(code, language, purpose, user_profile, usage, hint)
+        parsed = _chat_json(SYSTEM_PROMPT, prompt.text, prompt.max_tokens, usage, prompt.estimated,
+                        structured=True)
+        parsed = _restore_compacted(parsed, code, prompt)
+    except Cancelled:
+        raise
+    except Exception as e:
+        log_event("upstream_fallback", level="warning", error=repr(e))
+        return _fallback_content(code, language, purpose, user_profile, report), False
+    out = _finalize_content(parsed, code, language, purpose, user_profile, report, usage)
+    out["token_usage"] = usage.as_dict()
+    return out, True
+
+def _analyze_chunk(
+    chunk: Chunk,
+    total: int,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    usage: TokenUsage,
+) -> Dict[str, Any]:
+    # 조각 하나 분석. fixed_code가 없으면 diff/이슈 패치로만 복구하고 LLM 재요청은 하지 않는다
+    prompt = _prepare_prompt(chunk.text, language, purpose, user_profile, usage,
+                             CHUNK_PROMPT_NOTE.format(start=chunk.start, end=chunk.end, total=total))
+    parsed = _chat_json(SYSTEM_PROMPT, prompt.text, prompt.max_tokens, usage, prompt.estimated,
+                        structured=True)
+    parsed = _restore_compacted(parsed, chunk.text, prompt)
+    issues = [c for c in (_coerce_issue(it) for it in parsed.get("issues", []) or []) if c is not None]
+    fixed, tier = recover_fixed(chunk.text, parsed.get("fix") or {}, issues)
+    if tier == "unrecovered":
+        fixed = ""
+    return {"summary": str(parsed.get("summary", "")), "issues": issues, "fixed_code": fixed}
+
+def _analyze_chunked(
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    report: Dict[str, Any],
+    chunks: List[Chunk],
+) -> Tuple[Dict[str, Any], bool]:
+    # 큰 파일: 조각을 동시에 분석하고 합친 결과를 단일 응답처럼 후처리한다. 일부 조각이 실패하면 캐시하지 않음
+    total = report["metrics"]["loc"]
+    lang = report["metrics"]["language"]
+    usage = TokenUsage()
+    results = run_chunks(chunks, lambda ch: _analyze_chunk(ch, total, lang, purpose, user_profile, usage))
+    if all(r is None for r in results):
+        return _fallback_content(code, language, purpose, user_profile, report), False
+    parsed = merge_results(code, chunks, results)
+    out = _finalize_content(parsed, code, language, purpose, user_profile, report, usage, count_recovery=False)
+    out["chunks"] = len(chunks)
+    out["token_usage"] = usage.as_dict()
+    return out, all(r is not None for r in results)
+
+def _retry_regions(
+    text: str,
+    regions: List[Tuple[int, int, List[str]]],
+    usage: Optional[TokenUsage],
+) -> Dict[int, str]:
+    # 복구하지 못한 구간만 보내 fix를 다시 받는다 (전체 코드/summary/issues 재생성 없음)
+    lines = text.splitlines()
+    blocks = []
+    for n, (s, e, msgs) in enumerate(regions):
+        body = "\n".join(lines[s - 1:e])
+        notes = "\n".join(f"- {m}" for m in msgs) or "- (see issues above)"
+        blocks.append(f'<region id="{n}" lines="{s}-{e}">\n{body}\n</region>\nIssues:\n{notes}')
+    prompt = REGION_FIX_PROMPT.format(regions="\n\n".join(blocks))
+    region_tokens = count_tokens("\n".join(blocks), _model())
+    with stage("region_retry"):
+        parsed = _chat_json(REGION_FIX_SYSTEM, prompt, output_budget(region_tokens, MAX_TOKENS), usage,
+                            count_tokens(REGION_FIX_SYSTEM + prompt, _model()))
+    out: Dict[int, str] = {}
+    for r in parsed.get("regions") or []:
+        if not isinstance(r, dict): continue
+        try: out[int(r.get("id"))] = str(r.get("fixed_code") or "")
+        except Exception: continue
+    return out
+
+# ---- 증분 재분석 (이전 제출본 대비 바뀐 함수만) ----
+_submission_store: Optional[SubmissionStore] = None
+_submission_lock = threading.Lock()
+
+def _submissions() -> SubmissionStore:
+    global _submission_store
+    with _submission_lock:
+        if _submission_store is None:
+            _submission_store = SubmissionStore.from_env()
+        return _submission_store
+
+def _previous_submission(
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    submissionId: Optional[str],
+    userId: Optional[str],
+    fileKey: Optional[str],
+    previousSubmissionId: Optional[str],
+) -> Optional[Dict[str, Any]]:
+    if not INCREMENTAL_ENABLED or (previousSubmissionId is None and (userId is None or not fileKey)):
+        return None
+    try:
+        store = _submissions()
+        prev = store.get(previousSubmissionId) if previousSubmissionId is not None \
+            else store.latest(userId, fileKey, exclude_id=submissionId)
+    except Exception as e:
+        log_event("submission_lookup_failed", level="warning", error=repr(e))
+        return None
+    # 언어/목적/프로필이 다르면 이전 결과를 재사용할 수 없다
+    if prev is None or prev["language"] != _guess_language(language, code) \
+            or prev["purpose"] != (purpose or None) or prev["profile_fp"] != profile_fingerprint(user_profile):
+        return None
+    return prev
+
+def _record_submission(
+    content: Dict[str, Any],
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    submissionId: Optional[str],
+    userId: Optional[str],
+    fileKey: Optional[str],
+) -> None:
+    if not INCREMENTAL_ENABLED or (submissionId is None and (userId is None or not fileKey)):
+        return
+    try:
+        _submissions().save(submissionId, userId, fileKey, code, _guess_language(language, code), purpose,
+                            profile_fingerprint(user_profile), content)
+    except Exception as e:
+        log_event("submission_save_failed", level="warning", error=repr(e))
+
+def _undecorate(fixed: str, lang: str, final_purpose: Optional[str], user_profile: Optional[Dict[str, Any]]) -> str:
+    # 저장된 fixed_code에서 _decorate_for_purpose가 붙인 머리 주석을 떼어 낸다
+    header = _decorate_for_purpose("", lang, final_purpose, user_profile)
+    return fixed[len(header):] if header and fixed.startswith(header) else fixed
+
+def _analyze_incremental(
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    prev: Dict[str, Any],
+) -> Optional[Tuple[Dict[str, Any], bool]]:
+    # 바뀐 줄이 속한 함수 범위만 조각 분석하고 나머지는 이전 결과를 옮겨 온다. 적용할 수 없으면 None (전체 분석)
+    lang = _guess_language(language, code)
+    report = analyze_local(code, lang)
+    if fast_path_ok(report):
+        return None
+    plan = plan_incremental(prev["code"], code, report["functions"])
+    if plan is None:
+        INCREMENTAL_STATS.add(fallbacks=1)
+        return None
+    lines = code.splitlines()
+    total = report["metrics"]["loc"]
+    chunks = [Chunk(n, s, e, "\n".join(lines[s - 1:e])) for n, (s, e) in enumerate(plan.regions)]
+    usage = TokenUsage()
+    results = run_chunks(chunks, lambda ch: _analyze_chunk(ch, total, lang, purpose, user_profile, usage)) if chunks else []
+    if chunks and all(r is None for r in results):
+        return None
+
+    prev_content = prev["content"]
+    carried = carry_issues(prev_content.get("issues") or [], plan)
+    issues = list(carried)
+    summaries: List[str] = []
+    for ch, res in zip(chunks, results):
+        if res is None: continue
+        issues.extend(remap_issue(it, ch) for it in res.get("issues") or [])
+        if res.get("summary"):
+            summaries.append(f"[L{ch.start}-{ch.end}] {res['summary']}")
+    prev_fixed = _undecorate(str((prev_content.get("fix") or {}).get("fixed_code") or ""),
+                             lang, prev_content.get("final_purpose"), user_profile)
+    fixed = rebuild_fixed(code, carry_fix_edits(prev["code"], prev_fixed, plan),
+                          [(ch.start, ch.end, (res or {}).get("fixed_code")) for ch, res in zip(chunks, results)])
+    head = f"Incremental review of {len(chunks)} changed region(s), {plan.reanalyzed_lines}/{total} lines re-analyzed."
+    parsed = {
+        "summary": " ".join([head] + summaries) if summaries else f"{head} {prev_content.get('summary', '')}".strip(),
+        "issues": sorted(issues, key=lambda it: it.get("line") or 0),
+        "fix": {"strategy": "patch" if fixed != code else "none", "patch": unified_patch(code, fixed), "fixed_code": fixed},
+    }
+    out = _finalize_content(parsed, code, language, purpose, user_profile, report, usage, count_recovery=False)
+    out["incremental"] = {"previousSubmissionId": prev["submissionId"], "regions": [list(r) for r in plan.regions],
+                          "reanalyzed_lines": plan.reanalyzed_lines, "carried_issues": len(carried)}
+    out["token_usage"] = usage.as_dict()
+    event("path", "incremental")
+    INCREMENTAL_STATS.add(runs=1, total_lines=total, reanalyzed_lines=plan.reanalyzed_lines, carried_issues=len(carried))
+    return out, all(r is not None for r in results)
+
+# ---- 유사 제출본 재사용 (다른 사용자의 같은 풀이) ----
+def _neardup_scope(lang: str, purpose: Optional[str], user_profile: Optional[Dict[str, Any]]) -> str:
+    # 코드만 빼고 content_key와 같은 입력: 이 값이 같은 결과끼리만 비교한다
+    return make_key("", lang, purpose, user_profile, _model(), _result_version())
+
+def _near_duplicate(
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    report: Dict[str, Any],
+) -> Tuple[Optional[Dict[str, Any]], str]:
+    # (재사용한 결과, 프롬프트 힌트). 식별자 이름만 다른 제출본이면 그 결과를 옮겨 오고,
+    # 비슷하기만 하면 그 결과의 이슈 목록을 힌트로 돌려준다. 둘 다 아니면 (None, "")
+    if not NEARDUP.enabled:
+        return None, ""
+    lang = report["metrics"]["language"]
+    with stage("neardup"):
+        match = NEARDUP.lookup(_neardup_scope(lang, purpose, user_profile), code, lang)
+        if match is None:
+            return None, ""
+        prev = match.content
+        moved = None
+        if match.identical:
+            prev_fixed = _undecorate(str((prev.get("fix") or {}).get("fixed_code") or ""),
+                                     lang, prev.get("final_purpose"), user_profile)
+            moved = transfer(match.code, prev, prev_fixed, code, lang)
+            if moved is None:
+                NEARDUP.note("transfer_failed")
+    if moved is None:
+        NEARDUP.note("hinted")
+        event("neardup", "hint")
+        findings = "\n".join(f"- {it.get('severity', 'info')}: {str(it.get('message', ''))[:200]}"
+                              for it in (prev.get("issues") or [])[:8] if isinstance(it, dict)) or "- (no issues)"
+        return None, NEARDUP_PROMPT_NOTE.format(similarity=int(match.similarity * 100), findings=findings)
+    parsed, renamed = moved
+    out = _finalize_content(parsed, code, language, purpose, user_profile, report, count_recovery=False)
+    out["near_duplicate"] = {"similarity": round(match.similarity, 4), "renamed_identifiers": renamed,
+                             "reused_issues": len(parsed["issues"])}
+    NEARDUP.note("reused")
+    event("path", "near_duplicate")
+    return out, ""
+
+def _index_near_duplicate(
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    content: Dict[str, Any],
+) -> None:
+    # 모델이 직접 분석한 결과만 색인 (로컬/대체 응답, 옮겨 온 결과는 제외)
+    if not NEARDUP.enabled or content.get("source") != "openai" or content.get("degraded") \
+            or "near_duplicate" in content:
+        return
+    lang = (content.get("metrics") or {}).get("language") or _guess_language(language, code)
+    try:
+        NEARDUP.add(_neardup_scope(lang, purpose, user_profile), code, lang, content)
+    except Exception as e:
+        log_event("neardup_index_failed", level="warning", error=repr(e))
+
+def _local_content(
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    report: Dict[str, Any],
+) -> Dict[str, Any]:
+    # LLM 호출 없이 로컬 엔진 결과만으로 응답 (fixed_code는 원본 유지)
+    n = len(report["issues"])
+    parsed = {"summary": f"Local analysis: {report['metrics']['loc']} lines, {n} issue(s). AI review skipped for this submission.",
+              "issues": [], "fix": {"strategy": "none", "patch": "", "fixed_code": code}}
+    out = _finalize_content(parsed, code, language, purpose, user_profile, report, count_recovery=False)
+    out["source"] = "local"; out["model"] = "local"
+    return out
+
+def _fallback_content(
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    report: Dict[str, Any],
+) -> Dict[str, Any]:
+    # 상류(LLM)가 실패했거나 서킷이 열려 있을 때의 대체 응답 (BREAKER_FALLBACK: local | mock). 캐시하지 않는다
+    event("fallback", BREAKER_FALLBACK)
+    if BREAKER_FALLBACK == "mock":
+        m = mock_ai.analyze(code, language)
+        parsed = {"summary": m.get("summary", ""), "issues": m.get("issues") or [],
+                  "fix": {"strategy": "none", "patch": "", "fixed_code": code}}
+        out = _finalize_content(parsed, code, language, purpose, user_profile, report, count_recovery=False)
+        out["source"] = "mock"; out["model"] = "mock"
+    else:
+        out = _local_content(code, language, purpose, user_profile, report)
+    out["degraded"] = True
+    return out
+
+def _finalize_content(
+    parsed: Dict[str, Any],
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    report: Optional[Dict[str, Any]] = None,
+    usage: Optional[TokenUsage] = None,
+    count_recovery: bool = True,
+) -> Dict[str, Any]:
+    # 모델 응답 정규화 + fixed_code 복구 + 목적별 장식
+    with stage("coerce"):
+        out = _coerce_defaults(parsed, language, code, report)
+
+    lang = out.get("metrics", {}).get("language") or _guess_language(language, code)
+    with stage("recovery"):
+        fixed, tier = recover_fixed(code, out["fix"], out.get("issues") or [],
+                                    retry=lambda text, regions: _retry_regions(text, regions, usage),
+                                    record=count_recovery)
+    out["fix"]["fixed_code"] = fixed
+    with stage("diff"):
+        # fix.patch는 항상 복구된 fixed_code 기준으로 다시 만든다 (모델 diff가 깨졌거나 없어도 일관되게)
+        diff = line_diff(code, fixed)
+        out["fix"]["patch"] = diff.patch
+        issue_hunks(diff, out.get("issues") or [], overwrite=REWRITE_ONLY)
+    if tier in ("diff", "diff_fuzzy", "snippets", "region_retry", "partial") and \
+            out["fix"].get("strategy") in ("none", "", None):
+        out["fix"]["strategy"] = "patch"
+    elif tier in ("no_change", "unrecovered") and out["fix"].get("strategy") in ("", None):
+        out["fix"]["strategy"] = "none"
 
     inferred = _infer_purpose_from_code_and_issues(code, out.get("issues", []))
     out["inferred_purpose"] = inferred
     final_purpose = purpose if purpose and purpose != "auto" else inferred
     out["final_purpose"] = final_purpose or "general_refactor"
 
-    lang = out.get("metrics", {}).get("language") or _guess_language(language, code)
-    out["fix"]["fixed_code"] = _decorate_for_purpose(out["fix"]["fixed_code"], lang, out["final_purpose"], user_profile)
+    with stage("decorate"):
+        out["fix"]["fixed_code"] = _decorate_for_purpose(out["fix"]["fixed_code"], lang, out["final_purpose"], user_profile)
+
+    out["source"] = "openai"; out["model"] = _model()
 
-    out["source"] = "openai"; out["model"] = OPENAI_MODEL
-    if submissionId is not None: out["submissionId"] = submissionId
-    if userId is not None: out["userId"] = userId
-    if purpose: out["purpose"] = purpose
-    if user_profile: out["user_profile_used"] = True
-    
     try:
         fx = out.get("fix", {}) or {}
         out["fixed_code"] = fx.get("fixed_code", "") or ""
@@ -449,4 +818,480 @@ def analyze(
     except Exception:
         pass
 
-    return out
\ No newline at end of file
+    return out
+
+def _attach_request_fields(
+    out: Dict[str, Any],
+    submissionId: Optional[str],
+    userId: Optional[str],
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    if submissionId is not None: out["submissionId"] = submissionId
+    if userId is not None: out["userId"] = userId
+    if purpose: out["purpose"] = purpose
+    if user_profile: out["user_profile_used"] = True
+    if getattr(user_profile, "version", None) is not None: out["profileVersion"] = user_profile.version
+    return out
+
+_REQUEST_FIELDS = ("submissionId", "userId", "purpose", "user_profile_used", "profileVersion")
+
+def share_result(
+    content: Dict[str, Any],
+    code: str,
+    language: str = "auto",
+    submissionId: Optional[str] = None,
+    userId: Optional[str] = None,
+    purpose: Optional[str] = None,
+    user_profile: Optional[Dict[str, Any]] = None,
+    fileKey: Optional[str] = None,
+    **kwargs: Any,
+) -> Dict[str, Any]:
+    # 같은 입력(content_key)의 다른 요청이 받은 결과를 이 요청 몫으로 (배치 중복 제거):
+    # 요청별 필드를 바꾸고, 이 제출본도 증분 재분석 기준으로 기록한다
+    out = copy.deepcopy(content)
+    for f in _REQUEST_FIELDS:
+        out.pop(f, None)
+    _record_submission(out, code, language, purpose, user_profile, submissionId, userId, fileKey)
+    return _attach_request_fields(out, submissionId, userId, purpose, user_profile)
+
+def content_key(code: str, language: str = "auto", purpose: Optional[str] = None,
+                user_profile: Optional[Dict[str, Any]] = None, model: Optional[str] = None) -> str:
+    # 분석 결과를 결정하는 입력만으로 만든 키 (캐시/병합/배치 중복 제거 공용)
+    return make_key(code, _guess_language(language, code), purpose, user_profile,
+                    model or _model(), _result_version())
+
+def is_cached(code: str, language: str = "auto", purpose: Optional[str] = None,
+              user_profile: Optional[Dict[str, Any]] = None, model: Optional[str] = None) -> bool:
+    return RESULT_CACHE.contains(content_key(code, language, purpose, user_profile, model))
+
+def estimate_tokens(code: str, model: Optional[str] = None) -> int:
+    # 스케줄러가 사용자 토큰 버킷에서 뺄 예상치: 시스템 프롬프트 + 코드 + 출력 예산 (압축 전 기준)
+    with _using_model(model):
+        n = count_tokens(code, _model())
+    return _system_tokens() + n + output_budget(n, MAX_TOKENS)
+
+def cache_stats() -> Dict[str, Any]:
+    return RESULT_CACHE.stats()
+
+def inflight_stats() -> Dict[str, Any]:
+    return INFLIGHT.stats()
+
+def token_stats() -> Dict[str, Any]:
+    return TOKEN_STATS.stats()
+
+def transport_stats() -> Dict[str, Any]:
+    return TRANSPORT.stats()
+
+def response_stats() -> Dict[str, Any]:
+    return RESPONSE_STATS.stats()
+
+def rules_stats() -> Dict[str, Any]:
+    return RULES.stats()
+
+def neardup_stats() -> Dict[str, Any]:
+    return NEARDUP.stats()
+
+def recovery_stats() -> Dict[str, Any]:
+    return RECOVERY_STATS.stats()
+
+def diff_stats() -> Dict[str, Any]:
+    return {**DIFF_CACHE.stats(), "rewrite_only": REWRITE_ONLY}
+
+def incremental_stats() -> Dict[str, Any]:
+    return INCREMENTAL_STATS.stats()
+
+# ---- 콜드 스타트 준비 (warmup.py에서 워커마다 한 번) ----
+# 첫 요청이 치르던 비용을 미리: SDK import/클라이언트 생성, 토크나이저 로드, 로컬 분석/diff 경로의 첫 실행,
+# 제출본 저장소 연결, 상류 keep-alive 커넥션. 통계에 잡히지 않는 함수만 부른다
+_WARM_SAMPLES = (
+    ("python", "def total(xs):\n    s = 0\n    for x in xs:\n        s += x\n    return s\n"),
+    ("c", "#include <stdio.h>\nint main(void) {\n    int a[4];\n    for (int i = 0; i <= 4; i++) a[i] = i;\n"
+          "    printf(\"%d\\n\", a[0]);\n    return 0;\n}\n"),
+)
+
+def _preconnect_target() -> Tuple[str, Dict[str, str]]:
+    # 커넥션만 열면 되므로 가벼운 GET /models (응답 코드는 보지 않는다: 401/404여도 커넥션은 풀에 남는다)
+    c = _client()
+    return f"{c.base_url}models", {"Authorization": f"Bearer {c.api_key}"}
+
+def _preconnect(n: int) -> int:
+    # keep-alive 풀에 커넥션을 n개까지 동시에 열어 둔다 (DNS/TCP/TLS를 첫 요청이 치르지 않도록). 연 개수
+    if n <= 0:
+        return 0
+    url, headers = _preconnect_target()
+
+    def _one(_: int) -> bool:
+        try:
+            _HTTP.get(url, headers=headers, timeout=OPENAI_CONNECT_TIMEOUT * 2)
+            return True
+        except Exception as e:
+            log_event("upstream_preconnect_failed", level="warning", error=repr(e))
+            return False
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="preconnect") as ex:
+        return sum(ex.map(_one, range(n)))
+
+def _warm_sdk_models() -> None:
+    # SDK 응답 모델(pydantic)의 스키마는 처음 응답을 파싱할 때 만들어진다 (첫 요청에서 수십 ms)
+    from openai.types.chat import ChatCompletion, ChatCompletionChunk
+    usage = {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+    ChatCompletion.model_validate({
+        "id": "warmup", "object": "chat.completion", "created": 0, "model": OPENAI_MODEL, "usage": usage,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "{}"}}]})
+    ChatCompletionChunk.model_validate({
+        "id": "warmup", "object": "chat.completion.chunk", "created": 0, "model": OPENAI_MODEL, "usage": usage,
+        "choices": [{"index": 0, "finish_reason": None, "delta": {"content": "{}"}}]})
+
+def warm(connections: int = 0) -> Dict[str, Any]:
+    _client().chat.completions   # SDK는 리소스 모듈도 처음 접근할 때 import한다
+    _warm_sdk_models()
+    count_tokens(SYSTEM_PROMPT, _model())
+    for lang, code in _WARM_SAMPLES:
+        _prepare_prompt(code, lang, None, None)
+        analyze_local(code, lang)
+        LineDiff(code.splitlines(), code.replace("    ", "  ").splitlines())
+    if INCREMENTAL_ENABLED:
+        _submissions()
+    return {"connections": _preconnect(connections), "tokenizer": TOKEN_STATS.stats()["tokenizer"]}
+
+async def awarm(connections: int = 0) -> Dict[str, Any]:
+    # ASGI 모드: 비동기 클라이언트의 커넥션 풀도 따로 열어 둔다
+    _async_client().chat.completions
+    if connections <= 0:
+        return {"connections": 0}
+    url, headers = _preconnect_target()
+
+    async def _one() -> bool:
+        try:
+            await _ASYNC_HTTP.get(url, headers=headers, timeout=OPENAI_CONNECT_TIMEOUT * 2)
+            return True
+        except Exception as e:
+            log_event("upstream_preconnect_failed", level="warning", error=repr(e))
+            return False
+    return {"connections": sum(await asyncio.gather(*(_one() for _ in range(connections))))}
+
+def analyze(
+    code: str,
+    language: str = "auto",
+    submissionId: Optional[str] = None,
+    userId: Optional[str] = None,
+    purpose: Optional[str] = None,
+    user_profile: Optional[Dict[str, Any]] = None,
+    previousSubmissionId: Optional[str] = None,
+    fileKey: Optional[str] = None,
+    model: Optional[str] = None,
+    cancel: Optional[threading.Event] = None,
+    **kwargs: Any,
+) -> Dict[str, Any]:
+    # model: 이 호출에 쓸 모델 (없으면 OPENAI_MODEL). cancel: 켜지면 진행 중인 상류 호출을 끊고 Cancelled
+    # (헤지 경쟁에서 진 쪽). 취소돼도 캐시/병합/유사 제출본 경로는 취소 없는 호출과 같다
+    if not code or not code.strip():
+        raise ValueError("code is required")
+    with _using_model(model), cancel_scope(cancel or cancel_event()):
+        return _analyze(code, language, submissionId, userId, purpose, user_profile, previousSubmissionId, fileKey)
+
+def _analyze(
+    code: str,
+    language: str,
+    submissionId: Optional[str],
+    userId: Optional[str],
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    previousSubmissionId: Optional[str],
+    fileKey: Optional[str],
+) -> Dict[str, Any]:
+    key = content_key(code, language, purpose, user_profile)
+    out = RESULT_CACHE.get(key)
+    event("cache", "miss" if out is None else "hit")
+    if out is None:
+        def _run() -> Dict[str, Any]:
+            prev = _previous_submission(code, language, purpose, user_profile, submissionId, userId,
+                                        fileKey, previousSubmissionId)
+            res = _analyze_incremental(code, language, purpose, user_profile, prev) if prev else None
+            content, cacheable = res or _analyze_content(code, language, purpose, user_profile)
+            # 취소된 호출의 결과(중간에 끊긴 복구 등)는 캐시하거나 병합된 호출에 나눠 주지 않는다
+            check_cancel()
+            if cacheable:
+                RESULT_CACHE.set(key, content)
+                _index_near_duplicate(code, language, purpose, user_profile, content)
+            return content
+        shared_out, _ = INFLIGHT.do(key, _run, recheck=lambda: RESULT_CACHE.get(key, count=False))
+        # 병합된 호출들이 같은 dict를 받으므로 요청 필드를 붙이기 전에 복사
+        out = copy.deepcopy(shared_out)
+    _record_submission(out, code, language, purpose, user_profile, submissionId, userId, fileKey)
+    return _attach_request_fields(out, submissionId, userId, purpose, user_profile)
+
+# ---- 비동기 분석 (ASGI 모드) ----
+# 상류 호출만 코루틴으로 기다리고, CPU 작업(로컬 분석/후처리)과 조각·증분 경로는 스레드로 넘긴다.
+# 같은 키의 동시 요청은 이벤트 루프 안에서 하나의 태스크로 합친다 (INFLIGHT의 코루틴판).
+_ASYNC_INFLIGHT: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+_ASYNC_WAITERS: Dict[str, int] = {}
+
+async def _coalesced_async(
+    key: str,
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    submissionId: Optional[str],
+    userId: Optional[str],
+    fileKey: Optional[str],
+    previousSubmissionId: Optional[str],
+) -> Dict[str, Any]:
+    # 같은 키의 태스크가 있으면 기다리고, 없으면 만든다. 반환값은 병합된 호출들이 같이 받는 dict.
+    # 끝난 태스크의 키/대기자 수는 done 콜백이 지우므로 취소될 때만 대기자 수를 줄인다
+    while True:
+        task = _ASYNC_INFLIGHT.get(key)
+        if task is None:
+            async def _run() -> Dict[str, Any]:
+                prev = await asyncio.to_thread(_previous_submission, code, language, purpose, user_profile,
+                                               submissionId, userId, fileKey, previousSubmissionId)
+                res = await asyncio.to_thread(_analyze_incremental, code, language, purpose, user_profile, prev) \
+                    if prev else None
+                content, cacheable = res or await _analyze_content_async(code, language, purpose, user_profile)
+                if cacheable:
+                    RESULT_CACHE.set(key, content)
+                    await asyncio.to_thread(_index_near_duplicate, code, language, purpose, user_profile, content)
+                return content
+            INFLIGHT.note(True)
+            task = asyncio.ensure_future(_run())
+            _ASYNC_INFLIGHT[key] = task
+            task.add_done_callback(lambda _t: (_ASYNC_INFLIGHT.pop(key, None), _ASYNC_WAITERS.pop(key, None)))
+            leader = True
+        else:
+            INFLIGHT.note(False)
+            leader = False
+        _ASYNC_WAITERS[key] = _ASYNC_WAITERS.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # 기다리던 요청이 모두 취소됐을 때만 상류 호출까지 취소한다
+            _ASYNC_WAITERS[key] = _ASYNC_WAITERS.get(key, 1) - 1
+            if _ASYNC_WAITERS[key] <= 0 and not task.done():
+                task.cancel()
+            raise
+        except Exception as e:
+            if leader:
+                raise
+            # 태스크를 만든 요청의 마감으로 끝났으면 다시 시도, 그 밖의 실패는 새 예외로 (singleflight와 같은 규칙)
+            if not leader_interrupted(e):
+                raise follower_error(e) from e
+            check_deadline()
+
+async def _analyze_content_async(
+    code: str,
+    language: str,
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+) -> Tuple[Dict[str, Any], bool]:
+    # _analyze_content와 같은 경로 선택. LLM 한 번으로 끝나는 full 경로만 스레드 없이 기다린다
+    with stage("local"):
+        report = await asyncio.to_thread(analyze_local, code, _guess_language(language, code))
+    if fast_path_ok(report):
+        event("path", "fast")
+        return _local_content(code, language, purpose, user_profile, report), True
+    near, hint = await asyncio.to_thread(_near_duplicate, code, language, purpose, user_profile, report)
+    if near is not None:
+        return near, True
+    if should_chunk(code, report):
+        chunks = split_chunks(code, report["functions"])
+        if len(chunks) > 1:
+            event("path", "chunked")
+            return await asyncio.to_thread(_analyze_chunked, code, language, purpose, user_profile, report, chunks)
+    event("path", "full")
+    usage = TokenUsage()
+    try:
+        with stage("prompt"):
+            prompt = _prepare_prompt(code, language, purpose, user_profile, usage, hint)
+        parsed = await _achat_json(SYSTEM_PROMPT, prompt.text, prompt.max_tokens, usage, prompt.estimated,
+                                   structured=True)
+        parsed = _restore_compacted(parsed, code, prompt)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log_event("upstream_fallback", level="warning", error=repr(e))
+        return _fallback_content(code, language, purpose, user_profile, report), False
+    # 복구 단계의 영역 재요청은 동기 호출이므로 후처리 전체를 스레드에서
+    out = await asyncio.to_thread(_finalize_content, parsed, code, language, purpose, user_profile, report, usage)
+    out["token_usage"] = usage.as_dict()
+    return out, True
+
+async def analyze_async(
+    code: str,
+    language: str = "auto",
+    submissionId: Optional[str] = None,
+    userId: Optional[str] = None,
+    purpose: Optional[str] = None,
+    user_profile: Optional[Dict[str, Any]] = None,
+    previousSubmissionId: Optional[str] = None,
+    fileKey: Optional[str] = None,
+    model: Optional[str] = None,
+    **kwargs: Any,
+) -> Dict[str, Any]:
+    # analyze()와 같은 결과 계약 (캐시/병합/증분 저장 공유). 취소는 태스크 취소로
+    if not code or not code.strip():
+        raise ValueError("code is required")
+    with _using_model(model):
+        return await _analyze_async(code, language, submissionId, userId, purpose, user_profile,
+                                    previousSubmissionId, fileKey)
+
+async def _analyze_async(
+    code: str,
+    language: str,
+    submissionId: Optional[str],
+    userId: Optional[str],
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    previousSubmissionId: Optional[str],
+    fileKey: Optional[str],
+) -> Dict[str, Any]:
+    key = content_key(code, language, purpose, user_profile)
+    out = RESULT_CACHE.get(key)
+    event("cache", "miss" if out is None else "hit")
+    if out is None:
+        out = copy.deepcopy(await _coalesced_async(key, code, language, purpose, user_profile,
+                                                   submissionId, userId, fileKey, previousSubmissionId))
+    await asyncio.to_thread(_record_submission, out, code, language, purpose, user_profile,
+                            submissionId, userId, fileKey)
+    return _attach_request_fields(out, submissionId, userId, purpose, user_profile)
+
+# ---- 스트리밍 분석 (/analyze/stream) ----
+# summary -> issue(여러 번) -> fix 순으로 모델이 생성하는 즉시 내보내고,
+# 마지막에 _finalize_content 까지 거친 최종 결과를 result 이벤트로 보낸다.
+def _fix_event(f: Dict[str, Any]) -> Dict[str, Any]:
+    return {"strategy": str(f.get("strategy", "none")), "patch": str(f.get("patch", "")),
+            "fixed_code": str(f.get("fixed_code", ""))}
+
+def _replay_events(out: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    # 이미 완성된 결과(캐시 적중/로컬 fast path)를 같은 이벤트 순서로 재생
+    yield "summary", {"summary": out.get("summary", "")}
+    for n, it in enumerate(out.get("issues") or []):
+        yield "issue", {"index": n, **it}
+    yield "fix", _fix_event(out.get("fix") or {})
+
+def analyze_stream(
+    code: str,
+    language: str = "auto",
+    submissionId: Optional[str] = None,
+    userId: Optional[str] = None,
+    purpose: Optional[str] = None,
+    user_profile: Optional[Dict[str, Any]] = None,
+    previousSubmissionId: Optional[str] = None,
+    fileKey: Optional[str] = None,
+    model: Optional[str] = None,
+    **kwargs: Any,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    if not code or not code.strip():
+        raise ValueError("code is required")
+    events = _analyze_stream(code, language, submissionId, userId, purpose, user_profile, previousSubmissionId, fileKey)
+    if not model:
+        yield from events
+        return
+    # 제너레이터는 부른 쪽 컨텍스트에서 돌므로, 모델을 바꾼 복사본 컨텍스트 안에서 한 단계씩 진행한다
+    ctx = contextvars.copy_context()
+    ctx.run(_MODEL.set, model)
+    try:
+        while True:
+            try:
+                item = ctx.run(next, events)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        ctx.run(events.close)
+
+def _analyze_stream(
+    code: str,
+    language: str,
+    submissionId: Optional[str],
+    userId: Optional[str],
+    purpose: Optional[str],
+    user_profile: Optional[Dict[str, Any]],
+    previousSubmissionId: Optional[str],
+    fileKey: Optional[str],
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    key = content_key(code, language, purpose, user_profile)
+    cached = RESULT_CACHE.get(key)
+    event("cache", "miss" if cached is None else "hit")
+    if cached is not None:
+        _record_submission(cached, code, language, purpose, user_profile, submissionId, userId, fileKey)
+        yield from _replay_events(cached)
+        yield "result", _attach_request_fields(cached, submissionId, userId, purpose, user_profile)
+        return
+
+    prev = _previous_submission(code, language, purpose, user_profile, submissionId, userId,
+                                fileKey, previousSubmissionId)
+    res = _analyze_incremental(code, language, purpose, user_profile, prev) if prev else None
+    if res is not None:
+        # 바뀐 구간만 조각 분석하므로 결과를 같은 이벤트 순서로 재생
+        out, cacheable = res
+        if cacheable:
+            RESULT_CACHE.set(key, out)
+        _record_submission(out, code, language, purpose, user_profile, submissionId, userId, fileKey)
+        yield from _replay_events(out)
+        yield "result", _attach_request_fields(out, submissionId, userId, purpose, user_profile)
+        return
+
+    with stage("local"):
+        report = analyze_local(code, _guess_language(language, code))
+    if fast_path_ok(report):
+        event("path", "fast")
+        out = _local_content(code, language, purpose, user_profile, report)
+        RESULT_CACHE.set(key, out)
+        _record_submission(out, code, language, purpose, user_profile, submissionId, userId, fileKey)
+        yield from _replay_events(out)
+        yield "result", _attach_request_fields(out, submissionId, userId, purpose, user_profile)
+        return
+
+    if should_chunk(code, report):
+        chunks = split_chunks(code, report["functions"])
+        if len(chunks) > 1:
+            # 조각 분석은 스트리밍 대신 동시 호출로 처리하고, 합친 결과를 같은 이벤트 순서로 재생
+            event("path", "chunked")
+            out, cacheable = _analyze_chunked(code, language, purpose, user_profile, report, chunks)
+            if cacheable:
+                RESULT_CACHE.set(key, out)
+            _record_submission(out, code, language, purpose, user_profile, submissionId, userId, fileKey)
+            yield from _replay_events(out)
+            yield "result", _attach_request_fields(out, submissionId, userId, purpose, user_profile)
+            return
+
+    scanner = StreamingJSONScanner()
+    parts: List[str] = []
+    n_issues = 0
+    event("path", "full")
+    usage = TokenUsage()
+    try:
+        with stage("prompt"):
+            prompt = _prepare_prompt(code, language, purpose, user_profile, usage)
+        for delta in _chat_json_stream(SYSTEM_PROMPT, prompt.text, prompt.max_tokens, usage, prompt.estimated,
+                                       structured=True):
+            parts.append(delta)
+            for kind, field, value in scanner.feed(delta):
+                if kind == "field" and field == "summary":
+                    yield "summary", {"summary": str(value)}
+                elif kind == "item" and field == "issues":
+                    it = _coerce_issue(value)
+                    if it is not None:
+                        it["line"] = restore_line(it["line"], prompt.line_map)
+                        yield "issue", {"index": n_issues, **it}
+                        n_issues += 1
+                elif kind == "field" and field == "fix" and isinstance(value, dict):
+                    fx = _restore_compacted({"fix": value}, code, prompt)["fix"]
+                    if str(fx.get("fixed_code") or "").strip():
+                        fx = {**fx, "patch": unified_patch(code, str(fx["fixed_code"]))}
+                    yield "fix", _fix_event(fx)
+        parsed = _restore_compacted(_parse_json("".join(parts), True), code, prompt)
+    except Cancelled:
+        raise
+    except Exception as e:
+        log_event("analyze_stream_failed", level="error", error=repr(e))
+        out = _fallback_content(code, language, purpose, user_profile, report)
+        yield "result", _attach_request_fields(out, submissionId, userId, purpose, user_profile)
+        return
+
+    out = _finalize_content(parsed, code, language, purpose, user_profile, report, usage)
+    out["token_usage"] = usage.as_dict()
+    RESULT_CACHE.set(key, out)
+    _record_submission(out, code, language, purpose, user_profile, submissionId, userId, fileKey)
+    yield "result", _attach_request_fields(out, submissionId, userId, purpose, user_profile)
@@ -0,0 +1,180 @@
+from __future__ import annotations
+import os, json, time, sqlite3, tempfile, threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .cache import profile_fingerprint
+from .prompt_budget import profile_prompt_text
+from .response import dumps_str, loads
+
+# ---- 사용자 프로필 저장소 (/profiles/<userId>) ----
+# 백엔드가 /analyze마다 user_profile 전체를 싣는 대신, 프로필을 한 번 올려 두고 요청에는 profileVersion만 보낸다.
+# 버전은 쓸 때마다 1씩 늘고 이전 버전도 PROFILES_KEEP_VERSIONS개까지 남겨 둔다 (진행 중 요청이 옛 버전을 가리켜도 됨).
+# 한 번 만들어진 (userId, version)은 바뀌지 않으므로 메모리 LRU에 그대로 둔다.
+# 프롬프트 조각/캐시 키 지문/fixed_code 머리 주석 문구는 프로필마다 한 번만 계산해 Profile에 붙여 둔다.
+PROFILES_DB_PATH       = os.getenv("PROFILES_DB") or os.path.join(tempfile.gettempdir(), "codewise-profiles.db")
+PROFILES_CACHE_ITEMS   = int(os.getenv("PROFILES_CACHE_ITEMS", "4096"))
+PROFILES_KEEP_VERSIONS = int(os.getenv("PROFILES_KEEP_VERSIONS", "5"))
+PROFILES_MAX_BYTES     = int(os.getenv("PROFILES_MAX_BYTES", str(64 * 1024)))
+
+HEADER_PROFILE_CHARS = 300   # _decorate_for_purpose 머리 주석에 넣는 프로필 길이
+
+def header_text(user_profile: Optional[Dict[str, Any]]) -> str:
+    # fixed_code 머리 주석의 "User Profile Hint" 문구
+    if not isinstance(user_profile, dict) or not user_profile:
+        return ""
+    cached = getattr(user_profile, "header_text", None)
+    if cached is not None:
+        return cached
+    try: return json.dumps(user_profile, ensure_ascii=False)[:HEADER_PROFILE_CHARS]
+    except Exception: return ""
+
+class Profile(dict):
+    # 파생 값을 미리 계산해 둔 프로필. dict 그대로 넘겨도 되고, 파생 값이 필요한 곳은 속성을 먼저 본다
+    __slots__ = ("user_id", "version", "fingerprint", "prompt_text", "header_text")
+
+    def __init__(self, data: Dict[str, Any], user_id: Optional[str] = None, version: Optional[int] = None):
+        super().__init__(data)
+        self.user_id = user_id
+        self.version = version
+        self.fingerprint = None
+        self.prompt_text = None
+        self.header_text = None
+        # 위에서 None으로 두어야 아래 함수들이 캐시가 아닌 원본으로 계산한다
+        self.fingerprint = profile_fingerprint(self)
+        self.prompt_text = profile_prompt_text(self)
+        self.header_text = header_text(self)
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    # JSON Merge Patch (RFC 7386): 객체는 재귀 병합, null은 삭제, 나머지는 교체
+    if not isinstance(patch, dict):
+        return patch
+    out = dict(target) if isinstance(target, dict) else {}
+    for k, v in patch.items():
+        if v is None:
+            out.pop(k, None)
+        else:
+            out[k] = merge_patch(out.get(k), v)
+    return out
+
+class ProfileConflict(Exception):
+    # If-Match로 준 버전이 현재 버전과 다름
+    def __init__(self, current: int):
+        super().__init__(f"profile version is {current}")
+        self.current = current
+
+class ProfileTooLarge(Exception):
+    pass
+
+class ProfileStore:
+    def __init__(self, path: str, cache_items: int = PROFILES_CACHE_ITEMS, keep_versions: int = PROFILES_KEEP_VERSIONS):
+        self.path = path
+        self.cache_items = cache_items
+        self.keep_versions = max(1, keep_versions)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[Tuple[str, int], Profile]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "not_found": 0, "writes": 0, "conflicts": 0}
+        d = os.path.dirname(os.path.abspath(path))
+        if d: os.makedirs(d, exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            "user_id TEXT NOT NULL, version INTEGER NOT NULL, created_at REAL NOT NULL, data TEXT NOT NULL, "
+            "PRIMARY KEY (user_id, version))")
+
+    @classmethod
+    def from_env(cls) -> "ProfileStore":
+        return cls(PROFILES_DB_PATH)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, p: Profile) -> Profile:
+        with self._lock:
+            self._lru[(p.user_id, p.version)] = p
+            self._lru.move_to_end((p.user_id, p.version))
+            while len(self._lru) > self.cache_items:
+                self._lru.popitem(last=False)
+        return p
+
+    def _latest_version(self, c: sqlite3.Connection, user_id: str) -> int:
+        row = c.execute("SELECT MAX(version) FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        return int(row[0] or 0)
+
+    def get(self, user_id: str, version: Optional[int] = None) -> Optional[Profile]:
+        # version=None이면 최신 버전 (다른 워커가 새로 썼을 수 있으므로 번호는 매번 DB에서 확인)
+        user_id = str(user_id)
+        c = self._conn()
+        if version is None:
+            version = self._latest_version(c, user_id)
+            if not version:
+                with self._lock: self._stats["not_found"] += 1
+                return None
+        key = (user_id, int(version))
+        with self._lock:
+            p = self._lru.get(key)
+            if p is not None:
+                self._lru.move_to_end(key)
+                self._stats["hits"] += 1
+                return p
+        row = c.execute("SELECT data FROM profiles WHERE user_id = ? AND version = ?", key).fetchone()
+        with self._lock:
+            self._stats["misses" if row else "not_found"] += 1
+        if not row:
+            return None
+        return self._remember(Profile(loads(row[0]), user_id, key[1]))
+
+    def _write(self, user_id: str, build: Any, if_version: Optional[int]) -> Profile:
+        # build(현재 프로필 dict 또는 None) -> 새 프로필 dict. 버전 확인부터 저장까지 한 트랜잭션
+        user_id = str(user_id)
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            current = self._latest_version(c, user_id)
+            if if_version is not None and int(if_version) != current:
+                raise ProfileConflict(current)
+            prev = None
+            if current:
+                row = c.execute("SELECT data FROM profiles WHERE user_id = ? AND version = ?",
+                                (user_id, current)).fetchone()
+                prev = loads(row[0]) if row else None
+            data = build(prev)
+            if not isinstance(data, dict):
+                raise ValueError("profile must be a JSON object")
+            raw = dumps_str(data)
+            if len(raw.encode("utf-8")) > PROFILES_MAX_BYTES:
+                raise ProfileTooLarge(f"profile exceeds {PROFILES_MAX_BYTES} bytes")
+            version = current + 1
+            c.execute("INSERT INTO profiles (user_id, version, created_at, data) VALUES (?, ?, ?, ?)",
+                      (user_id, version, time.time(), raw))
+            c.execute("DELETE FROM profiles WHERE user_id = ? AND version <= ?", (user_id, version - self.keep_versions))
+            c.execute("COMMIT")
+        except ProfileConflict:
+            c.execute("ROLLBACK")
+            with self._lock: self._stats["conflicts"] += 1
+            raise
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self._stats["writes"] += 1
+            for v in range(max(1, version - self.keep_versions - 1), version - self.keep_versions + 1):
+                self._lru.pop((user_id, v), None)   # DB에서 지운 버전은 메모리에서도
+        return self._remember(Profile(data, user_id, version))
+
+    def put(self, user_id: str, data: Dict[str, Any], if_version: Optional[int] = None) -> Profile:
+        return self._write(user_id, lambda _prev: data, if_version)
+
+    def patch(self, user_id: str, changes: Dict[str, Any], if_version: Optional[int] = None) -> Profile:
+        return self._write(user_id, lambda prev: merge_patch(prev or {}, changes), if_version)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["cached"] = len(self._lru)
+        return out
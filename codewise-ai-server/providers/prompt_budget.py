@@ -0,0 +1,191 @@
+from __future__ import annotations
+import os, re, json, math, threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from .lexer import HASH_COMMENT_LANGS, comment_only_lines
+
+# ---- 토큰 예산 / 프롬프트 압축 ----
+# LLM 호출 전에 입력을 로컬에서 세고 줄인 뒤, 입력 크기에 맞춰 max_tokens를 정한다.
+# 압축으로 줄 번호가 바뀌면 line_map(압축본 줄 -> 원본 줄)으로 되돌린다.
+PROMPT_COMPACT          = os.getenv("PROMPT_COMPACT", "1") == "1"
+PROMPT_STRIP_COMMENTS   = os.getenv("PROMPT_STRIP_COMMENTS", "0") == "1"
+PROMPT_PROFILE_FIELDS   = [f.strip() for f in os.getenv("PROMPT_PROFILE_FIELDS", "topErrors,topLanguages,topPurposes").split(",") if f.strip()]
+PROMPT_PROFILE_TOP      = int(os.getenv("PROMPT_PROFILE_TOP", "3"))
+PROMPT_MIN_OUTPUT_TOKENS = int(os.getenv("PROMPT_MIN_OUTPUT_TOKENS", "512"))
+PROMPT_OUTPUT_RATIO     = float(os.getenv("PROMPT_OUTPUT_RATIO", "1.3"))
+PROMPT_OUTPUT_OVERHEAD  = int(os.getenv("PROMPT_OUTPUT_OVERHEAD", "600"))
+
+# 주석을 지우면 안 되는 목적 (설명용 주석을 보고 다듬어야 함)
+_KEEP_COMMENT_PURPOSES = ("teach_beginner",)
+
+# tiktoken이 없을 때의 근사: 짧은 단어 조각/구두점/줄바꿈을 토큰 하나로 본다 (코드 기준 실측 오차 ±15% 안팎)
+_APPROX_TOKEN = re.compile(r"\w{1,5}|[^\w\s]|\n")
+
+# tiktoken(선택 의존성)은 import와 인코딩 표 로드가 무거워 처음 셀 때 불러온다. None: 아직, False: 없음
+_TIKTOKEN: Any = None
+
+def _tiktoken() -> Any:
+    global _TIKTOKEN
+    if _TIKTOKEN is None:
+        try:
+            import tiktoken
+            _TIKTOKEN = tiktoken
+        except Exception:  # pragma: no cover
+            _TIKTOKEN = False
+    return _TIKTOKEN or None
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    tiktoken = _tiktoken()
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        try: return tiktoken.get_encoding("o200k_base")
+        except Exception: return None
+
+def count_tokens(text: str, model: str = "") -> int:
+    if not text:
+        return 0
+    enc = _encoding(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return len(_APPROX_TOKEN.findall(text))
+
+def compact_code(code: str, lang: str, purpose: Optional[str]) -> Tuple[str, Optional[List[int]]]:
+    # 행말 공백 제거, 연속 빈 줄을 하나로, (설정 시) 주석만 있는 줄 제거.
+    # 줄 구성이 바뀌면 압축본 각 줄의 원본 줄 번호(1부터) 목록을 함께 돌려준다
+    if not PROMPT_COMPACT:
+        return code, None
+    lines = code.split("\n")
+    drop = set()
+    if PROMPT_STRIP_COMMENTS and purpose not in _KEEP_COMMENT_PURPOSES:
+        drop = comment_only_lines(code, lang)
+        if lang in HASH_COMMENT_LANGS:
+            # docstring은 본문 역할을 하기도 하므로 '#' 줄만 지운다
+            drop = {i for i in drop if lines[i].lstrip().startswith("#")}
+    out: List[str] = []
+    line_map: List[int] = []
+    prev_blank = False
+    for i, l in enumerate(lines):
+        if i in drop:
+            continue
+        l = l.rstrip()
+        if not l:
+            if prev_blank:
+                continue
+            prev_blank = True
+        else:
+            prev_blank = False
+        out.append(l)
+        line_map.append(i + 1)
+    if len(out) == len(lines):
+        return "\n".join(out), None
+    return "\n".join(out), line_map
+
+def restore_line(line: int, line_map: Optional[List[int]]) -> int:
+    if not line_map:
+        return line
+    return line_map[min(max(line, 1), len(line_map)) - 1]
+
+def trim_profile(user_profile: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # 프로필 중 프롬프트에 의미 있는 필드만, 목록은 상위 몇 개만 "이름:횟수" 형태로 줄인다
+    if not isinstance(user_profile, dict) or not user_profile:
+        return None
+    out: Dict[str, Any] = {}
+    for field in PROMPT_PROFILE_FIELDS:
+        v = user_profile.get(field)
+        if v in (None, "", [], {}):
+            continue
+        if isinstance(v, list):
+            items = []
+            for it in v[:PROMPT_PROFILE_TOP]:
+                if isinstance(it, dict):
+                    vals = [str(x) for x in it.values() if x not in (None, "")]
+                    items.append(":".join(vals))
+                else:
+                    items.append(str(it))
+            v = items
+        elif isinstance(v, str):
+            v = v[:200]
+        out[field] = v
+    return out or None
+
+def profile_prompt_text(user_profile: Optional[Dict[str, Any]]) -> str:
+    cached = getattr(user_profile, "prompt_text", None)   # profiles.Profile은 미리 계산해 둔다
+    if cached is not None:
+        return cached
+    trimmed = trim_profile(user_profile)
+    if not trimmed:
+        return ""
+    return json.dumps(trimmed, ensure_ascii=False, separators=(",", ":"))
+
+def output_budget(code_tokens: int, cap: int) -> int:
+    # 출력은 대부분 fixed_code(입력 코드와 비슷한 길이) + 이슈 목록이다
+    want = int(math.ceil(code_tokens * PROMPT_OUTPUT_RATIO)) + PROMPT_OUTPUT_OVERHEAD
+    return max(min(PROMPT_MIN_OUTPUT_TOKENS, cap), min(want, cap))
+
+class TokenUsage:
+    # 요청 하나(조각/재요청 포함)에서 쓴 토큰 누계
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_prompt_tokens = 0
+        self.saved_prompt_tokens = 0
+        self.max_tokens = 0
+
+    def add(self, prompt_tokens: Optional[int], completion_tokens: Optional[int],
+            estimated: int = 0, max_tokens: int = 0) -> None:
+        with self._lock:
+            self.calls += 1
+            # 응답에 usage가 없으면(일부 호환 서버) 로컬 추정치로 대신한다
+            self.prompt_tokens += int(prompt_tokens if prompt_tokens is not None else estimated)
+            self.completion_tokens += int(completion_tokens or 0)
+            self.estimated_prompt_tokens += estimated
+            self.max_tokens += max_tokens
+        TOKEN_STATS.add(prompt_tokens if prompt_tokens is not None else estimated, completion_tokens or 0)
+
+    def saved(self, n: int) -> None:
+        with self._lock:
+            self.saved_prompt_tokens += max(0, n)
+        TOKEN_STATS.saved(n)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "prompt_tokens": self.prompt_tokens,
+                    "completion_tokens": self.completion_tokens,
+                    "estimated_prompt_tokens": self.estimated_prompt_tokens,
+                    "saved_prompt_tokens": self.saved_prompt_tokens,
+                    "max_tokens": self.max_tokens}
+
+class _TokenStats:
+    # 프로세스 전체 누계 (/healthz)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.saved_prompt_tokens = 0
+
+    def add(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += int(prompt_tokens or 0)
+            self.completion_tokens += int(completion_tokens or 0)
+
+    def saved(self, n: int) -> None:
+        with self._lock:
+            self.saved_prompt_tokens += max(0, n)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"calls": self.calls, "prompt_tokens": self.prompt_tokens,
+                    "completion_tokens": self.completion_tokens,
+                    "saved_prompt_tokens": self.saved_prompt_tokens,
+                    "tokenizer": "tiktoken" if _TIKTOKEN else ("approx" if _TIKTOKEN is False else "unloaded")}
+
+TOKEN_STATS = _TokenStats()
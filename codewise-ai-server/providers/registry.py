@@ -0,0 +1,480 @@
+from __future__ import annotations
+import os, time, random, asyncio, inspect, importlib, threading, contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .metrics import log_event
+from .transport import Cancelled, DeadlineExceeded, check_deadline
+
+# ---- 분석 제공자 레지스트리 / 라우터 ----
+# ANALYZE_PROVIDERS에 적힌 제공자(쉼표 구분, 앞쪽이 기본 우선순위)를 같은 인터페이스로 감싸고,
+# 제공자별 최근 지연(p50/p95)과 오류율을 보고 가장 빠른 정상 제공자로 보낸다.
+# ROUTER_HEDGE=1이면 첫 제공자가 p95 안에 답하지 않을 때 다음 제공자에 한 번 더 보내고, 먼저 끝난 쪽을 쓰고 나머지는 취소한다.
+#   openai[:model]               providers.openai_ai (모델을 안 적으면 OPENAI_MODEL). 모델마다 별도 제공자/지연 창
+#   mock                         providers.mock_ai
+#   simulated[:ms[:jitter[:err]]] 지연/오류를 흉내 내는 로컬 대역 (테스트/부하 실험용, 결과는 mock_ai)
+ANALYZE_PROVIDERS     = [p.strip() for p in os.getenv("ANALYZE_PROVIDERS", "openai").split(",") if p.strip()]
+ROUTER_WINDOW         = int(os.getenv("ROUTER_WINDOW", "200"))            # 제공자별 최근 표본 수
+ROUTER_WINDOW_SEC     = float(os.getenv("ROUTER_WINDOW_SEC", "300"))      # 이보다 오래된 표본은 버린다
+ROUTER_MIN_SAMPLES    = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))         # 이보다 적으면 순위 대신 탐색
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+ROUTER_HEDGE          = os.getenv("ROUTER_HEDGE", "0") == "1"
+ROUTER_HEDGE_MIN_MS   = float(os.getenv("ROUTER_HEDGE_MIN_MS", "1000"))   # p95를 모를 때/너무 짧을 때의 하한
+ROUTER_HEDGE_WORKERS  = int(os.getenv("ROUTER_HEDGE_WORKERS", "16"))
+
+class Provider:
+    # analyze/analyze_stream 인자는 providers.openai_ai와 같다 (code, language, submissionId, userId, ...)
+    name = "provider"
+
+    def analyze(self, cancel: Optional[threading.Event] = None, **kwargs: Any) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def analyze_stream(self, **kwargs: Any) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        # 스트리밍을 지원하지 않는 제공자는 최종 결과만 보낸다
+        yield "result", self.analyze(**kwargs)
+
+    async def aanalyze(self, **kwargs: Any) -> Dict[str, Any]:
+        # 비동기판이 없는 제공자는 스레드에서 돌리고, 태스크가 취소되면 cancel 신호로 멈춘다
+        cancel = threading.Event()
+        try:
+            return await asyncio.to_thread(self.analyze, cancel=cancel, **kwargs)
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    def warm(self, connections: int = 0) -> Dict[str, Any]:
+        # 콜드 스타트 준비 (warmup.py): 무거운 import/초기화와 상류 커넥션을 첫 요청 전에. 기본은 할 일 없음
+        return {}
+
+    async def awarm(self, connections: int = 0) -> Dict[str, Any]:
+        return {}
+
+class ModuleProvider(Provider):
+    # analyze(/analyze_stream) 함수를 가진 모듈을 처음 쓸 때 import 한다. options는 모듈 함수에 늘 붙여 넘길 인자
+    # (openai:<model>의 model 등)
+    def __init__(self, name: str, module: str, **options: Any):
+        self.name = name
+        self.options = options
+        self._module_name = module
+        self._module = None
+        self._cancellable: Optional[bool] = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._module_name)
+        return self._module
+
+    def _takes_cancel(self) -> bool:
+        if self._cancellable is None:
+            self._cancellable = "cancel" in inspect.signature(self.module.analyze).parameters
+        return self._cancellable
+
+    def analyze(self, cancel: Optional[threading.Event] = None, **kwargs: Any) -> Dict[str, Any]:
+        kwargs = {**kwargs, **self.options}
+        if cancel is not None and self._takes_cancel():
+            # 모듈이 취소를 직접 받는다 (캐시/병합 경로는 그대로, 상류 호출은 청크마다 취소 확인)
+            return self.module.analyze(cancel=cancel, **kwargs)
+        stream_fn = getattr(self.module, "analyze_stream", None)
+        if cancel is None or stream_fn is None:
+            return self.module.analyze(**kwargs)
+        # 취소를 모르는 모듈: 스트림으로 받다가 취소되면 제너레이터를 닫아 상류 연결도 끊는다
+        events = stream_fn(**kwargs)
+        try:
+            for event, data in events:
+                if cancel.is_set():
+                    raise Cancelled(self.name)
+                if event == "result":
+                    return data
+        finally:
+            events.close()
+        raise RuntimeError(f"{self.name}: stream ended without result")
+
+    def analyze_stream(self, **kwargs: Any) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        kwargs = {**kwargs, **self.options}
+        stream_fn = getattr(self.module, "analyze_stream", None)
+        if stream_fn is None:
+            yield "result", self.module.analyze(**kwargs)
+            return
+        yield from stream_fn(**kwargs)
+
+    async def aanalyze(self, **kwargs: Any) -> Dict[str, Any]:
+        kwargs = {**kwargs, **self.options}
+        async_fn = getattr(self.module, "analyze_async", None)
+        if async_fn is None:
+            return await super().aanalyze(**kwargs)
+        return await async_fn(**kwargs)
+
+    def warm(self, connections: int = 0) -> Dict[str, Any]:
+        # 모듈 import 자체가 준비의 절반. warm()이 있으면 나머지도 모듈에 맡긴다
+        warm_fn = getattr(self.module, "warm", None)
+        return warm_fn(connections) if warm_fn is not None else {}
+
+    async def awarm(self, connections: int = 0) -> Dict[str, Any]:
+        awarm_fn = getattr(self.module, "awarm", None)
+        return await awarm_fn(connections) if awarm_fn is not None else {}
+
+class SimulatedProvider(Provider):
+    # 정규분포 지연(ms)과 오류율을 흉내 내는 대역. 결과 본문은 mock_ai
+    def __init__(self, name: str, latency_ms: float = 200.0, jitter_ms: float = 50.0, error_rate: float = 0.0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    def analyze(self, cancel: Optional[threading.Event] = None, **kwargs: Any) -> Dict[str, Any]:
+        from . import mock_ai
+        delay = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000.0
+        left = check_deadline()
+        if left is not None and left < delay:
+            # 남은 예산을 timeout으로 받은 상류 호출처럼
+            if (cancel or threading.Event()).wait(left):
+                raise Cancelled(self.name)
+            raise DeadlineExceeded(f"{self.name}: deadline exceeded")
+        if (cancel or threading.Event()).wait(delay):
+            raise Cancelled(self.name)
+        if random.random() < self.error_rate:
+            raise RuntimeError(f"{self.name}: simulated upstream error")
+        out = mock_ai.analyze(**kwargs)
+        out["source"] = "simulated"; out["model"] = self.name
+        return out
+
+    async def aanalyze(self, **kwargs: Any) -> Dict[str, Any]:
+        from . import mock_ai
+        await asyncio.sleep(max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000.0)
+        if random.random() < self.error_rate:
+            raise RuntimeError(f"{self.name}: simulated upstream error")
+        out = mock_ai.analyze(**kwargs)
+        out["source"] = "simulated"; out["model"] = self.name
+        return out
+
+def _simulated(spec: str) -> Provider:
+    parts = spec.split(":")[1:]
+    vals = [float(p) for p in parts if p != ""]
+    return SimulatedProvider(spec, *vals[:3])
+
+def _openai(spec: str) -> Provider:
+    # openai 또는 openai:<model>. 이름이 spec이므로 모델마다 지연 창/순위가 따로 잡힌다
+    model = spec.split(":", 1)[1].strip() if ":" in spec else ""
+    return ModuleProvider(spec, "providers.openai_ai", **({"model": model} if model else {}))
+
+PROVIDER_FACTORIES: Dict[str, Callable[[str], Provider]] = {
+    "openai":    _openai,
+    "mock":      lambda spec: ModuleProvider(spec, "providers.mock_ai"),
+    "simulated": _simulated,
+}
+
+def register_provider(kind: str, factory: Callable[[str], Provider]) -> None:
+    PROVIDER_FACTORIES[kind] = factory
+
+def create_provider(spec: str) -> Provider:
+    kind = spec.split(":", 1)[0]
+    factory = PROVIDER_FACTORIES.get(kind)
+    if factory is None:
+        raise ValueError(f"unknown provider: {spec!r} (known: {', '.join(sorted(PROVIDER_FACTORIES))})")
+    return factory(spec)
+
+class LatencyWindow:
+    # 최근 (시각, 지연ms, 성공) 표본. 성공한 호출의 지연만 분위수에 쓴다
+    def __init__(self, size: int = ROUTER_WINDOW, max_age: float = ROUTER_WINDOW_SEC):
+        self.max_age = max_age
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.total = 0
+        self.errors = 0
+        self.cancelled = 0
+
+    def add(self, ms: float, ok: bool) -> None:
+        with self._lock:
+            self._samples.append((time.monotonic(), ms, ok))
+            self.total += 1
+            self.errors += 0 if ok else 1
+
+    def _recent(self) -> List[Tuple[float, float, bool]]:
+        cutoff = time.monotonic() - self.max_age
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return list(self._samples)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = self._recent()
+        lat = sorted(ms for _, ms, ok in recent if ok)
+        def q(p: float) -> Optional[float]:
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))], 1) if lat else None
+        n = len(recent)
+        return {"samples": n, "p50_ms": q(0.5), "p95_ms": q(0.95),
+                "error_rate": round(sum(1 for _, _, ok in recent if not ok) / n, 4) if n else 0.0}
+
+class ProviderRouter(Provider):
+    name = "router"
+
+    def __init__(self, providers: List[Provider], hedge: bool = ROUTER_HEDGE):
+        if not providers:
+            raise ValueError("at least one provider is required")
+        # 같은 spec을 두 번 적으면 이름이 겹쳐 지연 창을 나눠 쓰게 되므로 뒤쪽에 번호를 붙인다
+        seen: Dict[str, int] = {}
+        for p in providers:
+            n = seen[p.name] = seen.get(p.name, 0) + 1
+            if n > 1:
+                p.name = f"{p.name}#{n}"
+        self.providers = providers
+        self.hedge = hedge and len(providers) > 1
+        self.windows = {p.name: LatencyWindow() for p in providers}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    @classmethod
+    def from_env(cls) -> "ProviderRouter":
+        return cls([create_provider(spec) for spec in ANALYZE_PROVIDERS])
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # fork 이후 워커에서 처음 헤지할 때 만든다
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=ROUTER_HEDGE_WORKERS, thread_name_prefix="provider-hedge")
+            return self._pool
+
+    def ranked(self) -> List[Provider]:
+        # 표본이 적은 제공자 먼저(탐색), 그다음 정상 제공자를 p50 순으로, 오류율이 높은 제공자는 맨 뒤
+        def _key(ip: Tuple[int, Provider]) -> Tuple[int, float, int]:
+            i, p = ip
+            s = self.windows[p.name].snapshot()
+            if s["samples"] < ROUTER_MIN_SAMPLES:
+                return (0, 0.0, i)
+            if s["error_rate"] > ROUTER_MAX_ERROR_RATE:
+                return (2, s["error_rate"], i)
+            return (1, s["p50_ms"] if s["p50_ms"] is not None else 0.0, i)
+        return [p for _, p in sorted(enumerate(self.providers), key=_key)]
+
+    def _run(self, p: Provider, kwargs: Dict[str, Any], cancel: Optional[threading.Event]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            out = p.analyze(cancel=cancel, **kwargs)
+        except (Cancelled, DeadlineExceeded):
+            # 진 쪽(또는 마감에 걸린 쪽)의 경과 시간은 실제 지연의 하한이다. 표본으로 남겨야 계속 탐색 대상으로 뽑히지 않는다
+            w = self.windows[p.name]
+            w.add((time.perf_counter() - t0) * 1000.0, True)
+            with self._lock:
+                w.cancelled += 1
+            raise
+        except ValueError:
+            raise   # 잘못된 입력 (제공자 문제 아님)
+        except Exception:
+            self.windows[p.name].add((time.perf_counter() - t0) * 1000.0, False)
+            raise
+        # 상류 장애로 대체 응답을 돌려준 경우도 라우팅에서는 실패로 본다
+        self.windows[p.name].add((time.perf_counter() - t0) * 1000.0, not out.get("degraded"))
+        return out
+
+    def _hedge_delay(self, p: Provider) -> float:
+        p95 = self.windows[p.name].snapshot()["p95_ms"]
+        return max(ROUTER_HEDGE_MIN_MS, p95 or 0.0) / 1000.0
+
+    def analyze(self, cancel: Optional[threading.Event] = None, **kwargs: Any) -> Dict[str, Any]:
+        order = self.ranked()
+        if not self.hedge:
+            return self._failover(order, kwargs, cancel)
+        return self._hedged(order, kwargs)
+
+    def _failover(self, order: List[Provider], kwargs: Dict[str, Any],
+                  cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+        # 순위대로 시도하고, 실패(예외)하면 다음 제공자로
+        last: Optional[BaseException] = None
+        for n, p in enumerate(order):
+            try:
+                out = self._run(p, kwargs, cancel)
+            except (ValueError, DeadlineExceeded, Cancelled):
+                raise   # 다음 제공자에게 줄 예산도 없다
+            except Exception as e:
+                log_event("provider_failed", level="warning", provider=p.name, error=repr(e))
+                last = e
+                continue
+            if n:
+                with self._lock: self.failovers += 1
+            return out
+        raise last if last is not None else RuntimeError("no provider available")
+
+    def _hedged(self, order: List[Provider], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        pool = self._executor()
+        first, second = order[0], order[1]
+        racers: Dict[Future, Tuple[Provider, threading.Event]] = {}
+        ev = threading.Event()
+        racers[pool.submit(contextvars.copy_context().run, self._run, first, kwargs, ev)] = (first, ev)
+        done, _ = wait(list(racers), timeout=self._hedge_delay(first))
+        if not done:
+            with self._lock: self.hedged += 1
+            ev2 = threading.Event()
+            racers[pool.submit(contextvars.copy_context().run, self._run, second, kwargs, ev2)] = (second, ev2)
+
+        fallback: Optional[Dict[str, Any]] = None
+        last: Optional[BaseException] = None
+        pending = set(racers)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    try:
+                        out = f.result()
+                    except (ValueError, DeadlineExceeded):
+                        raise
+                    except Exception as e:
+                        last = e
+                        if len(racers) == 1 and not pending:
+                            # 헤지 전에 바로 실패: 다음 제공자로 넘긴다
+                            with self._lock: self.failovers += 1
+                            return self._failover(order[1:], kwargs)
+                        continue
+                    if out.get("degraded") and pending:
+                        fallback = fallback or out
+                        continue
+                    if racers[f][0] is not first:
+                        with self._lock: self.hedge_wins += 1
+                    return out
+        finally:
+            # 승자가 정해졌거나 오류로 빠져나가면 남은 쪽은 취소 신호 (시작 전이면 실행 자체를 취소)
+            for other, (_, cev) in racers.items():
+                if not other.done():
+                    cev.set(); other.cancel()
+        if fallback is not None:
+            return fallback
+        raise last if last is not None else RuntimeError("no provider available")
+
+    # ---- 비동기 경로 (ASGI 모드): 같은 순위/표본/헤지 규칙, 취소는 태스크 취소로 ----
+    async def _arun(self, p: Provider, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            out = await p.aanalyze(**kwargs)
+        except asyncio.CancelledError:
+            w = self.windows[p.name]
+            w.add((time.perf_counter() - t0) * 1000.0, True)
+            with self._lock:
+                w.cancelled += 1
+            raise
+        except ValueError:
+            raise
+        except Exception:
+            self.windows[p.name].add((time.perf_counter() - t0) * 1000.0, False)
+            raise
+        self.windows[p.name].add((time.perf_counter() - t0) * 1000.0, not out.get("degraded"))
+        return out
+
+    async def aanalyze(self, **kwargs: Any) -> Dict[str, Any]:
+        order = self.ranked()
+        if not self.hedge:
+            return await self._afailover(order, kwargs)
+        return await self._ahedged(order, kwargs)
+
+    async def _afailover(self, order: List[Provider], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        last: Optional[BaseException] = None
+        for n, p in enumerate(order):
+            try:
+                out = await self._arun(p, kwargs)
+            except ValueError:
+                raise
+            except Exception as e:
+                log_event("provider_failed", level="warning", provider=p.name, error=repr(e))
+                last = e
+                continue
+            if n:
+                with self._lock: self.failovers += 1
+            return out
+        raise last if last is not None else RuntimeError("no provider available")
+
+    async def _ahedged(self, order: List[Provider], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        first, second = order[0], order[1]
+        racers: Dict["asyncio.Task[Dict[str, Any]]", Provider] = {}
+        racers[asyncio.ensure_future(self._arun(first, kwargs))] = first
+        done, _ = await asyncio.wait(list(racers), timeout=self._hedge_delay(first))
+        if not done:
+            with self._lock: self.hedged += 1
+            racers[asyncio.ensure_future(self._arun(second, kwargs))] = second
+
+        fallback: Optional[Dict[str, Any]] = None
+        last: Optional[BaseException] = None
+        pending = set(racers)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    try:
+                        out = t.result()
+                    except ValueError:
+                        raise
+                    except Exception as e:
+                        last = e
+                        if len(racers) == 1 and not pending:
+                            with self._lock: self.failovers += 1
+                            return await self._afailover(order[1:], kwargs)
+                        continue
+                    if out.get("degraded") and pending:
+                        fallback = fallback or out
+                        continue
+                    if racers[t] is not first:
+                        with self._lock: self.hedge_wins += 1
+                    return out
+        finally:
+            # 승자가 정해졌거나 호출자가 취소되면 남은 쪽은 취소
+            for t in racers:
+                if not t.done():
+                    t.cancel()
+        if fallback is not None:
+            return fallback
+        raise last if last is not None else RuntimeError("no provider available")
+
+    def analyze_stream(self, **kwargs: Any) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        # 이미 보낸 부분 결과를 되돌릴 수 없으므로 스트림은 헤지하지 않고 가장 빠른 제공자 하나로 보낸다
+        p = self.ranked()[0]
+        t0 = time.perf_counter()
+        try:
+            for event, data in p.analyze_stream(**kwargs):
+                if event == "result":
+                    self.windows[p.name].add((time.perf_counter() - t0) * 1000.0, not data.get("degraded"))
+                yield event, data
+        except ValueError:
+            raise
+        except Exception:
+            self.windows[p.name].add((time.perf_counter() - t0) * 1000.0, False)
+            raise
+
+    # ---- 콜드 스타트 준비: 제공자별로, 하나라도 준비되면 라우터는 준비된 것으로 본다 (나머지는 실패 시 넘기면 된다) ----
+    def warm(self, connections: int = 0) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        last: Optional[BaseException] = None
+        for p in self.providers:
+            try:
+                out[p.name] = p.warm(connections)
+            except Exception as e:
+                log_event("provider_warm_failed", level="warning", provider=p.name, error=repr(e))
+                out[p.name] = {"error": repr(e)}
+                last = e
+        if last is not None and all("error" in v for v in out.values()):
+            raise last
+        return out
+
+    async def awarm(self, connections: int = 0) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        last: Optional[BaseException] = None
+        for p in self.providers:
+            try:
+                out[p.name] = await p.awarm(connections)
+            except Exception as e:
+                log_event("provider_warm_failed", level="warning", provider=p.name, error=repr(e))
+                out[p.name] = {"error": repr(e)}
+                last = e
+        if last is not None and all("error" in v for v in out.values()):
+            raise last
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"hedge": self.hedge, "hedged": self.hedged, "hedge_wins": self.hedge_wins,
+                                   "failovers": self.failovers}
+        out["providers"] = {name: {**w.snapshot(), "total": w.total, "errors": w.errors, "cancelled": w.cancelled}
+                            for name, w in self.windows.items()}
+        out["order"] = [p.name for p in self.ranked()]
+        return out
@@ -0,0 +1,164 @@
+from __future__ import annotations
+import json, threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson  # 선택 의존성: 없으면 표준 json으로 같은 결과를 만든다
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+from .metrics import event
+from .schema import validate_model
+
+# ---- 모델 응답 JSON 처리 ----
+# 1) 빠른 파싱/직렬화: orjson이 있으면 쓰고(큰 fixed_code 응답에서 표준 json보다 몇 배 빠름), 없으면 json
+# 2) 로컬 복구: 코드 펜스/앞뒤 잡문, 꼬리 쉼표, 문자열 안의 날 줄바꿈·제어 문자, 잘못된 이스케이프,
+#    max_tokens로 잘린 끝(열린 문자열/괄호 닫기, 마지막 불완전 항목 버리기)을 고쳐 LLM 호출 결과를 살린다
+# 3) 컴파일된 MODEL_SCHEMA 검증: 통과한 응답은 _coerce_defaults가 필드별 변환을 건너뛴다
+
+def loads(raw: Any) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass   # NaN 등 표준 json만 받는 입력은 아래에서 한 번 더
+    return json.loads(raw)
+
+def dumps(obj: Any) -> bytes:
+    # UTF-8 바이트 (ensure_ascii=False와 같은 모양)
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass   # 64비트를 넘는 정수, 직렬화할 수 없는 타입 등
+    return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+class _ResponseStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.parsed = 0          # 그대로 파싱됨
+        self.repaired = 0        # 로컬 복구 후 파싱됨
+        self.truncated = 0       # 그중 잘린 끝을 닫거나 버려서 살린 경우
+        self.failed = 0          # 복구 실패 (빈 응답으로 처리)
+        self.schema_valid = 0
+        self.schema_invalid = 0
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for k, v in counts.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.parsed + self.repaired + self.failed
+            return {"parsed": self.parsed, "repaired": self.repaired, "truncated": self.truncated,
+                    "failed": self.failed, "schema_valid": self.schema_valid, "schema_invalid": self.schema_invalid,
+                    "repair_ratio": round(self.repaired / total, 4) if total else 0.0}
+
+RESPONSE_STATS = _ResponseStats()
+
+_ESCAPES = '"\\/bfnrtu'
+_CTRL = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_MAX_CUTS = 8
+
+def _strip_wrapping(raw: str) -> str:
+    # ```json 펜스나 앞 설명 문장은 첫 '{' 앞에서 자른다. 뒤쪽 잡문은 repair_json이 최상위 객체가 닫히는 곳에서 멈춰 버린다
+    start = raw.find("{")
+    return raw[start:] if start >= 0 else raw.strip()
+
+def _closers(stack: List[str]) -> str:
+    return "".join("}" if c == "{" else "]" for c in reversed(stack))
+
+def repair_json(raw: str) -> Tuple[str, List[str]]:
+    # 한 번 훑으면서 고친 텍스트와, 잘렸을 때 되돌아갈 후보(마지막 완성 항목까지 자르고 괄호를 닫은 텍스트)를 만든다
+    text = _strip_wrapping(raw)
+    out: List[str] = []
+    stack: List[str] = []
+    cuts: List[Tuple[int, str]] = []     # (out 길이, 그 지점의 닫는 괄호들) — 값과 값 사이 쉼표 위치
+    in_str = esc = False
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if in_str:
+            if esc:
+                esc = False
+                if ch not in _ESCAPES:
+                    out.append("\\")          # "\d" 같은 잘못된 이스케이프는 역슬래시 자체로
+                out.append(ch)
+            elif ch == "\\":
+                esc = True
+                out.append(ch)
+            elif ch == '"':
+                in_str = False
+                out.append(ch)
+            elif ch < " ":
+                out.append(_CTRL.get(ch) or f"\\u{ord(ch):04x}")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if stack: stack.pop()
+            if not stack:
+                out.append(ch)
+                break
+        elif ch == ",":
+            j = i + 1
+            while j < n and text[j] in " \t\r\n":
+                j += 1
+            if j >= n or text[j] in "}]":
+                i += 1                        # 꼬리 쉼표
+                continue
+            cuts.append((len(out), _closers(stack)))
+        out.append(ch)
+        i += 1
+
+    fixed = "".join(out)
+    if not in_str and not stack:
+        return fixed, []
+    # 잘린 응답: 열린 문자열과 괄호를 닫은 것, 그다음 마지막 완성 항목들까지 자른 것
+    tail = fixed[:-1] if esc else fixed
+    closed = tail + ('"' if in_str else "")
+    candidates = [closed.rstrip().rstrip(",:") + _closers(stack)]
+    for pos, closers in reversed(cuts[-_MAX_CUTS:]):
+        candidates.append(fixed[:pos] + closers)
+    return candidates[0], candidates[1:]
+
+def parse_model_json(raw: Optional[str]) -> Dict[str, Any]:
+    # 모델 응답 본문 -> dict. 복구할 수 없으면 {} (호출자는 빈 응답처럼 후처리)
+    raw = raw or "{}"
+    status = "parsed"
+    try:
+        parsed = loads(raw)
+    except ValueError:
+        parsed = None
+        fixed, fallbacks = repair_json(raw)
+        for candidate in (fixed, *fallbacks):
+            try:
+                parsed = loads(candidate)
+            except ValueError:
+                continue
+            status = "repaired"
+            if fallbacks:
+                RESPONSE_STATS.add(truncated=1)
+            break
+    if not isinstance(parsed, dict):
+        RESPONSE_STATS.add(failed=1)
+        event("json", "failed")
+        return {}
+    RESPONSE_STATS.add(**{status: 1})
+    event("json", status)
+    return parsed
+
+def check_model(parsed: Dict[str, Any]) -> bool:
+    # 스키마를 그대로 만족하는지 (통계만 남기고 결과는 호출자가 판단)
+    ok = not validate_model(parsed)
+    RESPONSE_STATS.add(**{"schema_valid" if ok else "schema_invalid": 1})
+    return ok
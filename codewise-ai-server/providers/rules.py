@@ -0,0 +1,200 @@
+from __future__ import annotations
+import os, re, json, time, hashlib, threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from .metrics import log_event
+
+# ---- 후처리 규칙 엔진 (심각도 조정 / 목적 추론) ----
+# 규칙은 RULES_PATH(JSON, 기본 providers/rules.json)에서 읽고, 종류별로 정규식 하나로 합쳐 컴파일한다.
+#   severity: 메시지에 pattern이 걸리면 severity로 바꾼다. 여러 규칙이 걸리면 파일에서 앞선 규칙
+#             (pattern들을 이름 있는 그룹의 alternation으로 묶어 한 번 훑는다)
+#   purpose:  코드/이슈 텍스트에 keywords 중 하나라도 있으면 그 purpose. 여러 그룹이 걸리면 앞선 그룹
+#             (키워드 전체를 접두사 트라이 정규식 하나로 묶는다 — 키워드가 늘어도 텍스트는 한 번만 훑는다)
+# 파일이 바뀌면 RULES_RELOAD_SEC 간격으로 mtime을 보고 다시 읽는다. 잘못된 파일이면 이전 규칙을 유지한다.
+# 규칙별 적중 횟수는 stats()로 (/healthz, /metrics).
+RULES_PATH       = os.getenv("RULES_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+RULES_RELOAD_SEC = float(os.getenv("RULES_RELOAD_SEC", "5"))   # 0이면 핫 리로드 끔
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    # ["perf", "performance"] -> "perf(?:ormance)?" 꼴. 같은 위치에서는 긴 키워드가 먼저 걸린다
+    trie: Dict[str, Any] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def _emit(node: Dict[str, Any]) -> str:
+        alts = [re.escape(ch) + _emit(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if "" in node:
+            body = "(?:" + body + ")?"
+        return body
+
+    return _emit(trie)
+
+class RuleSet:
+    # 한 번 컴파일된 규칙 묶음 (불변). 잘못된 규칙이면 ValueError
+    def __init__(self, doc: Dict[str, Any], version: str = ""):
+        self.version = version
+        sev = list(doc.get("severity") or [])
+        self.severity_ids: List[str] = []
+        self.severity_targets: List[str] = []
+        parts: List[str] = []
+        for i, r in enumerate(sev):
+            rid = str(r.get("id") or f"severity_{i}")
+            try:
+                re.compile(r["pattern"])
+            except (KeyError, re.error) as e:
+                raise ValueError(f"severity rule {rid}: {e!r}")
+            self.severity_ids.append(rid)
+            self.severity_targets.append(str(r.get("severity") or "warn").lower())
+            parts.append(f"(?P<s{i}>{r['pattern']})")
+        self.severity_re = re.compile("|".join(parts), re.I) if parts else None
+
+        self.purpose_ids: List[str] = []
+        self.purposes: List[str] = []
+        self._keyword_group: Dict[str, int] = {}
+        for i, g in enumerate(doc.get("purpose") or []):
+            self.purpose_ids.append(str(g.get("id") or f"purpose_{i}"))
+            self.purposes.append(str(g["purpose"]))
+            for kw in g.get("keywords") or []:
+                # 같은 키워드가 여러 그룹에 있으면 앞선 그룹
+                self._keyword_group.setdefault(str(kw).lower(), i)
+        words = [w for w in self._keyword_group if w]
+        # 한 위치에서는 가장 긴 키워드만 잡히므로, 그 안의 접두사 키워드가 더 앞선 그룹이면 그 그룹으로 본다
+        for w in words:
+            self._keyword_group[w] = min(g for k, g in self._keyword_group.items() if k and w.startswith(k))
+        # re.I는 글자마다 대소문자를 접어 비교해 몇 배 느리므로, 텍스트를 소문자로 바꾼 뒤 그대로 맞춘다
+        self.purpose_re = re.compile(_trie_pattern(words)) if words else None
+        self.default_purpose = str(doc.get("default_purpose") or "general_refactor")
+
+    def match_severity(self, text: str) -> Optional[int]:
+        if self.severity_re is None:
+            return None
+        best: Optional[int] = None
+        for m in self.severity_re.finditer(text):
+            i = int(m.lastgroup[1:]) if m.lastgroup else min(
+                int(k[1:]) for k, v in m.groupdict().items() if v is not None)
+            if best is None or i < best:
+                best = i
+                if i == 0: break
+        return best
+
+    def match_purpose(self, texts: Iterable[str]) -> Optional[int]:
+        if self.purpose_re is None:
+            return None
+        best: Optional[int] = None
+        search = self.purpose_re.search
+        for text in texts:
+            text = text.lower()
+            m = search(text)
+            while m is not None:
+                i = self._keyword_group[m.group(0)]
+                if best is None or i < best:
+                    best = i
+                    if i == 0: return 0   # 가장 앞선 그룹이면 더 볼 필요 없다
+                # 다음 글자부터 다시 찾는다 (앞 키워드의 끝과 겹쳐 시작하는 키워드도 놓치지 않게)
+                m = search(text, m.start() + 1)
+        return best
+
+def load_rules(path: str) -> RuleSet:
+    with open(path, "rb") as f:
+        raw = f.read()
+    return RuleSet(json.loads(raw), hashlib.sha1(raw).hexdigest()[:10])
+
+class RuleEngine:
+    def __init__(self, path: str = RULES_PATH, reload_sec: float = RULES_RELOAD_SEC):
+        self.path = path
+        self.reload_sec = reload_sec
+        self._lock = threading.Lock()
+        self._mtime = self._stat()
+        self._checked = time.monotonic()
+        self.rules = load_rules(path)
+        self.reloads = 0
+        self.reload_errors = 0
+        self._hits: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "RuleEngine":
+        return cls()
+
+    def _stat(self) -> float:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return 0.0
+
+    def maybe_reload(self) -> None:
+        if self.reload_sec <= 0:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.reload_sec:
+            return
+        with self._lock:
+            if now - self._checked < self.reload_sec:
+                return
+            self._checked = now
+            mtime = self._stat()
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+        self.reload()
+
+    def reload(self) -> bool:
+        try:
+            rules = load_rules(self.path)
+        except Exception as e:
+            with self._lock:
+                self.reload_errors += 1
+            log_event("rules_reload_failed", level="error", path=self.path, error=repr(e))   # 이전 규칙 유지
+            return False
+        with self._lock:
+            changed = rules.version != self.rules.version
+            self.rules = rules
+            if changed:
+                self.reloads += 1
+        if changed:
+            log_event("rules_reloaded", path=self.path, version=rules.version)
+        return True
+
+    @property
+    def version(self) -> str:
+        self.maybe_reload()
+        return self.rules.version
+
+    def _hit(self, key: str) -> None:
+        with self._lock:
+            self._hits[key] = self._hits.get(key, 0) + 1
+
+    def severity(self, message: str, severity: str) -> str:
+        # 걸린 규칙이 없으면 원래 심각도(소문자)
+        self.maybe_reload()
+        rules = self.rules
+        i = rules.match_severity(message or "")
+        if i is None:
+            return (severity or "info").lower()
+        self._hit("severity:" + rules.severity_ids[i])
+        return rules.severity_targets[i]
+
+    def purpose(self, code: str, issues: List[Dict[str, Any]]) -> str:
+        # 짧은 이슈 텍스트를 먼저 보고, 가장 앞선 그룹이 거기서 걸리면 코드 전체는 훑지 않는다
+        self.maybe_reload()
+        rules = self.rules
+        texts = [(it.get("message") or "") + " " + (it.get("suggestion") or "") for it in (issues or [])]
+        texts.append(code or "")
+        i = rules.match_purpose(texts)
+        if i is None:
+            self._hit("purpose:default")
+            return rules.default_purpose
+        self._hit("purpose:" + rules.purpose_ids[i])
+        return rules.purposes[i]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rules = self.rules
+            return {"version": rules.version, "severity_rules": len(rules.severity_ids),
+                    "purpose_groups": len(rules.purpose_ids), "keywords": len(rules._keyword_group),
+                    "reloads": self.reloads, "reload_errors": self.reload_errors, "hits": dict(self._hits)}
@@ -1,3 +1,8 @@
+from __future__ import annotations
+import copy
+from typing import Any, Callable, Dict, List
+
+# 서버 응답 전체 스키마 (metrics는 서버가 로컬 엔진으로 계산)
 CODEWISE_SCHEMA = {
     "type": "object",
     "properties": {
@@ -10,8 +15,10 @@ CODEWISE_SCHEMA = {
                 "maintainability_index": {"type":["number","null"]},
                 "avg_complexity": {"type":["number","null"]},
                 "mccabe_complexity": {"type":["number","null"]},
+                "max_complexity": {"type":["number","null"]},
                 "blank": {"type":["integer","null"]},
                 "comment": {"type":["integer","null"]},
+                "comments": {"type":["integer","null"]},
                 "todos": {"type":["integer","null"]}
             },
             "required": ["loc","language"],
@@ -45,4 +52,122 @@ CODEWISE_SCHEMA = {
     },
     "required": ["summary","metrics","issues","fix"],
     "additionalProperties": False
-}
\ No newline at end of file
+}
+
+# 모델이 생성하는 부분만 (SYSTEM_PROMPT의 summary/issues/fix)
+MODEL_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {k: CODEWISE_SCHEMA["properties"][k] for k in ("summary", "issues", "fix")},
+    "required": ["summary", "issues", "fix"],
+    "additionalProperties": False,
+}
+
+def strict_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    # OpenAI structured output(strict)용: 모든 객체의 속성을 required로, 추가 속성 금지
+    out = copy.deepcopy(schema)
+    stack = [out]
+    while stack:
+        s = stack.pop()
+        if "properties" in s:
+            s["required"] = list(s["properties"])
+            s["additionalProperties"] = False
+            stack.extend(s["properties"].values())
+        if isinstance(s.get("items"), dict):
+            stack.append(s["items"])
+    return out
+
+def without_patches(schema: Dict[str, Any]) -> Dict[str, Any]:
+    # 재작성 전용 모드: 모델은 fix.patch/issues[].patch를 만들지 않는다 (서버가 fixed_code와의 diff로 계산)
+    out = copy.deepcopy(schema)
+    out["properties"]["fix"]["properties"].pop("patch", None)
+    out["properties"]["issues"]["items"]["properties"].pop("patch", None)
+    return out
+
+REWRITE_MODEL_SCHEMA = without_patches(MODEL_SCHEMA)
+
+# response_format={"type": "json_schema", ...} 본문
+MODEL_RESPONSE_FORMAT = {"type": "json_schema",
+                         "json_schema": {"name": "codewise_review", "strict": True, "schema": strict_schema(MODEL_SCHEMA)}}
+REWRITE_RESPONSE_FORMAT = {"type": "json_schema",
+                           "json_schema": {"name": "codewise_rewrite", "strict": True,
+                                           "schema": strict_schema(REWRITE_MODEL_SCHEMA)}}
+
+# ---- 스키마 컴파일 ----
+# 스키마를 한 번만 훑어 검사 함수(클로저) 트리로 바꿔 둔다. 호출마다 스키마 dict를 해석하지 않는다.
+# 지원 범위는 이 파일의 스키마가 쓰는 키워드뿐: type, enum, properties, required, additionalProperties, items
+_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "string":  lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number":  lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null":    lambda v: v is None,
+    "object":  lambda v: isinstance(v, dict),
+    "array":   lambda v: isinstance(v, list),
+}
+
+_Check = Callable[[Any, str, List[str]], None]
+
+def _compile(schema: Dict[str, Any]) -> _Check:
+    checks: List[_Check] = []
+
+    types = schema.get("type")
+    if types is not None:
+        names = [types] if isinstance(types, str) else list(types)
+        preds = [_TYPES[t] for t in names]
+        want = "|".join(names)
+        if len(preds) == 1:
+            pred = preds[0]
+            def _type(v: Any, path: str, errors: List[str]) -> None:
+                if not pred(v): errors.append(f"{path}: expected {want}")
+        else:
+            def _type(v: Any, path: str, errors: List[str]) -> None:
+                if not any(p(v) for p in preds): errors.append(f"{path}: expected {want}")
+        checks.append(_type)
+
+    if "enum" in schema:
+        allowed = frozenset(schema["enum"])
+        def _enum(v: Any, path: str, errors: List[str]) -> None:
+            if isinstance(v, str) and v not in allowed: errors.append(f"{path}: not one of {sorted(allowed)}")
+        checks.append(_enum)
+
+    if "properties" in schema:
+        props = {k: _compile(s) for k, s in schema["properties"].items()}
+        required = tuple(schema.get("required") or ())
+        closed = schema.get("additionalProperties") is False
+        def _object(v: Any, path: str, errors: List[str]) -> None:
+            if not isinstance(v, dict): return
+            for k in required:
+                if k not in v: errors.append(f"{path}.{k}: required")
+            for k, item in v.items():
+                check = props.get(k)
+                if check is not None:
+                    check(item, f"{path}.{k}", errors)
+                elif closed:
+                    errors.append(f"{path}.{k}: unexpected")
+        checks.append(_object)
+
+    if isinstance(schema.get("items"), dict):
+        item_check = _compile(schema["items"])
+        def _array(v: Any, path: str, errors: List[str]) -> None:
+            if not isinstance(v, list): return
+            for i, item in enumerate(v):
+                item_check(item, f"{path}[{i}]", errors)
+        checks.append(_array)
+
+    if len(checks) == 1:
+        return checks[0]
+    def _all(v: Any, path: str, errors: List[str]) -> None:
+        for c in checks: c(v, path, errors)
+    return _all
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any], List[str]]:
+    # 반환 함수: 값 -> 오류 목록 ("$.issues[3].line: expected integer" 형식, 비어 있으면 통과)
+    check = _compile(schema)
+    def validate(value: Any) -> List[str]:
+        errors: List[str] = []
+        check(value, "$", errors)
+        return errors
+    return validate
+
+validate_model = compile_schema(MODEL_SCHEMA)
+validate_response = compile_schema(CODEWISE_SCHEMA)
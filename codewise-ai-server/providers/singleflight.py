@@ -0,0 +1,189 @@
+from __future__ import annotations
+import os, copy, time, threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .transport import Cancelled, DeadlineExceeded, cancel_event, check_cancel, check_deadline, deadline_left
+
+try:
+    import fcntl  # POSIX 전용. Windows 개발 환경에서는 워커 간 병합만 비활성화
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+# ---- 동일 요청 병합 (single-flight) ----
+# 같은 키로 동시에 들어온 호출은 하나의 LLM 호출을 공유한다.
+# SINGLEFLIGHT_LOCK_DIR 지정 시 gunicorn 워커 간에도 키별 파일 락으로 직렬화하고,
+# 락을 얻은 뒤 recheck(보통 디스크 캐시 조회)로 다른 워커가 만든 결과를 재사용한다.
+SINGLEFLIGHT_LOCK_DIR = os.getenv("SINGLEFLIGHT_LOCK_DIR", "")
+_CANCEL_POLL = 0.05   # 취소될 수 있는 대기자가 취소를 확인하는 간격(초)
+_LOCK_POLL = 0.02     # 마감 안에서 워커 간 파일 락을 다시 시도하는 간격(초)
+
+class CoalescedError(RuntimeError):
+    # 병합된 호출의 리더가 실패했고, 그 예외를 같은 종류로 다시 만들 수 없을 때 (원래 예외는 __cause__)
+    pass
+
+def leader_interrupted(err: BaseException) -> bool:
+    # 리더 자신의 마감/취소로 끝난 실패. 병합된 다른 호출의 실패가 아니므로 대기자는 나눠 받지 않고 다시 시도한다
+    return isinstance(err, (DeadlineExceeded, Cancelled))
+
+def follower_error(err: BaseException) -> BaseException:
+    # 리더의 예외 객체를 여러 스레드에서 그대로 다시 던지면 __traceback__/__context__를 서로 덮어쓴다.
+    # 같은 종류의 새 예외(같은 인자)를 만들고, 못 만들면 CoalescedError로 감싼다. 원래 예외는 raise ... from 으로 잇는다
+    try:
+        fresh = copy.copy(err)
+    except Exception:
+        fresh = None
+    if type(fresh) is not type(err):
+        fresh = CoalescedError(f"coalesced call failed: {err!r}")
+    return fresh
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+class SingleFlight:
+    def __init__(self, lock_dir: str = ""):
+        self.lock_dir = lock_dir if (lock_dir and fcntl is not None) else ""
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._stats = {"leaders": 0, "coalesced": 0, "coalesced_cross_process": 0, "errors": 0, "rejoined": 0}
+
+    @classmethod
+    def from_env(cls) -> "SingleFlight":
+        return cls(lock_dir=SINGLEFLIGHT_LOCK_DIR)
+
+    @contextmanager
+    def _process_lock(self, key: str) -> Iterator[None]:
+        if not self.lock_dir:
+            yield; return
+        path = os.path.join(self.lock_dir, key + ".lock")
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                self._flock(fd)
+            except BaseException:
+                os.close(fd)
+                raise
+            # 이전 보유자가 락 파일을 지웠다면 새 파일로 다시 시도
+            try:
+                if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+        try:
+            yield
+        finally:
+            try: os.unlink(path)
+            except FileNotFoundError: pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    @staticmethod
+    def _flock(fd: int) -> None:
+        # 마감 밖이면 그냥 기다리고, 마감 안이면 남은 예산까지만 LOCK_NB로 다시 시도한다 (취소도 본다)
+        if deadline_left() is None and cancel_event() is None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                pass
+            check_cancel()
+            left = deadline_left()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded("deadline exceeded waiting for a coalesced call in another worker")
+            time.sleep(_LOCK_POLL if left is None else min(_LOCK_POLL, left))
+
+    @staticmethod
+    def _wait(call: _Call) -> None:
+        # 리더를 기다리되 마감이 지나면 DeadlineExceeded, 취소되면 Cancelled
+        cancellable = cancel_event() is not None
+        while True:
+            left = deadline_left()
+            step = _CANCEL_POLL if cancellable else None
+            if left is not None:
+                step = max(0.0, left) if step is None else min(step, max(0.0, left))
+            if call.done.wait(step):
+                return
+            check_cancel()
+            if left is not None and left <= step:
+                raise DeadlineExceeded("deadline exceeded waiting for a coalesced call")
+
+    def do(self, key: str, fn: Callable[[], Any],
+           recheck: Optional[Callable[[], Any]] = None) -> Tuple[Any, bool]:
+        # 반환값: (결과, 다른 호출의 결과를 공유했는지)
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is not None:
+                    call.waiters += 1
+                    self._stats["coalesced"] += 1
+                    leader = False
+                else:
+                    call = _Call()
+                    self._calls[key] = call
+                    self._stats["leaders"] += 1
+                    leader = True
+            if leader:
+                break
+            # 마감 안의 호출은 남은 예산까지만, 취소될 수 있는 호출은 취소될 때까지만 리더를 기다린다
+            try:
+                self._wait(call)
+            except BaseException:
+                with self._lock:
+                    call.waiters -= 1
+                raise
+            err = call.error
+            if err is None:
+                return call.result, True
+            if not leader_interrupted(err):
+                raise follower_error(err) from err
+            # 리더가 자기 마감/취소로 끝났다: 이 호출에 예산이 남아 있으면 직접(또는 새 리더를 따라) 다시 시도
+            check_cancel()
+            check_deadline()
+            with self._lock:
+                self._stats["rejoined"] += 1
+
+        shared = False
+        try:
+            with self._process_lock(key):
+                found = recheck() if (recheck is not None and self.lock_dir) else None
+                if found is not None:
+                    shared = True
+                    with self._lock:
+                        self._stats["coalesced_cross_process"] += 1
+                    call.result = found
+                else:
+                    call.result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, shared
+
+    def note(self, leader: bool) -> None:
+        # 다른 곳(비동기 경로)에서 병합한 호출도 같은 통계에 센다
+        with self._lock:
+            self._stats["leaders" if leader else "coalesced"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["in_flight"] = len(self._calls)
+        out["cross_process"] = bool(self.lock_dir)
+        return out
@@ -0,0 +1,67 @@
+from __future__ import annotations
+import os, time, uuid, sqlite3, tempfile, threading
+from typing import Any, Dict, Optional
+
+from .response import dumps_str, loads
+
+# ---- 이전 제출본 저장소 (증분 재분석용) ----
+# 제출마다 원본 코드와 분석 결과를 남겨 두고, 다음 제출에서 previousSubmissionId 또는 (userId, fileKey)로 찾는다.
+# jobs와 같이 로컬 SQLite라 같은 호스트의 모든 워커가 공유한다.
+SUBMISSIONS_DB_PATH       = os.getenv("SUBMISSIONS_DB") or os.path.join(tempfile.gettempdir(), "codewise-submissions.db")
+SUBMISSIONS_RETENTION_SEC = float(os.getenv("SUBMISSIONS_RETENTION_SEC", str(7 * 86400)))
+
+class SubmissionStore:
+    def __init__(self, path: str, retention_sec: float = SUBMISSIONS_RETENTION_SEC):
+        self.path = path
+        self.retention_sec = retention_sec
+        self._local = threading.local()
+        d = os.path.dirname(os.path.abspath(path))
+        if d: os.makedirs(d, exist_ok=True)
+        c = self._conn()
+        c.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            "id TEXT PRIMARY KEY, user_id TEXT, file_key TEXT, created_at REAL NOT NULL, "
+            "language TEXT NOT NULL, purpose TEXT, profile_fp TEXT, code TEXT NOT NULL, content TEXT NOT NULL)")
+        c.execute("CREATE INDEX IF NOT EXISTS submissions_user_file ON submissions (user_id, file_key, created_at)")
+
+    @classmethod
+    def from_env(cls) -> "SubmissionStore":
+        return cls(SUBMISSIONS_DB_PATH)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, submission_id: Optional[str], user_id: Optional[str], file_key: Optional[str],
+             code: str, language: str, purpose: Optional[str], profile_fp: str,
+             content: Dict[str, Any]) -> str:
+        sid = str(submission_id) if submission_id is not None else uuid.uuid4().hex
+        now = time.time()
+        c = self._conn()
+        c.execute("INSERT OR REPLACE INTO submissions "
+                  "(id, user_id, file_key, created_at, language, purpose, profile_fp, code, content) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                  (sid, None if user_id is None else str(user_id), file_key, now, language, purpose or "",
+                   profile_fp, code, dumps_str(content)))
+        c.execute("DELETE FROM submissions WHERE created_at < ?", (now - self.retention_sec,))
+        return sid
+
+    def _row(self, row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        if not row: return None
+        return {"submissionId": row[0], "language": row[1], "purpose": row[2] or None,
+                "profile_fp": row[3], "code": row[4], "content": loads(row[5])}
+
+    def get(self, submission_id: str) -> Optional[Dict[str, Any]]:
+        return self._row(self._conn().execute(
+            "SELECT id, language, purpose, profile_fp, code, content FROM submissions WHERE id = ?",
+            (str(submission_id),)).fetchone())
+
+    def latest(self, user_id: str, file_key: str, exclude_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return self._row(self._conn().execute(
+            "SELECT id, language, purpose, profile_fp, code, content FROM submissions "
+            "WHERE user_id = ? AND file_key = ? AND id != ? ORDER BY created_at DESC LIMIT 1",
+            (str(user_id), file_key, "" if exclude_id is None else str(exclude_id))).fetchone())
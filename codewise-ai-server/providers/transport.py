@@ -0,0 +1,593 @@
+from __future__ import annotations
+import os, time, random, asyncio, threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterator, Optional
+
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from .metrics import event, log_event
+
+# ---- LLM 호출 전송 계층 ----
+# keep-alive 커넥션 풀 + 명시적 connect/read 타임아웃, 모델별 동시 호출 상한,
+# RPM/TPM 토큰 버킷, Retry-After를 따르는 지터 지수 백오프(tenacity), 연속 실패 시 열리는 서킷 브레이커.
+# SDK 자체 재시도(max_retries)는 끄고 여기서만 재시도한다.
+OPENAI_CONNECT_TIMEOUT   = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_READ_TIMEOUT      = float(os.getenv("OPENAI_READ_TIMEOUT", "90"))
+OPENAI_POOL_MAX          = int(os.getenv("OPENAI_POOL_MAX", "32"))
+OPENAI_POOL_KEEPALIVE    = int(os.getenv("OPENAI_POOL_KEEPALIVE", "16"))
+OPENAI_KEEPALIVE_EXPIRY  = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_MAX_CONCURRENCY   = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))      # 모델별 동시 호출 수
+OPENAI_RPM               = float(os.getenv("OPENAI_RPM", "500"))             # 0이면 제한 없음
+OPENAI_TPM               = float(os.getenv("OPENAI_TPM", "200000"))          # 0이면 제한 없음
+OPENAI_RETRIES           = int(os.getenv("OPENAI_RETRIES", "4"))             # 첫 시도 제외 재시도 횟수
+OPENAI_BACKOFF_BASE      = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+OPENAI_BACKOFF_MAX       = float(os.getenv("OPENAI_BACKOFF_MAX", "20"))
+OPENAI_RETRY_AFTER_MAX   = float(os.getenv("OPENAI_RETRY_AFTER_MAX", "60"))
+BREAKER_FAILURES         = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_SEC     = float(os.getenv("BREAKER_COOLDOWN_SEC", "30"))
+BREAKER_FALLBACK         = os.getenv("BREAKER_FALLBACK", "local")            # local | mock
+
+_RETRY_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+if TYPE_CHECKING:
+    import httpx   # 클라이언트를 만들 때 import (SDK와 함께 첫 호출/warm-up에서 불린다)
+
+class UpstreamUnavailable(RuntimeError):
+    # 서킷이 열려 있어 호출하지 않음 (호출 측은 대체 응답으로 처리)
+    pass
+
+# ---- 호출 마감 (작업 단위 예산) ----
+# 전체 시간 예산이 정해진 흐름(비동기 작업 등)은 deadline()으로 감싼다. 그 안의 상류 호출은 남은 예산을
+# SDK timeout으로 받고, 예산이 바닥나면 더 기다리지 않고 DeadlineExceeded로 끝난다 (재시도/서킷 집계 안 함).
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("transport_deadline", default=None)
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    token = _DEADLINE.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+def deadline_left() -> Optional[float]:
+    # 남은 예산(초, 음수면 지남). 마감 밖이면 None
+    at = _DEADLINE.get()
+    return None if at is None else at - time.monotonic()
+
+def check_deadline() -> Optional[float]:
+    # 남은 예산을 돌려주고, 이미 지났으면 DeadlineExceeded
+    left = deadline_left()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("deadline exceeded")
+    return left
+
+# ---- 호출 취소 (헤지 경쟁에서 진 쪽 등) ----
+# cancel_scope(ev) 안의 상류 호출은 시도 전, 한도/재시도 대기 중, 스트림 청크마다 ev를 보고 켜져 있으면 Cancelled로 끝난다.
+# 스트림을 닫으면 상류 연결도 끊기므로 취소될 수 있는 호출은 스트림으로 받는다 (openai_ai._chat_json)
+_CANCEL: ContextVar[Optional[threading.Event]] = ContextVar("transport_cancel", default=None)
+
+class Cancelled(Exception):
+    # 취소 신호를 받아 중단된 호출. 성공도 실패도 아니다 (재시도/서킷/캐시 대상 아님)
+    pass
+
+@contextmanager
+def cancel_scope(ev: Optional[threading.Event]) -> Iterator[None]:
+    token = _CANCEL.set(ev)
+    try:
+        yield
+    finally:
+        _CANCEL.reset(token)
+
+def cancel_event() -> Optional[threading.Event]:
+    return _CANCEL.get()
+
+def check_cancel() -> None:
+    ev = _CANCEL.get()
+    if ev is not None and ev.is_set():
+        raise Cancelled("cancelled")
+
+def _pause(seconds: float) -> None:
+    # time.sleep 대신 (한도/재시도 대기): 취소 신호가 오면 바로 깨어 Cancelled
+    ev = _CANCEL.get()
+    if ev is None:
+        time.sleep(seconds)
+    elif ev.wait(seconds):
+        raise Cancelled("cancelled")
+
+# 마감/취소로 끊긴 호출: 결과로 세지 않는다
+_INTERRUPTED = (DeadlineExceeded, Cancelled)
+
+def build_http_client() -> "httpx.Client":
+    import httpx
+    return httpx.Client(
+        timeout=httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=OPENAI_POOL_MAX, max_keepalive_connections=OPENAI_POOL_KEEPALIVE,
+                            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY),
+    )
+
+def build_async_http_client() -> "httpx.AsyncClient":
+    import httpx
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=OPENAI_POOL_MAX, max_keepalive_connections=OPENAI_POOL_KEEPALIVE,
+                            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY),
+    )
+
+class TokenBucket:
+    # 분당 rate만큼 채워지는 버킷. reserve()는 바로 차감하고(빚 허용) 기다려야 할 초를 돌려주므로
+    # 동기(time.sleep)/비동기(asyncio.sleep) 양쪽에서 같은 버킷을 쓴다
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else per_minute)
+        self._tokens = self.capacity
+        self._at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._at) * self.rate)
+            self._at = now
+            # 버킷보다 큰 요청은 가득 찬 버킷 하나로 취급 (영원히 못 보내는 일 방지)
+            self._tokens -= min(float(amount), self.capacity)
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def wait_time(self, amount: float = 1.0) -> float:
+        # 차감하지 않고, amount만큼 쌓이기까지 남은 초 (한도 초과 요청을 거절할 때 Retry-After로)
+        if self.rate <= 0:
+            return 0.0
+        need = min(float(amount), self.capacity) - self.available()
+        return need / self.rate if need > 0 else 0.0
+
+    def available(self) -> float:
+        with self._lock:
+            return max(0.0, min(self.capacity, self._tokens + (time.monotonic() - self._at) * self.rate))
+
+class CircuitBreaker:
+    # closed -> (연속 실패 threshold회) open -> (cooldown 후) half_open: 시험 호출 1건 -> 성공 closed / 실패 open
+    def __init__(self, threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN_SEC):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.opens = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        return self.admit() is not None
+
+    def admit(self) -> Optional[bool]:
+        # 허용이면 이 호출이 half_open 시험 호출인지(True/False), 거부면 None
+        if self.threshold <= 0:
+            return False
+        with self._lock:
+            st = self._state()
+            if st == "closed":
+                return False
+            if st == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return None
+
+    def release_probe(self) -> None:
+        # 시험 호출이 결과 없이 끝남(취소, 스트림 조기 종료): 성공/실패로 세지 않고 다음 호출이 다시 시험한다
+        with self._lock:
+            self._probing = False
+
+    def success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self.threshold > 0 and self._failures >= self.threshold):
+                if self._opened_at is None or self._probing:
+                    self.opens += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+def _status(e: BaseException) -> Optional[int]:
+    s = getattr(e, "status_code", None)
+    if s is None:
+        s = getattr(getattr(e, "response", None), "status_code", None)
+    return s if isinstance(s, int) else None
+
+def retryable(e: BaseException) -> bool:
+    # 네트워크 오류/타임아웃/429/5xx만 재시도. 4xx(잘못된 요청, 인증)는 바로 실패
+    import httpx
+    if isinstance(e, (httpx.TimeoutException, httpx.TransportError)):
+        return True
+    name = type(e).__name__
+    if name in ("APIConnectionError", "APITimeoutError"):
+        return True
+    s = _status(e)
+    return s in _RETRY_STATUS
+
+def retry_after(e: BaseException) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms:
+            return float(ms) / 1000.0
+        v = headers.get("retry-after")
+        if not v:
+            return None
+        try:
+            return float(v)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+    except Exception:
+        return None
+
+class _Wait:
+    # Retry-After가 있으면 그만큼(+약간의 지터), 없으면 지터 지수 백오프
+    def __init__(self):
+        self._exp = wait_random_exponential(multiplier=OPENAI_BACKOFF_BASE, max=OPENAI_BACKOFF_MAX)
+
+    def __call__(self, state) -> float:
+        e = state.outcome.exception() if state.outcome is not None else None
+        ra = retry_after(e) if e is not None else None
+        if ra is not None:
+            wait = min(ra, OPENAI_RETRY_AFTER_MAX) + random.uniform(0, OPENAI_BACKOFF_BASE)
+        else:
+            wait = self._exp(state)
+        # 마감을 넘겨 자지 않는다 (깨어난 다음 시도가 바로 DeadlineExceeded로 끝난다)
+        left = deadline_left()
+        return wait if left is None else max(0.0, min(wait, left))
+
+class _Slots:
+    # 모델별 동시 호출 슬롯. 동기 스레드와 이벤트 루프(ASGI 코루틴 경로)가 같은 예산을 나눠 쓴다
+    # (따로 세면 두 경로를 섞는 ASGI 모드에서 상한이 두 배가 된다). 기다리는 쪽은 종류와 상관없이
+    # 도착 순서대로, 풀린 슬롯을 바로 넘겨받는다
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.used = 0
+        self._lock = threading.Lock()
+        self._waiters: Deque[Any] = deque()   # threading.Event 또는 (loop, future)
+
+    def _take(self) -> bool:
+        # 잠금 안에서: 기다리는 쪽이 없고 자리가 있으면 바로 차지
+        if self.used < self.limit and not self._waiters:
+            self.used += 1
+            return True
+        return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._take():
+                return True
+            ev = threading.Event()
+            self._waiters.append(ev)
+        if ev.wait(timeout):
+            return True
+        with self._lock:
+            try:
+                self._waiters.remove(ev)
+            except ValueError:
+                return True   # 포기하는 사이에 넘겨받았다
+        return False
+
+    async def aacquire(self, timeout: Optional[float] = None) -> bool:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._take():
+                return True
+            fut = loop.create_future()
+            waiter = (loop, fut)
+            self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except BaseException as e:
+            # 시간 초과/태스크 취소. 이미 넘겨받는 중이었다면 _grant가 취소된 future를 보고 슬롯을 돌려준다
+            with self._lock:
+                try: self._waiters.remove(waiter)
+                except ValueError: pass
+            if isinstance(e, asyncio.TimeoutError):
+                return False
+            raise
+
+    def _grant(self, fut: "asyncio.Future[bool]") -> None:
+        # 기다리던 루프에서 실행된다
+        if fut.done():
+            self.release()
+        else:
+            fut.set_result(True)
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, fut = waiter
+                try:
+                    loop.call_soon_threadsafe(self._grant, fut)
+                    return
+                except RuntimeError:
+                    continue   # 루프가 이미 닫혔다
+            self.used -= 1
+
+class _ModelLimits:
+    def __init__(self, concurrency: int, rpm: float, tpm: float):
+        self.slots = _Slots(concurrency)
+        self.concurrency = self.slots.limit
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+class Transport:
+    def __init__(self, concurrency: int = OPENAI_MAX_CONCURRENCY, rpm: float = OPENAI_RPM,
+                 tpm: float = OPENAI_TPM, retries: int = OPENAI_RETRIES,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.concurrency = concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self._models: Dict[str, _ModelLimits] = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.retried = 0
+        self.failed = 0
+        self.throttled = 0
+        self.throttle_wait_sec = 0.0
+        self.status: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "Transport":
+        return cls()
+
+    def _limits(self, model: str) -> _ModelLimits:
+        with self._lock:
+            lim = self._models.get(model)
+            if lim is None:
+                lim = self._models[model] = _ModelLimits(self.concurrency, self.rpm, self.tpm)
+            return lim
+
+    def _count(self, **kw: Any) -> None:
+        with self._stats_lock:
+            for k, v in kw.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def _note_error(self, e: BaseException) -> None:
+        # 시도별 오류 (상태 코드 또는 예외 이름) 집계
+        key = str(_status(e) or type(e).__name__)
+        with self._stats_lock:
+            self.status[key] = self.status.get(key, 0) + 1
+
+    def _admit(self) -> bool:
+        # 이 호출이 half_open 시험 호출이면 True
+        probe = self.breaker.admit()
+        if probe is None:
+            raise UpstreamUnavailable("circuit open")
+        return probe
+
+    def _throttle_delay(self, lim: _ModelLimits, tokens: int) -> float:
+        wait = max(lim.requests.reserve(1), lim.tokens.reserve(tokens))
+        if wait > 0:
+            self._count(throttled=1, throttle_wait_sec=wait)
+        return wait
+
+    def _before_attempt(self, lim: _ModelLimits, tokens: int) -> Optional[float]:
+        # 시도 직전: 한도 대기까지 마감 안에 끝나는지 보고, 남은 예산(슬롯 대기 한도)을 돌려준다
+        check_cancel()
+        left = check_deadline()
+        wait = self._throttle_delay(lim, tokens)
+        if left is not None and wait >= left:
+            raise DeadlineExceeded("deadline exceeded waiting for rate limit")
+        if wait > 0:
+            _pause(wait)
+        return None if left is None else max(0.0, left - wait)
+
+    @staticmethod
+    def _with_timeout(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        left = check_deadline()
+        return kwargs if left is None else {**kwargs, "timeout": left}
+
+    @staticmethod
+    def _past_deadline(e: Exception) -> Exception:
+        # 남은 예산으로 준 timeout에 걸린 실패는 상류 장애가 아니라 마감이다
+        left = deadline_left()
+        if left is None or left > 0 or isinstance(e, DeadlineExceeded):
+            return e
+        late = DeadlineExceeded("deadline exceeded")
+        late.__cause__ = e
+        return late
+
+    def _retrying(self, cls=Retrying):
+        def _before_sleep(state) -> None:
+            self._count(retried=1)
+            e = state.outcome.exception()
+            event("upstream_retry", str(_status(e) or type(e).__name__))
+            log_event("upstream_retry", attempt=state.attempt_number, retries=self.retries, error=repr(e))
+        # 동기판은 재시도 대기 중에도 취소 신호로 깬다 (비동기판은 태스크 취소로)
+        extra = {"sleep": _pause} if cls is Retrying else {}
+        return cls(stop=stop_after_attempt(self.retries + 1), wait=_Wait(),
+                   retry=retry_if_exception(retryable), before_sleep=_before_sleep, reraise=True, **extra)
+
+    def _done(self, err: Optional[BaseException]) -> None:
+        if err is None:
+            self.breaker.success()
+            return
+        self._count(failed=1)
+        if retryable(err):
+            self.breaker.failure()
+        else:
+            # 4xx는 상류가 응답한 것이므로 연속 실패 수를 늘리지 않는다
+            self.breaker.success()
+
+    def _abandon(self, probe: bool) -> None:
+        # 결과 없이 끝난 호출(취소/중단)은 성공도 실패도 아니다. 시험 호출이었다면 자리만 돌려준다
+        if probe:
+            self.breaker.release_probe()
+
+    def call(self, fn: Callable[..., Any], model: str, tokens: int = 0, **kwargs: Any) -> Any:
+        # fn(model=..., **kwargs) 한 번 호출 (한도/재시도/서킷 적용). tokens는 TPM 버킷에서 뺄 예상치(입력+max_tokens)
+        probe = self._admit()
+        lim = self._limits(model)
+        self._count(calls=1)
+
+        def _attempt() -> Any:
+            left = self._before_attempt(lim, tokens)
+            if not lim.slots.acquire(timeout=left):
+                raise DeadlineExceeded("deadline exceeded waiting for a slot")
+            try:
+                check_cancel()
+                return fn(model=model, **self._with_timeout(kwargs))
+            except _INTERRUPTED:
+                raise
+            except Exception as e:
+                self._note_error(e)
+                raise self._past_deadline(e)
+            finally:
+                lim.slots.release()
+        try:
+            out = self._retrying()(_attempt)
+        except _INTERRUPTED:
+            self._abandon(probe)
+            raise
+        except Exception as e:
+            self._done(e)
+            raise
+        except BaseException:
+            self._abandon(probe)
+            raise
+        self._done(None)
+        return out
+
+    def stream(self, fn: Callable[..., Any], model: str, tokens: int = 0, **kwargs: Any) -> Iterator[Any]:
+        # 스트림 연결까지만 재시도하고, 읽는 동안에는 동시 호출 슬롯을 계속 잡고 있는다
+        probe = self._admit()
+        lim = self._limits(model)
+        self._count(calls=1)
+
+        def _open() -> Any:
+            left = self._before_attempt(lim, tokens)
+            if not lim.slots.acquire(timeout=left):
+                raise DeadlineExceeded("deadline exceeded waiting for a slot")
+            try:
+                check_cancel()
+                return fn(model=model, **self._with_timeout(kwargs))
+            except BaseException as e:
+                lim.slots.release()
+                if isinstance(e, Exception) and not isinstance(e, _INTERRUPTED):
+                    self._note_error(e)
+                    raise self._past_deadline(e)
+                raise
+        try:
+            stream = self._retrying()(_open)
+        except _INTERRUPTED:
+            self._abandon(probe)
+            raise
+        except Exception as e:
+            self._done(e)
+            raise
+        except BaseException:
+            self._abandon(probe)
+            raise
+        err: Optional[BaseException] = None
+        finished = False
+        try:
+            # SDK timeout은 읽기 한 번마다의 한도라서, 청크 사이에서도 마감을 본다. 취소도 청크마다
+            for chunk in stream:
+                check_cancel()
+                check_deadline()
+                yield chunk
+            finished = True
+        except _INTERRUPTED:
+            raise
+        except Exception as e:
+            late = self._past_deadline(e)
+            if late is not e:
+                raise late   # 마감 때문에 끊긴 읽기는 결과로 세지 않는다
+            err = e
+            raise
+        finally:
+            lim.slots.release()
+            close = getattr(stream, "close", None)
+            if close is not None:
+                try: close()
+                except Exception: pass
+            # 끝까지 읽었거나 오류로 끝났을 때만 결과로 센다 (소비자가 중간에 닫은 스트림은 아님)
+            if finished or err is not None:
+                self._done(err)
+            else:
+                self._abandon(probe)
+
+    async def acall(self, fn: Callable[..., Any], model: str, tokens: int = 0, **kwargs: Any) -> Any:
+        # call()의 비동기판: fn은 AsyncOpenAI의 코루틴 함수
+        probe = self._admit()
+        lim = self._limits(model)
+        self._count(calls=1)
+
+        async def _attempt() -> Any:
+            check_cancel()
+            left = check_deadline()
+            wait = self._throttle_delay(lim, tokens)
+            if left is not None and wait >= left:
+                raise DeadlineExceeded("deadline exceeded waiting for rate limit")
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if not await lim.slots.aacquire(None if left is None else max(0.0, left - wait)):
+                raise DeadlineExceeded("deadline exceeded waiting for a slot")
+            try:
+                return await fn(model=model, **self._with_timeout(kwargs))
+            except Exception as e:
+                self._note_error(e)
+                raise self._past_deadline(e)
+            finally:
+                lim.slots.release()
+        try:
+            out = await self._retrying(AsyncRetrying)(_attempt)
+        except _INTERRUPTED:
+            self._abandon(probe)
+            raise
+        except Exception as e:
+            self._done(e)
+            raise
+        except BaseException:
+            # asyncio.CancelledError (헤지에서 진 쪽 취소 등)
+            self._abandon(probe)
+            raise
+        self._done(None)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {m: {"requests_available": round(l.requests.available(), 1),
+                          "tokens_available": round(l.tokens.available()),
+                          "concurrency": l.concurrency, "in_flight": l.slots.used}
+                      for m, l in self._models.items()}
+        with self._stats_lock:
+            return {"calls": self.calls, "retries": self.retried, "failed": self.failed,
+                    "throttled": self.throttled, "throttle_wait_sec": round(self.throttle_wait_sec, 3),
+                    "errors": dict(self.status), "breaker": self.breaker.state,
+                    "breaker_opens": self.breaker.opens, "breaker_rejected": self.breaker.rejected,
+                    "fallback": BREAKER_FALLBACK, "models": models}
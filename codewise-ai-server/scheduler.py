@@ -0,0 +1,330 @@
+from __future__ import annotations
+import os, math, time, heapq, asyncio, itertools, threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from providers.metrics import REGISTRY, stage
+from providers.transport import OPENAI_MAX_CONCURRENCY, TokenBucket, DeadlineExceeded, check_deadline, deadline_left
+
+# ---- 사용자별 공정 분배 스케줄러 (엔드포인트 -> 분석 제공자 사이) ----
+# 한 사용자나 일괄 재채점 작업이 상류 한도를 다 써서 다른 사용자의 대화형 요청이 밀리지 않도록:
+#   - 사용자별 토큰 버킷 두 개 (분당 요청 수, 분당 예상 토큰 수). 바닥나면 429 + Retry-After
+#   - 동시 분석 슬롯(SCHED_MAX_CONCURRENCY)이 차면 줄을 세우고, 빈 슬롯은 가중 공정 큐(WFQ)로 나눈다.
+#     흐름은 (등급, 사용자)이고 예상 토큰을 비용으로 self-clocked 방식 finish tag를 매긴다
+#     (대화형 가중치가 더 크고, 같은 등급 안에서는 사용자끼리 토큰 기준으로 고르게)
+#   - bulk(배치/작업)는 슬롯의 SCHED_BULK_MAX_SHARE까지만 잡는다 -> 대화형 요청은 늘 빈 슬롯을 찾는다
+#   - 대기열이 너무 길면(전체/사용자별) 바로 429 + Retry-After (대기 예상 시간)
+# 등급별 대기 시간은 codewise_sched_queue_wait_seconds{class=...} 히스토그램으로 (/metrics).
+# 배치/작업처럼 이미 비동기로 받은 요청(patient)은 거절하지 않고 버킷이 찰 때까지 기다렸다가 줄을 선다.
+# 기본은 꺼 둔다: 프록시(Spring 백엔드) 뒤에서는 userId 없는 요청이 모두 같은 주소 하나로 묶여 한 사용자의 한도를
+# 나눠 쓰게 된다. 켤 때는 백엔드가 인증한 사용자 id를 SCHED_USER_HEADER로 넘기도록 함께 설정한다.
+SCHED_ENABLED           = os.getenv("SCHED_ENABLED", "0") == "1"
+SCHED_USER_HEADER       = os.getenv("SCHED_USER_HEADER", "")            # 예: X-User-Id (신뢰하는 프록시가 붙이는 헤더만)
+SCHED_MAX_CONCURRENCY   = int(os.getenv("SCHED_MAX_CONCURRENCY", str(OPENAI_MAX_CONCURRENCY)))
+SCHED_MAX_QUEUE         = int(os.getenv("SCHED_MAX_QUEUE", "64"))        # 전체 대기 수 상한
+SCHED_USER_MAX_QUEUE    = int(os.getenv("SCHED_USER_MAX_QUEUE", "8"))    # 사용자별 대기 수 상한
+SCHED_USER_RPM          = float(os.getenv("SCHED_USER_RPM", "30"))       # 0이면 제한 없음
+SCHED_USER_TPM          = float(os.getenv("SCHED_USER_TPM", "60000"))    # 예상 토큰(입력+출력 예산), 0이면 제한 없음
+SCHED_INTERACTIVE_WEIGHT = float(os.getenv("SCHED_INTERACTIVE_WEIGHT", "4"))
+SCHED_BULK_WEIGHT       = float(os.getenv("SCHED_BULK_WEIGHT", "1"))
+SCHED_BULK_MAX_SHARE    = float(os.getenv("SCHED_BULK_MAX_SHARE", "0.5"))
+SCHED_QUEUE_TIMEOUT_SEC = float(os.getenv("SCHED_QUEUE_TIMEOUT_SEC", "30"))
+SCHED_MAX_USERS         = int(os.getenv("SCHED_MAX_USERS", "10000"))     # 버킷/흐름 상태를 들고 있는 사용자 수
+
+INTERACTIVE, BULK = "interactive", "bulk"
+CLASSES = (INTERACTIVE, BULK)
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "codewise_sched_queue_wait_seconds", "Time analysis requests waited for a scheduler slot",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+
+class Overloaded(Exception):
+    # 429로 돌려줄 거절 (reason: user_quota | queue_full | queue_timeout)
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+    @property
+    def body(self) -> Dict[str, Any]:
+        return {"error": "rate_limited" if self.reason == "user_quota" else "overloaded",
+                "reason": self.reason, "retry_after": self.retry_after}
+
+class _User:
+    __slots__ = ("requests", "tokens", "waiting", "finish")
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.waiting = 0
+        self.finish: Dict[str, float] = {}   # 등급별 마지막 finish tag
+
+class Ticket:
+    # 슬롯 하나. release()는 여러 번 불러도 한 번만 반납한다
+    __slots__ = ("sched", "user", "cls", "cost", "tag", "enqueued", "started", "granted", "released", "cancelled",
+                 "_wake")
+
+    def __init__(self, sched: "Scheduler", user: str, cls: str, cost: float):
+        self.sched = sched
+        self.user = user
+        self.cls = cls
+        self.cost = cost
+        self.tag = 0.0
+        self.enqueued = time.monotonic()
+        self.started = 0.0
+        self.granted = False
+        self.released = False
+        self.cancelled = False
+        self._wake: Any = None
+
+    def release(self) -> None:
+        self.sched._release(self)
+
+class Scheduler:
+    def __init__(self, slots: int = SCHED_MAX_CONCURRENCY, max_queue: int = SCHED_MAX_QUEUE,
+                 user_max_queue: int = SCHED_USER_MAX_QUEUE, user_rpm: float = SCHED_USER_RPM,
+                 user_tpm: float = SCHED_USER_TPM, bulk_share: float = SCHED_BULK_MAX_SHARE,
+                 queue_timeout: float = SCHED_QUEUE_TIMEOUT_SEC, enabled: bool = SCHED_ENABLED):
+        self.enabled = enabled
+        self.slots = max(1, slots)
+        self.bulk_slots = max(1, min(self.slots, int(self.slots * bulk_share)))
+        self.max_queue = max_queue
+        self.user_max_queue = user_max_queue
+        self.user_rpm = user_rpm
+        self.user_tpm = user_tpm
+        self.queue_timeout = queue_timeout
+        self.weights = {INTERACTIVE: SCHED_INTERACTIVE_WEIGHT, BULK: SCHED_BULK_WEIGHT}
+        self._lock = threading.Lock()
+        self._users: "OrderedDict[str, _User]" = OrderedDict()
+        self._queues: Dict[str, List[Tuple[float, int, Ticket]]] = {c: [] for c in CLASSES}
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        self._running = {c: 0 for c in CLASSES}
+        self._waiting = {c: 0 for c in CLASSES}
+        self._service = 1.0   # 슬롯 하나가 요청 하나를 처리하는 평균 시간(초, EWMA) — 대기 예상치용
+        self._stats = {"admitted": 0, "immediate": 0, "bypassed": 0,
+                       "rejected_user_quota": 0, "rejected_queue_full": 0, "rejected_queue_timeout": 0}
+
+    @classmethod
+    def from_env(cls) -> "Scheduler":
+        return cls()
+
+    # ---- 입장 ----
+    def _user(self, user: str) -> _User:
+        u = self._users.get(user)
+        if u is None:
+            u = self._users[user] = _User(self.user_rpm, self.user_tpm)
+            if len(self._users) > SCHED_MAX_USERS:
+                # 대기 중이 아닌 가장 오래된 사용자를 버린다 (오래 쉰 사용자의 버킷은 어차피 가득 차 있다)
+                victim = next((k for k, v in self._users.items() if v.waiting == 0 and k != user), None)
+                if victim is not None:
+                    del self._users[victim]
+        else:
+            self._users.move_to_end(user)
+        return u
+
+    def _expected_wait(self, ahead: int) -> float:
+        return self._service * (ahead + 1) / self.slots
+
+    def _admit(self, user: str, cls: str, cost: float, patient: bool) -> Tuple[Ticket, float]:
+        # (티켓, 버킷 대기 초). 바로 슬롯을 받으면 ticket.granted. 거절이면 Overloaded
+        with self._lock:
+            u = self._user(user)
+            queued = sum(self._waiting.values())
+            if not patient:
+                if queued >= self.max_queue or u.waiting >= self.user_max_queue:
+                    self._stats["rejected_queue_full"] += 1
+                    raise Overloaded("queue_full", self._expected_wait(queued))
+                wait = max(u.requests.wait_time(1), u.tokens.wait_time(cost))
+                if wait > 0:
+                    self._stats["rejected_user_quota"] += 1
+                    raise Overloaded("user_quota", wait)
+            # patient면 빚을 지고(차감 후) 그만큼 기다린다
+            wait = max(u.requests.reserve(1), u.tokens.reserve(cost))
+            t = Ticket(self, user, cls, cost)
+            self._stats["admitted"] += 1
+            if wait <= 0 and self._can_run(cls) and not self._queues[cls] \
+                    and not (cls == BULK and self._queues[INTERACTIVE]):
+                self._running[cls] += 1
+                t.granted = True
+                t.started = time.monotonic()
+                self._stats["immediate"] += 1
+            return t, wait
+
+    def _can_run(self, cls: str) -> bool:
+        if sum(self._running.values()) >= self.slots:
+            return False
+        return cls != BULK or self._running[BULK] < self.bulk_slots
+
+    def _enqueue(self, t: Ticket) -> None:
+        # 호출 측이 _lock을 잡고 있어야 한다
+        u = self._user(t.user)
+        start = max(self._vtime, u.finish.get(t.cls, 0.0))
+        t.tag = start + max(1.0, t.cost) / self.weights.get(t.cls, 1.0)
+        u.finish[t.cls] = t.tag
+        u.waiting += 1
+        self._waiting[t.cls] += 1
+        t.enqueued = time.monotonic()
+        heapq.heappush(self._queues[t.cls], (t.tag, next(self._seq), t))
+
+    def _dispatch(self) -> List[Ticket]:
+        # 호출 측이 _lock을 잡고 있어야 한다. 빈 슬롯만큼 finish tag가 가장 작은 대기자를 깨운다
+        woken: List[Ticket] = []
+        while True:
+            best: Optional[str] = None
+            for cls in CLASSES:
+                q = self._queues[cls]
+                while q and q[0][2].cancelled:
+                    heapq.heappop(q)
+                if q and self._can_run(cls) and (best is None or q[0][0] < self._queues[best][0][0]):
+                    best = cls
+            if best is None:
+                return woken
+            tag, _, t = heapq.heappop(self._queues[best])
+            self._vtime = max(self._vtime, tag)
+            self._waiting[best] -= 1
+            u = self._users.get(t.user)
+            if u is not None: u.waiting -= 1
+            self._running[best] += 1
+            t.granted = True
+            t.started = time.monotonic()
+            woken.append(t)
+
+    def _wake(self, tickets: List[Ticket]) -> None:
+        for t in tickets:
+            QUEUE_WAIT_SECONDS.observe(t.started - t.enqueued, **{"class": t.cls})
+            if t._wake is not None:
+                t._wake()
+
+    def _cancel(self, t: Ticket) -> bool:
+        # 대기 중 시간 초과/취소. 이미 슬롯을 받았으면 False (호출 측이 반납)
+        with self._lock:
+            if t.granted:
+                return False
+            t.cancelled = True
+            self._waiting[t.cls] -= 1
+            u = self._users.get(t.user)
+            if u is not None: u.waiting -= 1
+            return True
+
+    def _release(self, t: Ticket) -> None:
+        with self._lock:
+            if t.released or not t.granted:
+                return
+            t.released = True
+            self._running[t.cls] -= 1
+            took = time.monotonic() - t.started
+            self._service = 0.8 * self._service + 0.2 * max(0.01, took)
+            woken = self._dispatch()
+        self._wake(woken)
+
+    def _timeout(self, patient: bool) -> Optional[float]:
+        # 마감(transport.deadline) 안에서 불렸으면 patient여도 남은 예산까지만 기다린다
+        limit = None if patient or self.queue_timeout <= 0 else self.queue_timeout
+        left = deadline_left()
+        if left is not None and (limit is None or left < limit):
+            return max(0.0, left)
+        return limit
+
+    def _bucket_wait(self, wait: float) -> None:
+        # 버킷 빚을 갚는 대기가 마감을 넘기면 줄 서지 않고 끝낸다
+        left = check_deadline()
+        if left is not None and wait >= left:
+            raise DeadlineExceeded("deadline exceeded waiting for user quota")
+
+    # ---- 동기 (Flask 워커 스레드) ----
+    def acquire(self, user: str, cls: str = INTERACTIVE, cost: float = 1.0, patient: bool = False) -> Ticket:
+        t, wait = self._admit(user, cls, cost, patient)
+        if t.granted:
+            QUEUE_WAIT_SECONDS.observe(0.0, **{"class": cls})
+            return t
+        with stage("queue"):
+            if wait > 0:
+                self._bucket_wait(wait)
+                time.sleep(wait)
+            ev = threading.Event()
+            t._wake = ev.set
+            with self._lock:
+                self._enqueue(t)
+                woken = self._dispatch()
+            self._wake(woken)
+            if not ev.wait(self._timeout(patient)) and self._cancel(t):
+                with self._lock:
+                    self._stats["rejected_queue_timeout"] += 1
+                    ahead = sum(self._waiting.values())
+                check_deadline()
+                raise Overloaded("queue_timeout", self._expected_wait(ahead))
+        return t
+
+    @contextmanager
+    def slot(self, user: str, cls: str = INTERACTIVE, cost: Optional[float] = 1.0,
+             patient: bool = False) -> Iterator[Optional[Ticket]]:
+        # cost=None: 상류 호출이 없을 요청 (줄 세우지 않음)
+        if not self.enabled or cost is None:
+            yield None
+            return
+        t = self.acquire(user, cls, cost, patient)
+        try:
+            yield t
+        finally:
+            t.release()
+
+    # ---- 비동기 (ASGI 이벤트 루프) ----
+    async def aacquire(self, user: str, cls: str = INTERACTIVE, cost: float = 1.0, patient: bool = False) -> Ticket:
+        t, wait = self._admit(user, cls, cost, patient)
+        if t.granted:
+            QUEUE_WAIT_SECONDS.observe(0.0, **{"class": cls})
+            return t
+        with stage("queue"):
+            if wait > 0:
+                self._bucket_wait(wait)
+                await asyncio.sleep(wait)
+            loop = asyncio.get_running_loop()
+            fut: "asyncio.Future[None]" = loop.create_future()
+            # 슬롯 반납은 다른 스레드(Flask 워커)에서도 일어나므로 루프로 넘겨서 깨운다
+            t._wake = lambda: loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(None))
+            with self._lock:
+                self._enqueue(t)
+                woken = self._dispatch()
+            self._wake(woken)
+            try:
+                await asyncio.wait_for(asyncio.shield(fut), self._timeout(patient))
+            except asyncio.TimeoutError:
+                if self._cancel(t):
+                    with self._lock:
+                        self._stats["rejected_queue_timeout"] += 1
+                        ahead = sum(self._waiting.values())
+                    check_deadline()
+                    raise Overloaded("queue_timeout", self._expected_wait(ahead))
+            except asyncio.CancelledError:
+                # 클라이언트가 끊겼다: 대기 중이면 빠지고, 그 사이 슬롯을 받았으면 반납
+                if not self._cancel(t):
+                    t.release()
+                raise
+        return t
+
+    @asynccontextmanager
+    async def aslot(self, user: str, cls: str = INTERACTIVE, cost: Optional[float] = 1.0,
+                    patient: bool = False) -> AsyncIterator[Optional[Ticket]]:
+        if not self.enabled or cost is None:
+            yield None
+            return
+        t = await self.aacquire(user, cls, cost, patient)
+        try:
+            yield t
+        finally:
+            t.release()
+
+    def bypass(self) -> None:
+        # 캐시 적중처럼 상류 호출이 없을 요청은 줄 세우지 않는다 (통계만)
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update({"enabled": self.enabled, "slots": self.slots, "bulk_slots": self.bulk_slots,
+                        "running": dict(self._running), "waiting": dict(self._waiting),
+                        "users": len(self._users), "avg_service_sec": round(self._service, 3)})
+        return out
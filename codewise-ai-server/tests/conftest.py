@@ -0,0 +1,4 @@
+import os, sys
+
+# 서버 루트(app.py, providers/)를 import 경로에 — `pytest`를 어디서 돌려도 같게
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
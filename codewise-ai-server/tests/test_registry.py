@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from providers import registry as R
+from providers.transport import DeadlineExceeded, deadline
+
+CODE = "def f(x):\n    return x + 1\n"
+
+@pytest.fixture(autouse=True)
+def _router_env(monkeypatch):
+    # 표본 1개부터 순위를 매기고, 헤지 하한은 p95가 그대로 쓰이도록 낮게
+    monkeypatch.setattr(R, "ROUTER_MIN_SAMPLES", 1)
+    monkeypatch.setattr(R, "ROUTER_HEDGE_MIN_MS", 1.0)
+
+def sim(name, ms, err=0.0):
+    # 지터 0: 지연이 고정이라 순위/헤지 시점이 결정적
+    return R.SimulatedProvider(name, ms, 0.0, err)
+
+def seed(router, name, ms, n=5):
+    for _ in range(n):
+        router.windows[name].add(ms, True)
+
+def wait_for(cond, timeout=1.0):
+    end = time.monotonic() + timeout
+    while not cond() and time.monotonic() < end:
+        time.sleep(0.01)
+    return cond()
+
+class Invalid(R.SimulatedProvider):
+    # 지연 뒤 잘못된 입력으로 끝나는 제공자
+    def analyze(self, cancel=None, **kwargs):
+        super().analyze(cancel=cancel, **kwargs)
+        raise ValueError("bad input")
+
+# ---- 순위 ----
+def test_unsampled_providers_are_explored_in_spec_order():
+    r = R.ProviderRouter([sim("a", 1), sim("b", 1)])
+    assert [p.name for p in r.ranked()] == ["a", "b"]
+
+def test_routes_to_fastest_after_samples():
+    r = R.ProviderRouter([sim("slow", 60), sim("fast", 5)])
+    for _ in range(4):
+        r.analyze(code=CODE, language="python")
+    assert [p.name for p in r.ranked()] == ["fast", "slow"]
+    assert r.analyze(code=CODE, language="python")["model"] == "fast"
+
+def test_failing_provider_ranks_last_and_fails_over():
+    r = R.ProviderRouter([sim("broken", 1, err=1.0), sim("ok", 20)])
+    out = r.analyze(code=CODE, language="python")
+    assert out["model"] == "ok" and r.failovers == 1
+    seed(r, "ok", 20)
+    assert [p.name for p in r.ranked()] == ["ok", "broken"]
+
+def test_duplicate_specs_get_their_own_window():
+    r = R.ProviderRouter([R.create_provider("simulated:5:0"), R.create_provider("simulated:5:0")])
+    assert list(r.windows) == ["simulated:5:0", "simulated:5:0#2"]
+
+# ---- 헤지 ----
+def test_no_hedge_when_first_answers_within_p95():
+    r = R.ProviderRouter([sim("first", 10), sim("second", 10)], hedge=True)
+    seed(r, "first", 200); seed(r, "second", 300)
+    out = r.analyze(code=CODE, language="python")
+    assert out["model"] == "first" and r.hedged == 0
+
+def test_hedges_after_p95_and_cancels_loser():
+    r = R.ProviderRouter([sim("slow", 800), sim("fast", 10)], hedge=True)
+    seed(r, "slow", 50); seed(r, "fast", 60)   # 과거 표본상으로는 slow가 먼저, p95 = 50ms
+    t0 = time.perf_counter()
+    out = r.analyze(code=CODE, language="python")
+    elapsed = time.perf_counter() - t0
+    assert out["model"] == "fast"
+    assert r.hedged == 1 and r.hedge_wins == 1
+    assert 0.05 <= elapsed < 0.4
+    # 진 쪽은 800ms를 다 쓰지 않고 취소 신호로 끝나고, 경과 시간이 표본으로 남는다
+    assert wait_for(lambda: r.windows["slow"].cancelled == 1, timeout=0.3)
+
+def test_hedge_cancels_racers_on_invalid_input():
+    r = R.ProviderRouter([sim("slow", 800), Invalid("invalid", 20)], hedge=True)
+    seed(r, "slow", 30); seed(r, "invalid", 60)
+    with pytest.raises(ValueError):
+        r.analyze(code=CODE, language="python")
+    assert wait_for(lambda: r.windows["slow"].cancelled == 1, timeout=0.3)
+
+def test_deadline_bounds_the_router():
+    r = R.ProviderRouter([sim("slow", 500)])
+    t0 = time.perf_counter()
+    with deadline(0.05), pytest.raises(DeadlineExceeded):
+        r.analyze(code=CODE, language="python")
+    assert time.perf_counter() - t0 < 0.3
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import os, time, asyncio, threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from providers.metrics import log_event
+
+# ---- 콜드 스타트 준비 (warm-up) / 준비 상태 (/readyz) ----
+# 첫 요청이 치르던 비용(openai SDK/tiktoken import, 클라이언트와 상류 커넥션 풀, SQLite 저장소, 토크나이저와
+# 로컬 분석/diff 경로의 첫 실행)을 워커마다 한 번 미리 치른다. /healthz는 프로세스가 살아 있는지만,
+# /readyz는 이 단계가 끝나야 200 (그 전이나 단계가 실패하면 503).
+#   - Flask: 워커의 첫 요청(/readyz 프로브 포함) 때 백그라운드 스레드로 시작한다. fork 전(gunicorn --preload)에
+#            스레드/커넥션을 만들지 않도록 import 시점에는 시작하지 않는다.
+#            더 일찍 시작하려면 gunicorn post_worker_init 훅에서 app.WARMUP.start()
+#   - ASGI: lifespan 시작 때 백그라운드 태스크로 (비동기 클라이언트의 커넥션 풀도 미리 연다)
+WARMUP_ENABLED     = os.getenv("WARMUP", "1") == "1"
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))   # 제공자마다 미리 열어 둘 상류 커넥션 수 (0이면 열지 않음)
+
+class Warmup:
+    # 이름 붙은 준비 단계들을 차례로 한 번씩. 단계가 예외를 내면 그 워커는 준비되지 않은 것으로 본다
+    def __init__(self, enabled: bool = WARMUP_ENABLED):
+        self.enabled = enabled
+        self._steps: List[Tuple[str, Callable[[], Any]]] = []
+        self._async_steps: List[Tuple[str, Callable[[], Awaitable[Any]]]] = []
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._claim(None)
+
+    @classmethod
+    def from_env(cls) -> "Warmup":
+        return cls()
+
+    def add(self, name: str, fn: Callable[[], Any]) -> None:
+        self._steps.append((name, fn))
+
+    def add_async(self, name: str, fn: Callable[[], Awaitable[Any]]) -> None:
+        # ASGI 모드에서만 (arun) 도는 단계
+        self._async_steps.append((name, fn))
+
+    def _claim(self, pid: Optional[int]) -> None:
+        # 이 프로세스의 준비 상태를 새로 (fork된 워커는 부모의 상태/스레드를 물려받지 않은 것으로 본다)
+        self._pid = pid
+        self._done = threading.Event()
+        self._async_done = False
+        self._started = self._finished = 0.0
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self.failed = False
+
+    def _begin(self) -> bool:
+        # 이 프로세스에서 처음이면 True (호출한 쪽이 단계를 돌린다)
+        pid = os.getpid()
+        if self._pid == pid:
+            return False
+        with self._lock:
+            if self._pid == pid:
+                return False
+            self._claim(pid)
+            self._started = time.monotonic()
+            return True
+
+    def _record(self, name: str, t0: float, detail: Any = None, error: Optional[BaseException] = None) -> None:
+        res: Dict[str, Any] = {"ok": error is None, "ms": round((time.perf_counter() - t0) * 1000.0, 1)}
+        if isinstance(detail, dict) and detail:
+            res["detail"] = detail
+        if error is not None:
+            log_event("warmup_step_failed", level="error", step=name, error=repr(error))
+            res["error"] = repr(error)
+            self.failed = True
+        self._results[name] = res
+
+    def _run_steps(self) -> None:
+        try:
+            for name, fn in self._steps:
+                t0 = time.perf_counter()
+                try:
+                    self._record(name, t0, fn())
+                except Exception as e:
+                    self._record(name, t0, error=e)
+        finally:
+            if not self._async_steps:
+                self._finish()
+            self._done.set()
+
+    def _finish(self) -> None:
+        self._finished = time.monotonic()
+        log_event("warmup_finished", level="warning" if self.failed else "info", ok=not self.failed,
+                  ms=round((self._finished - self._started) * 1000.0))
+
+    def start(self) -> None:
+        # 요청마다 불러도 된다: 이 프로세스에서 처음일 때만 백그라운드 스레드로 돌린다
+        if self.enabled and self._begin():
+            threading.Thread(target=self._run_steps, name="warmup", daemon=True).start()
+
+    def run(self) -> bool:
+        # 끝날 때까지 기다리는 판 (다른 스레드가 이미 돌리고 있으면 그쪽을 기다린다). 준비 여부
+        if self.enabled:
+            if self._begin():
+                self._run_steps()
+            else:
+                self._done.wait()
+        return self.ready
+
+    async def arun(self) -> bool:
+        if not self.enabled:
+            return True
+        if self._begin():
+            await asyncio.to_thread(self._run_steps)
+        else:
+            await asyncio.to_thread(self._done.wait)
+        if self._async_steps and not self._async_done:
+            for name, fn in self._async_steps:
+                t0 = time.perf_counter()
+                try:
+                    self._record(name, t0, await fn())
+                except Exception as e:
+                    self._record(name, t0, error=e)
+            self._async_done = True
+            self._finish()
+        return self.ready
+
+    @property
+    def ready(self) -> bool:
+        if not self.enabled:
+            return True
+        return (self._pid == os.getpid() and self._done.is_set() and not self.failed
+                and (self._async_done or not self._async_steps))
+
+    def stats(self) -> Dict[str, Any]:
+        started = self._pid == os.getpid()
+        state = "disabled" if not self.enabled else "pending" if not started else \
+            "failed" if self.failed else "ready" if self.ready else "running"
+        out: Dict[str, Any] = {"state": state, "ready": self.ready, "steps": dict(self._results) if started else {}}
+        if started and self._finished:
+            out["elapsed_ms"] = round((self._finished - self._started) * 1000.0, 1)
+        return out